@@ -0,0 +1,175 @@
+"""
+Cold start benchmark for the command line entry points.
+
+Starts fresh interpreters and times how long each entry point takes to become
+useful, against the local Julep stand-in (see benchmarks/stubs.py), so no
+network or API keys are needed:
+
+    help         `main.py --help` until it exits
+    headless     `main.py --batch` on an empty batch until it exits
+    interactive  `main.py` until the first city prompt is printed
+    julep_ready  constructing JulepService until its client and agent are ready
+
+It also checks which heavy packages each command line path imported: the help
+and headless paths must not load Rich.
+
+    python -m benchmarks.bench_startup
+    python -m benchmarks.bench_startup --runs 20 --json startup.json
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import statistics
+import subprocess
+from typing import Dict, List, Optional, Tuple
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from benchmarks.stubs import LatencyProfile, julep_stand_in
+
+SCENARIOS = ['help', 'headless', 'interactive', 'julep_ready']
+# Top-level packages whose import cost is worth tracking
+HEAVY_PACKAGES = ('rich', 'julep', 'httpx', 'requests', 'pydantic')
+# Paths that must start without these packages
+FORBIDDEN = {'help': ('rich',), 'headless': ('rich',)}
+
+# Runs main.py as a script and reports the heavy packages it loaded when the interpreter exits
+_MAIN_WRAPPER = """
+import atexit, json, runpy, sys
+atexit.register(lambda: sys.stderr.write('LOADED ' + json.dumps(
+    sorted({{m.split('.')[0] for m in sys.modules}} & set({packages!r}))) + '\\n'))
+sys.argv = ['main.py'] + sys.argv[1:]
+runpy.run_path('main.py', run_name='__main__')
+"""
+
+_JULEP_READY = """
+import sys
+from services.agent_registry import AgentRegistry
+from services.julep_service import JulepService
+JulepService(api_key='bench', agent_registry=AgentRegistry(sys.argv[1])).ready()
+"""
+
+
+def _environment(julep_url: str, workdir: str) -> Dict[str, str]:
+    env = dict(os.environ)
+    env.update({
+        'OPENWEATHER_API_KEY': 'bench',
+        'JULEP_API_KEY': 'bench',
+        'JULEP_BASE_URL': julep_url,
+        'KRIDA_CACHE_DIR': workdir,
+        'PYTHONUNBUFFERED': '1',
+        'PYTHONDONTWRITEBYTECODE': '1',
+    })
+    return env
+
+
+def _loaded_packages(stderr: str) -> List[str]:
+    for line in stderr.splitlines():
+        if line.startswith('LOADED '):
+            return json.loads(line[len('LOADED '):])
+    return []
+
+
+def _run_to_exit(argv: List[str], env: Dict[str, str]) -> Tuple[float, List[str]]:
+    """Seconds until the process exits, and the heavy packages it reported"""
+    command = [sys.executable, '-c', _MAIN_WRAPPER.format(packages=HEAVY_PACKAGES)] + argv
+    started = time.perf_counter()
+    completed = subprocess.run(command, cwd=ROOT, env=env, stdin=subprocess.DEVNULL, capture_output=True, text=True)
+    elapsed = time.perf_counter() - started
+    if completed.returncode != 0:
+        raise RuntimeError(f"{' '.join(argv)} exited with {completed.returncode}: {completed.stderr.strip()[-500:]}")
+    return elapsed, _loaded_packages(completed.stderr)
+
+
+def _run_to_prompt(env: Dict[str, str], marker: bytes = b'first city', timeout: float = 30.0) -> float:
+    """Seconds until the interactive menu prints its first prompt; the process is killed afterwards"""
+    started = time.perf_counter()
+    process = subprocess.Popen([sys.executable, 'main.py'], cwd=ROOT, env=env,
+                               stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+    output = b''
+    try:
+        while marker not in output:
+            if time.perf_counter() - started > timeout:
+                raise RuntimeError(f"No prompt after {timeout:.0f}s")
+            chunk = os.read(process.stdout.fileno(), 4096)
+            if not chunk:
+                raise RuntimeError("main.py exited before prompting for a city")
+            output += chunk
+        return time.perf_counter() - started
+    finally:
+        process.kill()
+        process.wait()
+
+
+def run_scenario(scenario: str, env: Dict[str, str], workdir: str) -> Tuple[float, Optional[List[str]]]:
+    """Times one fresh start of a scenario; the loaded packages are None where they are not tracked"""
+    if scenario == 'help':
+        return _run_to_exit(['--help'], env)
+    if scenario == 'headless':
+        batch = os.path.join(workdir, 'empty.txt')
+        open(batch, 'w').close()
+        return _run_to_exit(['--batch', batch], env)
+    if scenario == 'interactive':
+        return _run_to_prompt(env), None
+    started = time.perf_counter()
+    subprocess.run([sys.executable, '-c', _JULEP_READY, os.path.join(workdir, 'agents.json')],
+                   cwd=ROOT, env=env, check=True, capture_output=True)
+    return time.perf_counter() - started, None
+
+
+def bench(scenarios: List[str], runs: int, julep_ms: float) -> List[Dict]:
+    results = []
+    with julep_stand_in(LatencyProfile(julep_ms, 0.0)) as julep_server, tempfile.TemporaryDirectory() as workdir:
+        env = _environment(julep_server.url, workdir)
+        for scenario in scenarios:
+            timings, loaded = [], None
+            for _ in range(runs):
+                elapsed, loaded = run_scenario(scenario, env, workdir)
+                timings.append(elapsed * 1000)
+            results.append({
+                'scenario': scenario,
+                'runs': runs,
+                'median_ms': round(statistics.median(timings), 1),
+                'min_ms': round(min(timings), 1),
+                'max_ms': round(max(timings), 1),
+                'loaded': loaded,
+                'forbidden_loaded': sorted(set(loaded or ()) & set(FORBIDDEN.get(scenario, ()))),
+            })
+    return results
+
+
+def print_report(results: List[Dict]) -> None:
+    print(f"{'scenario':<14}{'median ms':>11}{'min ms':>10}{'max ms':>10}  loaded")
+    for result in results:
+        loaded = '-' if result['loaded'] is None else ', '.join(result['loaded']) or 'none'
+        print(f"{result['scenario']:<14}{result['median_ms']:>11.1f}{result['min_ms']:>10.1f}{result['max_ms']:>10.1f}  {loaded}")
+        if result['forbidden_loaded']:
+            print(f"  ERROR: {result['scenario']} imported {', '.join(result['forbidden_loaded'])}")
+    sys.stdout.flush()
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Benchmark cold start of the command line entry points.")
+    parser.add_argument('--scenarios', nargs='+', choices=SCENARIOS, default=SCENARIOS, help="Entry points to time (default: all)")
+    parser.add_argument('--runs', type=int, default=5, help="Fresh interpreters per scenario (default: 5)")
+    parser.add_argument('--julep-ms', type=float, default=50.0, help="Julep stand-in latency for agent setup")
+    parser.add_argument('--json', metavar='FILE', help="Also write the results as JSON to FILE")
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = parse_args(argv)
+    results = bench(args.scenarios, max(1, args.runs), args.julep_ms)
+    print_report(results)
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+    return 1 if any(result['forbidden_loaded'] for result in results) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
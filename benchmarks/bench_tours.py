@@ -0,0 +1,255 @@
+"""
+Offline throughput benchmark for the tour pipeline.
+
+Runs the tour pipeline against local OpenWeather and Julep stand-ins (see
+benchmarks/stubs.py), so no network or API keys are needed, and reports
+per-stage latency percentiles and tours per second.
+
+    python -m benchmarks.bench_tours
+    python -m benchmarks.bench_tours --cities 1 5 50 --modes engine async --julep-ms 100 --error-rate 0.02
+
+`end_to_end` is each tour's latency from the start of its run, so work done before or
+between the tours, such as resolving the cities and warming their weather, shows up there.
+"""
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import tempfile
+import contextlib
+from dataclasses import replace
+from concurrent.futures import ThreadPoolExecutor
+from typing import IO, Dict, Iterable, List, Optional
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.stubs import LatencyProfile, julep_stand_in, openweather_stand_in
+from services.agent_registry import AgentRegistry
+from services.cache import ResponseCache
+from services.hedging import HedgePolicy
+from services.metrics import export_metrics
+from services.julep_service import AsyncJulepService, JulepService
+from services.rate_control import PROVIDER_DEFAULTS, RateControl
+from services.narrative import NARRATIVE_MODES
+from services.tour_engine import EngineSettings, TourEngine, TourProgress, plan_tour, run_tours_async
+from services.weather import AsyncWeatherService, WeatherService
+
+STAGES = ['weather', 'dishes', 'restaurants', 'narrative_first_chunk', 'narrative', 'total', 'end_to_end']
+MODES = ['sequential', 'engine', 'async']
+# The sequential loop takes roughly a second per city against the default stand-ins
+SEQUENTIAL_CITY_LIMIT = 50
+
+
+class _StreamingProgress(TourProgress):
+    """Asks for the streamed narrative, as the interactive loop does, and drops the chunks."""
+    wants_narrative_stream = True
+
+
+def bench_cities(count: int) -> List[str]:
+    """Distinct city names, so no tour is served from another tour's work"""
+    return [f"Bench City {i}" for i in range(1, count + 1)]
+
+
+def percentile(values: List[float], pct: float) -> float:
+    """Nearest-rank percentile of a list of values"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(1, min(len(ordered), int(round(pct / 100.0 * len(ordered) + 0.5))))
+    return ordered[rank - 1]
+
+
+def _rate_control(weather_rate: float, julep_rate: float) -> RateControl:
+    # Fresh limiters per run, so one run's backoff does not carry into the next
+    return RateControl({
+        'openweather': replace(PROVIDER_DEFAULTS['openweather'], rate=weather_rate, burst=max(1, int(weather_rate))),
+        'julep': replace(PROVIDER_DEFAULTS['julep'], rate=julep_rate, burst=max(1, int(julep_rate))),
+    })
+
+
+def _point_at(weather_service, weather_url: str):
+    weather_service.base_url = f"{weather_url}/data/2.5/weather"
+    weather_service.group_url = f"{weather_url}/data/2.5/group"
+    weather_service.geocode_url = f"{weather_url}/geo/1.0/direct"
+    return weather_service
+
+
+def learn_ids(weather_url: str, cities: List[str], id_store: ResponseCache) -> None:
+    """Resolves the cities and records their OpenWeather IDs in id_store, as earlier runs of the app would have"""
+    weather_service = _point_at(WeatherService(api_key='bench', id_store=id_store,
+                                               rate_limiter=_rate_control(10_000, 10_000).limiter('openweather')), weather_url)
+    with ThreadPoolExecutor(max_workers=32) as executor:
+        places = list(executor.map(weather_service.resolve_city, cities))
+    weather_service.get_weather_many(places, max_workers=32)
+
+
+def _services(weather_url: str, workdir: str, fused: bool, use_async: bool, rate_control: RateControl,
+              hedging: Optional[HedgePolicy], id_store: ResponseCache):
+    # Bypass the response cache so every run measures real round trips to the stand-ins
+    cache = ResponseCache(path=os.path.join(workdir, 'responses.sqlite3'), bypass=True)
+    registry = AgentRegistry(os.path.join(workdir, 'agents.json'))
+    if use_async:
+        weather_service = AsyncWeatherService(api_key='bench', id_store=id_store, rate_limiter=rate_control.limiter('openweather'))
+        julep_service = AsyncJulepService(api_key='bench', cache=cache, agent_registry=registry, fused_discovery=fused,
+                                          rate_limiter=rate_control.limiter('julep'), hedging=hedging)
+    else:
+        weather_service = WeatherService(api_key='bench', id_store=id_store, rate_limiter=rate_control.limiter('openweather'))
+        julep_service = JulepService(api_key='bench', cache=cache, agent_registry=registry, fused_discovery=fused,
+                                     rate_limiter=rate_control.limiter('julep'), hedging=hedging)
+    return _point_at(weather_service, weather_url), julep_service
+
+
+def _end_to_end(tour: Dict, started: float) -> Dict:
+    """Stamps how long after the start of the run the tour was handed back"""
+    tour['timings']['end_to_end'] = time.perf_counter() - started
+    return tour
+
+
+def _collect(tours: Iterable[Dict]) -> List[Dict]:
+    started = time.perf_counter()
+    return [_end_to_end(tour, started) for tour in tours]
+
+
+def run_sequential(cities: List[str], budget: str, weather_service, julep_service, narrative_mode: str = 'llm') -> List[Dict]:
+    """One city after another with a streamed narrative, like the interactive loop in main.py"""
+    return _collect(plan_tour(city, budget, weather_service, julep_service, progress=_StreamingProgress(),
+                              narrative_mode=narrative_mode) for city in cities)
+
+
+def run_engine(cities: List[str], budget: str, weather_service, julep_service, settings: EngineSettings) -> List[Dict]:
+    """All cities through TourEngine, like --parallel and --batch"""
+    settings.max_cities = max(settings.max_cities, len(cities))
+    return _collect(TourEngine(weather_service, julep_service, settings).run(cities, budget))
+
+
+def run_async(cities: List[str], budget: str, weather_service, julep_service, max_concurrency: int,
+              narrative_mode: str = 'llm') -> List[Dict]:
+    """All cities on one event loop through run_tours_async"""
+    async def collect() -> List[Dict]:
+        started = time.perf_counter()
+        try:
+            return [_end_to_end(tour, started) async for tour in run_tours_async(
+                cities, budget, weather_service, julep_service, max_concurrency, narrative_mode=narrative_mode
+            )]
+        finally:
+            await weather_service.aclose()
+            await julep_service.aclose()
+    return asyncio.run(collect())
+
+
+def summarize(mode: str, cities: int, tours: List[Dict], elapsed: float, rate_control: RateControl) -> Dict:
+    """Aggregates one run into tours/s and per-stage p50/p95/p99 in milliseconds"""
+    ok = [tour for tour in tours if tour['status'] == 'ok']
+    stages = {}
+    for stage in STAGES:
+        values = [tour['timings'][stage] * 1000 for tour in ok if stage in tour['timings']]
+        if values:
+            stages[stage] = {f"p{pct}": round(percentile(values, pct), 1) for pct in (50, 95, 99)}
+    return {
+        'mode': mode,
+        'cities': cities,
+        'ok': len(ok),
+        'failed': len(tours) - len(ok),
+        'elapsed_s': round(elapsed, 3),
+        'tours_per_s': round(len(tours) / elapsed, 2) if elapsed > 0 else 0.0,
+        'stages': stages,
+        'concurrency_limits': {
+            provider: rate_control.limiter(provider).snapshot()['limit'] for provider in ('openweather', 'julep')
+        },
+    }
+
+
+def print_report(results: List[Dict], out: IO[str]) -> None:
+    """Prints one block per run: throughput, then a percentile row per stage"""
+    for result in results:
+        out.write(
+            f"\n{result['mode']:<10} {result['cities']:>4} cities  {result['tours_per_s']:>8.2f} tours/s  "
+            f"{result['elapsed_s']:>8.2f}s  ok={result['ok']} failed={result['failed']}\n"
+        )
+        limits = ", ".join(f"{provider} {limit:g}" for provider, limit in result['concurrency_limits'].items())
+        out.write(f"  final concurrency limits: {limits}\n")
+        out.write(f"  {'stage':<22}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}\n")
+        for stage, row in result['stages'].items():
+            out.write(f"  {stage:<22}{row['p50']:>10.1f}{row['p95']:>10.1f}{row['p99']:>10.1f}\n")
+    out.flush()
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    defaults = EngineSettings()
+    parser = argparse.ArgumentParser(description="Benchmark tour generation against local API stand-ins.")
+    parser.add_argument('--cities', type=int, nargs='+', default=[1, 5, 50, 500], help="City counts to run (default: 1 5 50 500)")
+    parser.add_argument('--modes', nargs='+', choices=MODES, default=MODES, help="Pipelines to run (default: all)")
+    parser.add_argument('--budget', default='mid', help="Budget tier for every tour")
+    parser.add_argument('--fused', action='store_true', help="Use fused single-request discovery")
+    parser.add_argument('--narrative', choices=NARRATIVE_MODES, default='llm', help="Narrative mode (default: llm)")
+    parser.add_argument('--hedge', action='store_true', help="Hedge slow structured Julep calls")
+    parser.add_argument('--weather-ms', type=float, default=30.0, help="Median OpenWeather stand-in latency")
+    parser.add_argument('--julep-ms', type=float, default=200.0, help="Median Julep stand-in latency")
+    parser.add_argument('--sigma', type=float, default=0.5, help="Log-normal latency spread (0 = fixed)")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="Fraction of stand-in requests answered with 503")
+    parser.add_argument('--rate-limit-rate', type=float, default=0.0, help="Fraction of stand-in requests answered with 429")
+    parser.add_argument('--weather-rate', type=float, default=500.0, help="OpenWeather rate limiter requests per second")
+    parser.add_argument('--julep-rate', type=float, default=500.0, help="Julep rate limiter requests per second")
+    parser.add_argument('--seed', type=int, default=None, help="Seed for reproducible latencies")
+    parser.add_argument('--max-concurrency', type=int, default=defaults.max_concurrency, help="TourEngine worker count")
+    parser.add_argument('--async-concurrency', type=int, default=100, help="Tours in flight in async mode")
+    parser.add_argument('--cold-ids', action='store_true',
+                        help="Start every run without known city IDs, as on a first run, instead of with the IDs earlier runs learned")
+    parser.add_argument('--full', action='store_true',
+                        help=f"Also run sequential mode above {SEQUENTIAL_CITY_LIMIT} cities")
+    parser.add_argument('--json', metavar='FILE', help="Also write the results as JSON to FILE")
+    parser.add_argument('--metrics-out', metavar='FILE', help="Write the services' raw measurements to FILE as JSON lines")
+    parser.add_argument('--metrics-prom', metavar='FILE', help="Write the services' measurements to FILE in Prometheus text format")
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = parse_args(argv)
+    weather_profile = LatencyProfile(args.weather_ms, args.sigma, args.error_rate, args.rate_limit_rate, args.seed)
+    julep_profile = LatencyProfile(args.julep_ms, args.sigma, args.error_rate, args.rate_limit_rate, args.seed)
+
+    # The report goes to stdout, so the services' diagnostics are sent to stderr
+    out = sys.stdout
+    results = []
+    with openweather_stand_in(weather_profile) as weather_server, julep_stand_in(julep_profile) as julep_server, \
+            tempfile.TemporaryDirectory() as workdir, contextlib.redirect_stdout(sys.stderr):
+        os.environ['JULEP_BASE_URL'] = julep_server.url
+        for mode in args.modes:
+            for count in args.cities:
+                if mode == 'sequential' and count > SEQUENTIAL_CITY_LIMIT and not args.full:
+                    print(f"INFO: Skipping sequential at {count} cities (use --full to include)", file=sys.stderr)
+                    continue
+                cities = bench_cities(count)
+                rate_control = _rate_control(args.weather_rate, args.julep_rate)
+                hedging = HedgePolicy() if args.hedge else None
+                if args.cold_ids:
+                    id_store = ResponseCache(path=os.path.join(workdir, f'ids-{mode}-{count}.sqlite3'))
+                else:
+                    id_store = ResponseCache(path=os.path.join(workdir, 'ids.sqlite3'))
+                    learn_ids(weather_server.url, cities, id_store)
+                weather_service, julep_service = _services(weather_server.url, workdir, args.fused, mode == 'async',
+                                                           rate_control, hedging, id_store)
+                started = time.perf_counter()
+                if mode == 'sequential':
+                    tours = run_sequential(cities, args.budget, weather_service, julep_service, args.narrative)
+                elif mode == 'engine':
+                    settings = EngineSettings(max_concurrency=args.max_concurrency, narrative_mode=args.narrative)
+                    tours = run_engine(cities, args.budget, weather_service, julep_service, settings)
+                else:
+                    tours = run_async(cities, args.budget, weather_service, julep_service, args.async_concurrency,
+                                      args.narrative)
+                result = summarize(mode, count, tours, time.perf_counter() - started, rate_control)
+                results.append(result)
+                print_report([result], out)
+
+    export_metrics(args.metrics_out, args.metrics_prom)
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+    return 0 if all(result['failed'] == 0 for result in results) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,241 @@
+"""
+Local stand-ins for the OpenWeather and Julep HTTP APIs, for offline benchmarks.
+
+Both servers answer with canned but well-formed payloads after a configurable,
+randomly drawn latency, and can inject server errors and rate limiting.
+"""
+import json
+import math
+import time
+import uuid
+import random
+import threading
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Optional, Tuple
+from urllib.parse import parse_qs, urlparse
+
+
+class LatencyProfile:
+    """A log-normal latency distribution plus error and 429 injection rates."""
+
+    def __init__(self, median_ms: float = 50.0, sigma: float = 0.5, error_rate: float = 0.0,
+                 rate_limit_rate: float = 0.0, seed: Optional[int] = None):
+        """
+        Args:
+            median_ms: Median response latency in milliseconds.
+            sigma: Log-normal shape; 0 gives a fixed latency, larger values a longer tail.
+            error_rate: Fraction of requests answered with HTTP 503.
+            rate_limit_rate: Fraction of requests answered with HTTP 429 and a Retry-After header.
+            seed: Optional seed for reproducible runs.
+        """
+        self.median_ms = median_ms
+        self.sigma = sigma
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def draw(self) -> Tuple[float, Optional[int]]:
+        """Returns (delay in seconds, injected status code or None)"""
+        with self._lock:
+            delay = self._random.lognormvariate(math.log(max(self.median_ms, 0.001)), self.sigma) / 1000.0
+            roll = self._random.random()
+        if roll < self.error_rate:
+            return delay, 503
+        if roll < self.error_rate + self.rate_limit_rate:
+            return delay, 429
+        return delay, None
+
+
+class _StandInHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    profile: LatencyProfile = LatencyProfile()
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status: int, payload, headers: Optional[Dict[str, str]] = None) -> None:
+        body = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _read_json(self) -> Dict:
+        length = int(self.headers.get('Content-Length') or 0)
+        if not length:
+            return {}
+        try:
+            return json.loads(self.rfile.read(length))
+        except ValueError:
+            return {}
+
+    def _delay_or_fail(self) -> bool:
+        """Sleeps for the drawn latency; returns True if an injected error was already sent"""
+        delay, status = self.profile.draw()
+        time.sleep(delay)
+        if status == 429:
+            self._send_json(429, {'message': 'rate limited (stand-in)'}, {'Retry-After': '1'})
+            return True
+        if status:
+            self._send_json(status, {'message': 'unavailable (stand-in)'})
+            return True
+        return False
+
+
+def _city_id(text: str) -> int:
+    return int(uuid.uuid5(uuid.NAMESPACE_DNS, text.lower()).int % 10_000_000)
+
+
+def _weather_payload(city: str, city_id: int) -> Dict:
+    # Deterministic per city, so repeated runs see the same conditions
+    temp = round(5 + (city_id % 300) / 10, 1)
+    condition = ['Clear', 'Clouds', 'Rain'][city_id % 3]
+    return {
+        'id': city_id,
+        'name': city,
+        'main': {'temp': temp, 'humidity': 60},
+        'weather': [{'main': condition, 'description': condition.lower()}],
+    }
+
+
+class _WeatherHandler(_StandInHandler):
+    def do_GET(self):
+        if self._delay_or_fail():
+            return
+        url = urlparse(self.path)
+        query = parse_qs(url.query)
+        if url.path.endswith('/weather') and 'q' in query:
+            city = query['q'][0]
+            self._send_json(200, _weather_payload(city, _city_id(city)))
+        elif url.path.endswith('/weather') and 'lat' in query and 'lon' in query:
+            place = f"{query['lat'][0]},{query['lon'][0]}"
+            self._send_json(200, _weather_payload(f"Place {place}", _city_id(place)))
+        elif url.path.endswith('/direct') and 'q' in query:
+            city = query['q'][0]
+            city_id = _city_id(city)
+            self._send_json(200, [{
+                'name': " ".join(word.capitalize() for word in city.split()),
+                'lat': round((city_id % 18_000) / 100 - 90, 4),
+                'lon': round((city_id // 18_000 % 36_000) / 100 - 180, 4),
+                'country': 'XX',
+            }])
+        elif url.path.endswith('/group') and 'id' in query:
+            ids = [int(city_id) for city_id in query['id'][0].split(',') if city_id]
+            self._send_json(200, {'cnt': len(ids), 'list': [_weather_payload(f"City {i}", i) for i in ids]})
+        else:
+            self._send_json(404, {'message': 'not found'})
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+
+def _chat_reply(prompt: str) -> str:
+    if 'one-day food tour' in prompt:
+        return json.dumps([
+            {'dish': f"Stand-in Dish {i}", 'restaurant': {
+                'name': f"Stand-in Restaurant {i}", 'rating': '4.6', 'reason': 'Local favourite', 'price_range': '$$'}}
+            for i in range(1, 4)
+        ])
+    if 'JSON array' in prompt:
+        return '["Stand-in Dish 1", "Stand-in Dish 2", "Stand-in Dish 3"]'
+    if 'JSON object' in prompt:
+        return json.dumps({'name': 'Stand-in Restaurant', 'rating': '4.6', 'reason': 'Local favourite', 'price_range': '$$'})
+    return (
+        "# A Day of Stand-in Flavours\n\n"
+        "## Breakfast\nA bright start with the first dish at a cosy corner cafe.\n\n"
+        "## Lunch\nA hearty midday plate that is great value for money.\n\n"
+        "## Dinner\nThe evening ends with the city's signature dish under the stars.\n"
+    )
+
+
+class _JulepHandler(_StandInHandler):
+    def do_GET(self):
+        if self._delay_or_fail():
+            return
+        parts = urlparse(self.path).path.strip('/').split('/')
+        if len(parts) >= 2 and parts[-2] == 'agents':
+            self._send_json(200, {'id': parts[-1], 'name': 'Krida Culinary Expert', 'created_at': _now(), 'updated_at': _now()})
+        else:
+            self._send_json(404, {'message': 'not found'})
+
+    def do_DELETE(self):
+        self._send_json(202, {'id': urlparse(self.path).path.rsplit('/', 1)[-1], 'deleted_at': _now()})
+
+    def do_POST(self):
+        body = self._read_json()
+        if self._delay_or_fail():
+            return
+        parts = urlparse(self.path).path.strip('/').split('/')
+        if parts[-1] in ('agents', 'sessions'):
+            self._send_json(201, {'id': str(uuid.uuid4()), 'created_at': _now(), 'updated_at': _now(), **body})
+        elif parts[-1] == 'chat':
+            prompt = (body.get('messages') or [{}])[-1].get('content', '')
+            reply = _chat_reply(prompt)
+            if body.get('stream'):
+                self._stream(reply)
+            else:
+                self._send_json(200, {
+                    'id': str(uuid.uuid4()),
+                    'created_at': _now(),
+                    'choices': [{'index': 0, 'finish_reason': 'stop', 'message': {'role': 'assistant', 'content': reply}}],
+                    'usage': {'prompt_tokens': len(prompt) // 4, 'completion_tokens': len(reply) // 4,
+                              'total_tokens': (len(prompt) + len(reply)) // 4},
+                })
+        else:
+            self._send_json(404, {'message': 'not found'})
+
+    def _stream(self, reply: str) -> None:
+        # Server-sent events, one word per chunk, without a Content-Length
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Connection', 'close')
+        self.end_headers()
+        words = reply.split(' ')
+        for i, word in enumerate(words):
+            chunk = {'id': 'stand-in', 'created_at': _now(),
+                     'choices': [{'index': 0, 'delta': {'role': 'assistant', 'content': word + (' ' if i < len(words) - 1 else '')}}]}
+            self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode('utf-8'))
+            self.wfile.flush()
+            time.sleep(self.profile.median_ms / 1000.0 / max(len(words), 1))
+        self.wfile.write(b"data: [DONE]\n\n")
+        self.close_connection = True
+
+
+class StandInServer:
+    """Runs one stand-in API on a background thread at http://127.0.0.1:<port>."""
+
+    def __init__(self, handler: type, profile: LatencyProfile):
+        handler_class = type(handler.__name__, (handler,), {'profile': profile})
+        self._server = ThreadingHTTPServer(('127.0.0.1', 0), handler_class)
+        self._server.daemon_threads = True
+        self._server.request_queue_size = 1024
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def __enter__(self) -> "StandInServer":
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+
+def openweather_stand_in(profile: Optional[LatencyProfile] = None) -> StandInServer:
+    """A stand-in for https://api.openweathermap.org serving /data/2.5/weather and /data/2.5/group"""
+    return StandInServer(_WeatherHandler, profile or LatencyProfile(median_ms=30))
+
+
+def julep_stand_in(profile: Optional[LatencyProfile] = None) -> StandInServer:
+    """A stand-in for the Julep agents, sessions and chat API"""
+    return StandInServer(_JulepHandler, profile or LatencyProfile(median_ms=200))
@@ -0,0 +1,98 @@
+import os
+import sys
+import json
+import time
+import argparse
+import contextlib
+from typing import IO, Iterable, List, Optional, Tuple
+from services.cache import ResponseCache
+from services.hedging import HedgePolicy
+from services.metrics import export_metrics
+from services.normalize import canonical_name
+from services.weather import WeatherService
+from services.julep_service import JulepService
+from services.tour_engine import EngineSettings, TourEngine
+from services.tour_store import TourStore
+
+
+def read_tour_requests(lines: Iterable[str], default_budget: str = "mid") -> List[Tuple[str, str]]:
+    """
+    Parses batch input into (city, budget) pairs.
+
+    Each non-empty line is either a JSON object like {"city": "Paris", "budget": "luxury"}
+    or plain text "City[, budget]". Lines starting with '#' are ignored.
+    """
+    requests = []
+    for line_number, line in enumerate(lines, 1):
+        line = line.strip()
+        if not line or line.startswith('#'):
+            continue
+        if line.startswith('{'):
+            try:
+                record = json.loads(line)
+                city, budget = record['city'], str(record.get('budget') or default_budget)
+            except (ValueError, KeyError, TypeError) as e:
+                print(f"WARNING: Skipping line {line_number}, invalid JSON request: {e}", file=sys.stderr)
+                continue
+        else:
+            city, _, budget = line.rpartition(',')
+            if not city:
+                city, budget = line, ''
+            budget = budget.strip() or default_budget
+        city = canonical_name(city)
+        if city:
+            requests.append((city, budget.strip()))
+    return requests
+
+
+def run_batch(tour_requests: List[Tuple[str, str]], engine: TourEngine, out: IO[str]) -> int:
+    """
+    Generates every requested tour and writes one JSON line per tour to `out` as each completes.
+
+    Returns:
+        The number of tours that failed.
+    """
+    failures = 0
+    for tour in engine.run_requests(tour_requests):
+        if tour['status'] != 'ok':
+            failures += 1
+        out.write(json.dumps(tour, ensure_ascii=False, default=str) + "\n")
+        out.flush()
+    return failures
+
+
+def main(args: argparse.Namespace, settings: EngineSettings, hedging: Optional[HedgePolicy] = None) -> int:
+    """Entry point for `python main.py --batch FILE`; returns the process exit code"""
+    openweather_api_key = os.getenv('OPENWEATHER_API_KEY')
+    julep_api_key = os.getenv('JULEP_API_KEY')
+    if not openweather_api_key or not julep_api_key:
+        print("ERROR: OPENWEATHER_API_KEY and JULEP_API_KEY must be set.", file=sys.stderr)
+        return 2
+
+    # Tours go to stdout as JSON lines, so the services' diagnostics are sent to stderr
+    out = sys.stdout
+    with contextlib.redirect_stdout(sys.stderr):
+        started = time.perf_counter()
+        # The requests are read before any service is set up, so a missing file costs nothing
+        if args.batch == '-':
+            tour_requests = read_tour_requests(sys.stdin, args.budget)
+        else:
+            try:
+                with open(args.batch, encoding='utf-8') as f:
+                    tour_requests = read_tour_requests(f, args.budget)
+            except OSError as e:
+                print(f"ERROR: Could not read {args.batch}: {e}")
+                return 1
+        response_cache = ResponseCache(bypass=args.no_cache, refresh=args.refresh_cache)
+        weather_service = WeatherService(api_key=openweather_api_key, id_store=response_cache)
+        julep_service = JulepService(api_key=julep_api_key, cache=response_cache, fused_discovery=args.fused, hedging=hedging)
+        tour_store = TourStore(bypass=args.no_cache, refresh=args.refresh_cache)
+        engine = TourEngine(weather_service, julep_service, settings, store=tour_store)
+        failures = run_batch(tour_requests, engine, out)
+        elapsed = time.perf_counter() - started
+        export_metrics(args.metrics_out, args.metrics_prom)
+
+    completed = len(tour_requests) - failures
+    rate = len(tour_requests) / elapsed if elapsed > 0 else 0.0
+    print(f"INFO: {completed}/{len(tour_requests)} tours completed in {elapsed:.1f}s ({rate:.2f} tours/s)", file=sys.stderr)
+    return 0 if failures == 0 else 1
@@ -0,0 +1,823 @@
+"""
+The interactive Rich console front end. main.py imports it only when no --batch file is given,
+so headless runs and --help never load Rich.
+"""
+import os
+import time
+import argparse
+from services.weather import WeatherService
+from services.julep_service import JulepService
+from services.cache import ResponseCache
+from services.deadline import Deadline
+from services.hedging import HedgePolicy
+from services.metrics import export_metrics
+from services.normalize import canonical_name, parse_budget
+from services.prefetch import Prefetcher
+from services.tour_engine import MEALS, BackgroundTour, EngineSettings, TourEngine, TourProgress, plan_tour
+from services.tour_store import TourStore
+from rich.console import Console
+from rich.panel import Panel
+from rich.text import Text
+from rich.prompt import Prompt
+from rich.table import Table
+# rich.markdown (with markdown-it) and rich.live are imported when the first tour is shown,
+# which keeps them off the path to the first prompt
+from typing import Dict, List, Optional, Tuple
+
+console = Console()
+
+class InteractiveMenu:
+    def __init__(self, max_cities: int = EngineSettings.max_cities, prefetcher: Optional[Prefetcher] = None):
+        self.cities_to_tour = []
+        self.max_cities = max_cities
+        # Started on each city as it is entered, so tours are partly done by the time the user confirms
+        self.prefetcher = prefetcher
+        self.budget = "mid"
+        self.version = "v1.0.2"
+        
+    def display_welcome(self):
+        """Display welcome screen and app info with enhanced design"""
+        # ASCII art style title
+        title_art = """
+╔═══════════════════════════════════════════════════╗
+║  🍽️  KRIDA AI FOODIE TOUR GENERATOR v1.0.2  🤖  ║
+╚═══════════════════════════════════════════════════╝
+        """
+        console.print(title_art, style="bold bright_magenta")
+        
+        # Main welcome panel
+        welcome_content = Text()
+        welcome_content.append("Welcome to Krida! ", style="bold cyan")
+        welcome_content.append("Your AI-powered culinary adventure companion.\n\n", style="white")
+        welcome_content.append("✨ Personalized foodie tours for any city worldwide\n", style="bright_green")
+        welcome_content.append("🌤️ Weather-smart dining recommendations\n", style="bright_blue")
+        welcome_content.append("🍛 Authentic local cuisine discovery\n", style="bright_yellow")
+        welcome_content.append("💰 Budget-conscious restaurant selection\n", style="bright_red")
+        welcome_content.append("📖 Beautiful narrative-driven experiences\n", style="bright_magenta")
+        welcome_content.append("🌍 Support for any city globally", style="bright_cyan")
+        
+        console.print(Panel(
+            welcome_content, 
+            title="🍽️ About Krida", 
+            title_align="center",
+            border_style="bright_cyan", 
+            padding=(1, 2)
+        ))
+        console.print()
+        
+        # Quick tip
+        tip_text = Text("💡 Tip: ", style="bold yellow")
+        tip_text.append("You can select multiple cities and customize your budget to create the perfect culinary journey!", style="dim white")
+        console.print(Panel(tip_text, border_style="yellow", padding=(0, 1)))
+        console.print()
+
+    def get_cities(self) -> List[str]:
+        """Enhanced interactive city selection with better UX"""
+        console.print("🌍 [bold cyan]City Selection[/bold cyan]")
+        console.print("Enter the cities you'd like to explore for your foodie adventure!")
+        console.print("[dim]Examples: Paris, Tokyo, New York, Mumbai, Barcelona, Bangkok, etc.[/dim]")
+        console.print("[dim]Changed your mind? Type -City (e.g. -Paris) to remove a city.[/dim]")
+        console.print()
+        
+        cities = []
+        city_suggestions = [
+            "Popular choices: Paris 🇫🇷, Tokyo 🇯🇵, New York 🇺🇸, Mumbai 🇮🇳, Barcelona 🇪🇸",
+            "Food capitals: Bangkok 🇹🇭, Istanbul 🇹🇷, Lima 🇵🇪, Naples 🇮🇹, Seoul 🇰🇷",
+            "Hidden gems: Penang 🇲🇾, Lyon 🇫🇷, Osaka 🇯🇵, Mexico City 🇲🇽, Tel Aviv 🇮🇱"
+        ]
+        
+        while True:
+            if len(cities) == 0:
+                console.print(f"[dim]{city_suggestions[0]}[/dim]")
+                city = Prompt.ask("🎯 Enter your first city")
+            else:
+                remaining_suggestions = city_suggestions[len(cities) % len(city_suggestions)]
+                console.print(f"[dim]{remaining_suggestions}[/dim]")
+                
+                prompt_text = "🌟 Add another city"
+                if len(cities) == 1:
+                    prompt_text += f" [dim](or press Enter to continue with {cities[0]})[/dim]"
+                else:
+                    prompt_text += f" [dim](or press Enter to continue with {len(cities)} cities)[/dim]"
+                
+                city = Prompt.ask(prompt_text, default="")
+            
+            if city.strip() == "":
+                if len(cities) > 0:
+                    break
+                else:
+                    console.print("[red]🚫 Please enter at least one city to get started![/red]")
+                    continue
+            
+            # Clean and format city name; aliases like "NYC" become the canonical name
+            removing = city.strip().startswith('-')
+            city = canonical_name(city.strip().lstrip('-'))
+
+            if removing:
+                if city in cities:
+                    cities.remove(city)
+                    if self.prefetcher:
+                        self.prefetcher.remove_city(city)
+                    console.print(f"[yellow]🗑️  Removed {city} from your tour.[/yellow]")
+                else:
+                    console.print(f"[yellow]⚠️  {city} is not in your list.[/yellow]")
+                console.print()
+                continue
+
+            if city not in cities:
+                cities.append(city)
+                if self.prefetcher:
+                    self.prefetcher.add_city(city)
+                console.print(f"[green]✅ Added {city} to your tour![/green]")
+                
+                # Show current list if more than one city
+                if len(cities) > 1:
+                    cities_display = ", ".join(cities)
+                    console.print(f"[dim]Current cities: {cities_display}[/dim]")
+            else:
+                console.print(f"[yellow]⚠️  {city} is already in your list![/yellow]")
+                
+            if len(cities) >= self.max_cities:
+                console.print(f"[yellow]🏁 Maximum {self.max_cities} cities reached for this run.[/yellow]")
+                break
+            
+            console.print()
+        
+        console.print()
+        final_cities = ", ".join(cities)
+        console.print(f"[bold green]🎉 Selected cities: {final_cities}[/bold green]")
+        if self.prefetcher:
+            # Drops cities that were left out when re-entering the list after "Modify"
+            self.prefetcher.set_cities(cities)
+        return cities
+
+    def get_budget(self) -> str:
+        """Enhanced interactive budget selection with natural language support"""
+        console.print()
+        console.print("💰 [bold cyan]Budget Selection[/bold cyan]")
+        console.print("Choose how much you'd like to spend on your culinary adventure:")
+        console.print()
+        
+        # Enhanced budget options table
+        table = Table(show_header=True, header_style="bold magenta", border_style="cyan")
+        table.add_column("Option", style="bold cyan", width=8, justify="center")
+        table.add_column("Budget Level", style="bold white", width=18)
+        table.add_column("Price Range", style="bold green", width=18)
+        table.add_column("Perfect For", style="dim", width=40)
+        
+        table.add_row(
+            "1", "Budget-Friendly", "Under $15/meal", 
+            "Street food, local joints, authentic hole-in-the-wall gems"
+        )
+        table.add_row(
+            "2", "Mid-Range", "$15-35/meal", 
+            "Popular restaurants, good quality dining, tourist favorites"
+        )
+        table.add_row(
+            "3", "Upscale", "$35-75/meal", 
+            "Fine dining, trendy spots, chef-recommended establishments"
+        )
+        table.add_row(
+            "4", "Luxury", "$75+/meal", 
+            "Michelin-starred, celebrity chef venues, ultimate experiences"
+        )
+        table.add_row(
+            "5", "Custom", "Your choice", 
+            "Enter specific amount or use keywords like 'cheap', 'expensive'"
+        )
+        
+        console.print(table)
+        console.print()
+        
+        # Additional tips
+        console.print("[dim]💡 Tips:[/dim]")
+        console.print("[dim]• Budget-friendly doesn't mean less delicious - often the best local food![/dim]")
+        console.print("[dim]• Mid-range offers great balance of quality and value[/dim]")
+        console.print("[dim]• Custom option accepts words like 'cheap', 'moderate', 'expensive', 'luxury'[/dim]")
+        console.print()
+        
+        while True:
+            choice = Prompt.ask(
+                "💳 Select your budget preference",
+                choices=["1", "2", "3", "4", "5"],
+                default="2"
+            )
+            
+            if choice == "1":
+                console.print("[green]🎯 Great choice! Budget-friendly often means the most authentic experiences![/green]")
+                return "budget"
+            elif choice == "2":
+                console.print("[green]🎯 Perfect balance of quality and value![/green]")
+                return "mid"
+            elif choice == "3":
+                console.print("[green]🎯 Excellent! You'll enjoy some fantastic upscale dining![/green]")
+                return "upscale"
+            elif choice == "4":
+                console.print("[green]🎯 Luxury it is! Prepare for extraordinary culinary experiences![/green]")
+                return "luxury"
+            elif choice == "5":
+                console.print("💭 You can enter:")
+                console.print("• A number (like '25', '50', '$100')")
+                console.print("• Keywords like: cheap, affordable, moderate, expensive, luxury, premium")
+                console.print("• Descriptions like: 'mid range', 'high end', 'budget friendly'")
+                console.print()
+                
+                custom_budget = Prompt.ask("✨ Enter your budget preference")
+                processed_budget = self._process_custom_budget(custom_budget)
+                
+                if processed_budget:
+                    # Display what was understood
+                    budget_descriptions = {
+                        'budget': 'Budget-Friendly (under $15/meal)',
+                        'mid': 'Mid-Range ($15-35/meal)',
+                        'upscale': 'Upscale ($35-75/meal)',
+                        'luxury': 'Luxury ($75+/meal)'
+                    }
+                    
+                    if processed_budget.isdigit():
+                        console.print(f"[green]🎯 Got it! ${processed_budget} per meal budget set.[/green]")
+                    else:
+                        description = budget_descriptions.get(processed_budget, f"{processed_budget} budget")
+                        console.print(f"[green]🎯 Perfect! {description} selected.[/green]")
+                    
+                    return processed_budget
+                else:
+                    console.print("[red]❌ I didn't understand that. Let's try again![/red]")
+                    continue
+
+    def _process_custom_budget(self, budget_input: str) -> str:
+        """Process custom budget input with natural language understanding"""
+        if not budget_input or not budget_input.strip():
+            return None
+        return parse_budget(budget_input)
+
+    def confirm_selections(self, cities: List[str], budget: str) -> bool:
+        """Enhanced confirmation screen with beautiful formatting"""
+        console.print()
+        
+        # Create a beautiful summary panel
+        summary_content = Text()
+        summary_content.append("🎯 Ready to create your personalized foodie tours!\n\n", style="bold bright_green")
+        
+        # Cities section
+        summary_content.append("🌍 Destinations:\n", style="bold bright_cyan")
+        for i, city in enumerate(cities, 1):
+            summary_content.append(f"   {i}. {city}\n", style="bright_white")
+        summary_content.append("\n")
+        
+        # Budget section  
+        summary_content.append("💰 Budget Level:\n", style="bold bright_yellow")
+        if budget.isdigit():
+            summary_content.append(f"   ${budget} per meal (Custom)\n", style="bright_white")
+        else:
+            budget_mapping = {
+                'budget': '💵 Budget-Friendly (Under $15/meal)',
+                'mid': '💳 Mid-Range ($15-35/meal)', 
+                'upscale': '💎 Upscale ($35-75/meal)',
+                'luxury': '👑 Luxury ($75+/meal)'
+            }
+            budget_display = budget_mapping.get(budget, f"{budget.title()} Budget")
+            summary_content.append(f"   {budget_display}\n", style="bright_white")
+        
+        # Add tour info
+        summary_content.append("\n🍽️ What you'll get:\n", style="bold bright_magenta")
+        summary_content.append("   • Weather-optimized dining recommendations\n", style="dim bright_white")
+        summary_content.append("   • Authentic local cuisine discoveries\n", style="dim bright_white")
+        summary_content.append("   • Budget-appropriate restaurant selections\n", style="dim bright_white")
+        summary_content.append("   • Engaging narrative tour guides\n", style="dim bright_white")
+        
+        console.print(Panel(
+            summary_content,
+            title="🎉 Your Foodie Adventure Summary",
+            title_align="center",
+            border_style="bright_green",
+            padding=(1, 2)
+        ))
+        console.print()
+        
+        # Confirmation with options
+        console.print("Choose your next step:")
+        console.print("  [bold green]Y[/bold green] - Let's go! Start generating tours")
+        console.print("  [bold yellow]M[/bold yellow] - Modify my selections") 
+        console.print("  [bold red]Q[/bold red] - Quit for now")
+        console.print()
+        
+        while True:
+            response = Prompt.ask(
+                "What would you like to do?",
+                choices=["y", "yes", "m", "modify", "q", "quit"],
+                default="y"
+            ).lower()
+            
+            if response in ["y", "yes"]:
+                console.print("[bold bright_green]🚀 Fantastic! Let's start your culinary adventure![/bold bright_green]")
+                return True
+            elif response in ["m", "modify"]:
+                return False
+            elif response in ["q", "quit"]:
+                console.print()
+                goodbye_text = Text("👋 Thanks for trying Krida! Your culinary adventures await whenever you're ready.", style="bold bright_cyan")
+                console.print(Panel(goodbye_text, border_style="bright_blue", padding=(1, 2)))
+                console.print("🍽️ Bon appétit! Come back anytime for more foodie discoveries.")
+                exit(0)
+
+    def show_main_menu(self) -> Tuple[List[str], str]:
+        """Enhanced main interactive menu with better flow"""
+        self.display_welcome()
+        
+        while True:
+            try:
+                cities = self.get_cities()
+                budget = self.get_budget()
+                if self.prefetcher:
+                    self.prefetcher.set_budget(budget)
+                
+                if self.confirm_selections(cities, budget):
+                    console.print()
+                    return cities, budget
+                else:
+                    console.print()
+                    console.print("[bright_yellow]📝 Let's modify your selections...[/bright_yellow]")
+                    console.print()
+                    continue
+                    
+            except KeyboardInterrupt:
+                console.print("\n\n[yellow]👋 Thanks for trying Krida! Come back anytime for foodie adventures![/yellow]")
+                exit(0)
+            except Exception as e:
+                console.print(f"\n[red]❌ Oops! Something went wrong: {e}[/red]")
+                console.print("[dim]Let's try again...[/dim]")
+                console.print()
+                continue
+
+
+class ConsoleTourProgress(TourProgress):
+    """Renders each pipeline stage of plan_tour to the console as it happens"""
+
+    steps = {
+        'weather': ("🌤️", "Checking local weather conditions", "Fetching weather data..."),
+        'dishes': ("🍽️", "Discovering iconic local dishes", "AI analyzing local cuisine..."),
+        'restaurants': ("🔍", "Finding perfect restaurants", "Searching breakfast, lunch and dinner spots..."),
+        'narrative': ("📝", "Crafting your tour narrative", "AI crafting your tour narrative..."),
+    }
+    meal_emojis = ['🥐', '🍽️', '🍷']
+    meal_names = ['Morning', 'Afternoon', 'Evening']
+
+    def __init__(self, budget_display: str, stream_narrative: bool = False):
+        self.budget_display = budget_display
+        self.wants_narrative_stream = stream_narrative
+        self._status = None
+        self._live = None
+        self._narrative_parts = []
+        self._preview = None
+        self._last_refresh = 0.0
+
+    def stage_started(self, stage: str, tour: Dict) -> None:
+        emoji, label, spinner_text = self.steps[stage]
+        city = tour['city']
+        if stage == 'weather':
+            console.print(f"{emoji} [bold cyan]{label}[/bold cyan] for {city}...")
+        elif stage == 'dishes':
+            console.print(f"{emoji} [bold cyan]{label}[/bold cyan] in {city}...")
+        elif stage == 'restaurants':
+            console.print(f"{emoji} [bold cyan]{label}[/bold cyan] for your {self.budget_display} budget...")
+            for i, dish in enumerate(tour['dishes'][:len(MEALS)]):
+                console.print(f"   {self.meal_emojis[i]} [cyan]{self.meal_names[i]}:[/cyan] Finding restaurant for [italic]{dish}[/italic]...")
+        else:
+            console.print(f"{emoji} [bold cyan]{label}[/bold cyan] for your {city} adventure...")
+            console.print("[dim]This is where the magic happens - creating your personalized tour story...[/dim]")
+            if self.wants_narrative_stream:
+                # The narrative is rendered live as it streams in, so show the banner up front
+                console.print()
+                render_tour_banner(city)
+                self._narrative_parts = []
+                from rich.live import Live
+                self._live = Live(
+                    Panel(Text(spinner_text, style="bold green"), border_style="bright_white", padding=(1, 2)),
+                    console=console, refresh_per_second=8, vertical_overflow="visible"
+                )
+                self._live.start()
+                return
+        self._status = console.status(f"[bold green]{spinner_text}", spinner="dots")
+        self._status.start()
+
+    def narrative_chunk(self, chunk: str, tour: Dict) -> None:
+        self._narrative_parts.append(chunk)
+        # Re-rendering the Markdown is the expensive part, so do it at most ~10 times a second
+        now = time.monotonic()
+        if self._live is not None and now - self._last_refresh >= 0.1:
+            self._last_refresh = now
+            self._live.update(self._narrative_panel())
+
+    def narrative_preview(self, narrative: str, tour: Dict) -> None:
+        # Shown in the live panel until the first chunk of the model's narrative arrives
+        self._preview = narrative
+        if self._live is not None:
+            self._live.update(self._narrative_panel())
+            return
+        # Without streaming there is no live panel to replace, so print the preview above the
+        # spinner; the model's narrative is rendered below it once it is written
+        if self._status is not None:
+            self._status.stop()
+        console.print(self._narrative_panel())
+        console.print()
+        self._status = console.status("[bold green]Writing the full narrative...", spinner="dots")
+        self._status.start()
+
+    def _narrative_panel(self) -> Panel:
+        from rich.markdown import Markdown
+        if not self._narrative_parts and self._preview:
+            return Panel(Markdown(self._preview), border_style="dim", padding=(1, 2), subtitle="preview")
+        return Panel(Markdown("".join(self._narrative_parts)), border_style="bright_white", padding=(1, 2))
+
+    def stage_finished(self, stage: str, tour: Dict) -> None:
+        self.close()
+        if stage == 'weather':
+            if not tour['weather']:
+                console.print(f"[red]❌ Could not get weather data for {tour['city']}. This might affect recommendations.[/red]")
+                console.print("[dim]Proceeding with general dining suggestions...[/dim]")
+            else:
+                console.print(f"[green]✅ Weather: {tour['weather_summary']}[/green]")
+                console.print(f"[bright_blue]🎯 Recommendation: Perfect for {tour['dining_suggestion']}[/bright_blue]")
+            console.print()
+        elif stage == 'dishes':
+            console.print("[green]✅ Found amazing local specialties:[/green]")
+            for i, dish in enumerate(tour['dishes'], 1):
+                console.print(f"   {i}. [bright_white]{dish}[/bright_white]")
+            console.print()
+        elif stage == 'restaurants':
+            for i, meal in enumerate(MEALS):
+                if meal not in tour['tour_data']:
+                    console.print(f"   {self.meal_emojis[i]} [yellow]⏱️ No restaurant found in time, skipping {self.meal_names[i].lower()}[/yellow]")
+                    continue
+                restaurant = tour['tour_data'][meal]['restaurant']
+                price_info = f" ({restaurant.get('price_range', 'Budget-friendly')})" if 'price_range' in restaurant else ""
+                console.print(f"   {self.meal_emojis[i]} [green]✅ {restaurant['name']}{price_info}[/green]")
+            console.print()
+        else:
+            console.print("[green]✅ Your personalized tour is ready![/green]")
+            console.print()
+
+    def stage_failed(self, stage: str, tour: Dict) -> None:
+        self.close()
+        if stage == 'dishes':
+            console.print(f"[red]❌ {tour['error']}. Skipping this city.[/red]")
+            console.print("[dim]Try a different city or check your internet connection.[/dim]")
+        else:
+            console.print(f"[red]❌ {tour['error']}.[/red]")
+            console.print("[dim]Skipping this city. Try a different location.[/dim]")
+
+    def close(self) -> None:
+        if self._status is not None:
+            self._status.stop()
+            self._status = None
+        if self._live is not None:
+            if self._narrative_parts or self._preview:
+                self._live.update(self._narrative_panel())
+            self._live.stop()
+            self._live = None
+            if not console.is_terminal:
+                # Live only ends its output with a newline on a real terminal
+                console.line()
+
+
+def _budget_display(budget: str) -> str:
+    return f"${budget}/meal" if budget.isdigit() else budget.title()
+
+
+def render_tour_banner(city: str):
+    """Render the completion banner shown above a tour narrative"""
+    tour_title = Text()
+    tour_title.append("🎉 Your One-Day Foodie Adventure in ", style="bold bright_green")
+    tour_title.append(city.upper(), style="bold bright_yellow")
+    
+    console.print(Panel(
+        tour_title, 
+        border_style="bright_green", 
+        padding=(1, 2),
+        title="✨ Tour Complete ✨",
+        title_align="center"
+    ))
+    console.print()
+
+
+def render_tour(tour: Dict, streamed: bool = False):
+    """Render a finished tour: the completion banner followed by the narrative panel.
+    A streamed narrative is already on screen in its live panel, so it is not repeated."""
+    if not streamed:
+        render_tour_banner(tour['city'])
+    
+    if tour['narrative'] and not streamed:
+        # Render the narrative with beautiful formatting
+        from rich.markdown import Markdown
+        markdown_narrative = Markdown(tour['narrative'])
+        console.print(Panel(
+            markdown_narrative, 
+            border_style="bright_white",
+            padding=(1, 2)
+        ))
+    elif not tour['narrative']:
+        console.print(Panel(
+            "[red]❌ Sorry, we couldn't generate the tour narrative at this time.\n"
+            "Please check your internet connection and API keys.[/red]",
+            border_style="red",
+            padding=(1, 2)
+        ))
+    if tour.get('degraded'):
+        console.print(f"[dim]⏱️ Simplified to finish in time: {', '.join(tour['degraded'])}[/dim]")
+    
+    console.print()
+    console.print("=" * 80, style="dim bright_blue")
+    console.print()
+
+
+def run_tour_for_city(city: str, budget: str, weather_service: WeatherService, julep_service: JulepService,
+                      stream_narrative: bool = False, background: Optional[BackgroundTour] = None,
+                      store: Optional[TourStore] = None, deadline: Optional[float] = None,
+                      narrative_mode: str = 'llm') -> bool:
+    """
+    Enhanced tour generation with better user experience; `background` is this city's tour if it was
+    started ahead of time and `deadline` the tour's time budget in seconds
+    """
+    # Beautiful city header with progress indication
+    budget_display = _budget_display(budget)
+    
+    city_header = Text()
+    city_header.append("🏙️ ", style="bright_yellow")
+    city_header.append(f"Exploring {city.upper()}", style="bold bright_magenta")
+    city_header.append(f" ({budget_display} Budget)", style="bright_cyan")
+    
+    console.print(Panel(
+        city_header, 
+        border_style="bright_blue", 
+        padding=(1, 2),
+        title="🍽️ Foodie Tour Generation",
+        title_align="center"
+    ))
+    console.print()
+
+    progress = ConsoleTourProgress(budget_display, stream_narrative=stream_narrative)
+    try:
+        if background is not None:
+            tour = background.attach(progress)
+        else:
+            tour = plan_tour(city, budget, weather_service, julep_service, progress=progress, store=store,
+                             deadline=Deadline(deadline) if deadline else None, narrative_mode=narrative_mode)
+        if tour['status'] != 'ok':
+            return False
+        render_tour(tour, streamed=stream_narrative)
+        return True
+        
+    except KeyboardInterrupt:
+        progress.close()
+        if background is not None:
+            background.cancel()
+        console.print(f"\n[yellow]⏸️  Tour generation for {city} interrupted by user.[/yellow]")
+        raise
+    except Exception as e:
+        progress.close()
+        console.print(f"\n[red]❌ Error generating tour for {city}: {e}[/red]")
+        console.print("[dim]You can try again or continue with other cities.[/dim]")
+        console.print()
+        return False
+
+
+def run_tours_in_parallel(cities: List[str], budget: str, engine: TourEngine) -> int:
+    """Generate all tours concurrently and render each one as soon as it completes"""
+    console.print(f"[bold bright_magenta]⚡ Generating {len(cities)} tours in parallel "
+                  f"(up to {engine.settings.max_concurrency} at a time)...[/bold bright_magenta]")
+    console.print()
+    
+    successful_tours = 0
+    with console.status("[bold green]Waiting for the first tour to finish...", spinner="dots") as status:
+        for done, tour in enumerate(engine.run(cities, budget), 1):
+            status.stop()
+            console.print(f"[bold bright_magenta]🌟 Tour {done} of {len(cities)}: {tour['city']}[/bold bright_magenta]")
+            if tour['status'] == 'ok':
+                successful_tours += 1
+                render_tour(tour)
+            else:
+                console.print(f"[red]❌ {tour['error']}. Skipping {tour['city']}.[/red]")
+                console.print()
+            if done < len(cities):
+                status.update(f"[bold green]{len(cities) - done} tours still generating...")
+                status.start()
+    return successful_tours
+
+
+def run_tours_sequentially(cities_to_tour: List[str], budget: str, weather_service: WeatherService, julep_service: JulepService,
+                           stream_narrative: bool = False, look_ahead: bool = False, store: Optional[TourStore] = None,
+                           deadline: Optional[float] = None, narrative_mode: str = 'llm') -> int:
+    """
+    Generate tours one city at a time, asking between cities whether to continue.
+    With look_ahead, the next city's tour is generated in the background while the current one is read.
+    """
+    successful_tours = 0
+    next_tour = None
+    for i, city in enumerate(cities_to_tour):
+        try:
+            # Progress indicator
+            progress_text = f"🌟 Tour {i+1} of {len(cities_to_tour)}"
+            console.print(f"[bold bright_magenta]{progress_text}[/bold bright_magenta]")
+            console.print()
+            
+            background, next_tour = next_tour, None
+            if run_tour_for_city(city, budget, weather_service, julep_service, stream_narrative=stream_narrative,
+                                 background=background, store=store, deadline=deadline,
+                                 narrative_mode=narrative_mode):
+                successful_tours += 1
+            
+            # Continue to next city (except for the last one)
+            if i < len(cities_to_tour) - 1:
+                console.print()
+                next_city = cities_to_tour[i+1]
+                if look_ahead:
+                    next_tour = BackgroundTour(next_city, budget, weather_service, julep_service, store=store,
+                                               deadline=deadline, narrative_mode=narrative_mode)
+                
+                # Give options for proceeding
+                console.print(f"[dim]Next up: {next_city}{' (already being prepared)' if next_tour else ''}[/dim]")
+                console.print("Choose what to do next:")
+                console.print("  [bold green]C[/bold green] - Continue to next city")
+                console.print("  [bold yellow]P[/bold yellow] - Pause and finish here")
+                console.print("  [bold red]Q[/bold red] - Quit tour generation")
+                console.print()
+                
+                choice = Prompt.ask(
+                    "What would you like to do?",
+                    choices=["c", "continue", "p", "pause", "q", "quit"],
+                    default="c"
+                ).lower()
+                
+                if choice not in ["c", "continue"] and next_tour is not None:
+                    next_tour.cancel()
+                    next_tour = None
+
+                if choice in ["p", "pause"]:
+                    console.print(f"[bright_yellow]⏸️  Pausing tour generation. You've completed {successful_tours} cities![/bright_yellow]")
+                    break
+                elif choice in ["q", "quit"]:
+                    console.print(f"[bright_red]🛑 Tour generation stopped. Completed {successful_tours} cities.[/bright_red]")
+                    break
+                else:
+                    console.print(f"[bright_green]➡️  Continuing to {next_city}...[/bright_green]")
+                
+                console.print()
+                
+        except KeyboardInterrupt:
+            if next_tour is not None:
+                next_tour.cancel()
+            console.print(f"\n[yellow]⏸️  Tour interrupted. Completed {successful_tours} out of {len(cities_to_tour)} cities.[/yellow]")
+            break
+        except Exception as e:
+            console.print(f"[red]❌ Error with {city}: {e}[/red]")
+            console.print("[dim]Continuing with remaining cities...[/dim]")
+            console.print()
+            continue
+    return successful_tours
+
+
+def main(args: argparse.Namespace, settings: EngineSettings, hedging: Optional[HedgePolicy] = None) -> None:
+    """Enhanced main function with better error handling and UX"""
+    prefetcher = None
+    try:
+        # Environment check with helpful messaging
+        openweather_api_key = os.getenv('OPENWEATHER_API_KEY')
+        julep_api_key = os.getenv('JULEP_API_KEY')
+
+        if not openweather_api_key or not julep_api_key:
+            error_panel = Text()
+            error_panel.append("🚨 Missing API Keys!\n\n", style="bold red")
+            error_panel.append("To use Krida, you need to set up these environment variables:\n", style="white")
+            error_panel.append("• OPENWEATHER_API_KEY ", style="bright_yellow")
+            error_panel.append("(for weather data)\n", style="dim")
+            error_panel.append("• JULEP_API_KEY ", style="bright_yellow") 
+            error_panel.append("(for AI-powered food recommendations)\n\n", style="dim")
+            error_panel.append("💡 Check the .env.example file for setup instructions!", style="bright_cyan")
+            
+            console.print(Panel(
+                error_panel,
+                title="❌ Setup Required",
+                title_align="center", 
+                border_style="red",
+                padding=(1, 2)
+            ))
+            return
+
+        response_cache = ResponseCache(bypass=args.no_cache, refresh=args.refresh_cache)
+        # Finished tours, so asking again only regenerates what changed, e.g. the narrative for new weather
+        tour_store = TourStore(bypass=args.no_cache, refresh=args.refresh_cache)
+
+        def start_services() -> Tuple[WeatherService, JulepService]:
+            weather_service = WeatherService(api_key=openweather_api_key, id_store=response_cache)
+            julep_service = JulepService(api_key=julep_api_key, cache=response_cache, fused_discovery=args.fused,
+                                         hedging=hedging)
+            return weather_service, julep_service
+
+        if not args.no_prefetch:
+            # Connect and look up cities in the background while the user is still choosing
+            prefetcher = Prefetcher(start_services, max_workers=settings.julep_concurrency, fused_discovery=args.fused)
+
+        # Interactive menu system
+        menu = InteractiveMenu(max_cities=settings.max_cities, prefetcher=prefetcher)
+        cities_to_tour, budget = menu.show_main_menu()
+        
+        # Initialize services with user feedback
+        init_text = Text()
+        init_text.append("🚀 Initializing Krida services...\n", style="bold bright_green")
+        init_text.append("• Connecting to weather service\n", style="dim")
+        init_text.append("• Setting up AI culinary expert\n", style="dim")
+        init_text.append("• Preparing your personalized experience", style="dim")
+        
+        console.print(Panel(init_text, border_style="green", padding=(1, 2)))
+        
+        try:
+            with console.status("[bold green]Starting services...", spinner="dots"):
+                weather_service, julep_service = prefetcher.services() if prefetcher else start_services()
+                julep_service.ready()
+                
+            console.print("[bold green]✅ All systems ready! Let's begin your culinary journey![/bold green]")
+            console.print()
+        except Exception as e:
+            console.print(f"[bold red]❌ Failed to initialize services:[/bold red] {e}")
+            console.print("[dim]Please check your API keys and internet connection.[/dim]")
+            return
+
+        # Show comprehensive tour plan
+        plan_content = Text()
+        plan_content.append("🗺️ Your Culinary Journey Plan\n\n", style="bold bright_blue")
+        plan_content.append("Destinations: ", style="bold bright_cyan")
+        plan_content.append(f"{', '.join(cities_to_tour)}\n", style="bright_white")
+        
+        if budget.isdigit():
+            plan_content.append("Budget: ", style="bold bright_yellow")
+            plan_content.append(f"${budget} per meal (Custom)\n", style="bright_white")
+        else:
+            budget_names = {
+                'budget': 'Budget-Friendly', 'mid': 'Mid-Range',
+                'upscale': 'Upscale', 'luxury': 'Luxury'
+            }
+            plan_content.append("Budget: ", style="bold bright_yellow")
+            plan_content.append(f"{budget_names.get(budget, budget.title())}\n", style="bright_white")
+        
+        plan_content.append(f"\nTotal cities: {len(cities_to_tour)}", style="dim")
+        
+        console.print(Panel(
+            plan_content,
+            title="🎯 Ready to Explore",
+            title_align="center",
+            border_style="bright_blue",
+            padding=(1, 2)
+        ))
+        console.print()
+
+        # Generate tours with enhanced progress tracking
+        if args.parallel:
+            engine = TourEngine(weather_service, julep_service, settings, store=tour_store)
+            successful_tours = run_tours_in_parallel(cities_to_tour, budget, engine)
+        else:
+            successful_tours = run_tours_sequentially(cities_to_tour, budget, weather_service, julep_service,
+                                                      stream_narrative=not args.no_stream,
+                                                      look_ahead=not args.no_look_ahead, store=tour_store,
+                                                      deadline=settings.tour_deadline,
+                                                      narrative_mode=settings.narrative_mode)
+        
+        # Final completion message
+        console.print()
+        completion_content = Text()
+        if successful_tours == len(cities_to_tour):
+            completion_content.append("🎉 All Tours Complete! 🎉\n\n", style="bold bright_green")
+            completion_content.append(f"Successfully generated {successful_tours} personalized foodie tours!\n", style="bright_white")
+            completion_content.append("Your culinary adventures await! Bon appétit! 🍽️✨", style="bright_cyan")
+        elif successful_tours > 0:
+            completion_content.append("🌟 Tours Partially Complete\n\n", style="bold bright_yellow")
+            completion_content.append(f"Generated {successful_tours} out of {len(cities_to_tour)} tours.\n", style="bright_white")
+            completion_content.append("Enjoy the tours you have! You can always run Krida again for more. 🍽️", style="bright_cyan")
+        else:
+            completion_content.append("😔 No Tours Generated\n\n", style="bold bright_red")
+            completion_content.append("We couldn't complete any tours this time.\n", style="bright_white")
+            completion_content.append("Please check your internet connection and try again! 🔄", style="bright_cyan")
+        
+        console.print(Panel(
+            completion_content,
+            border_style="bright_green" if successful_tours == len(cities_to_tour) else "bright_yellow" if successful_tours > 0 else "bright_red",
+            padding=(1, 2),
+            title="🍽️ Krida Complete",
+            title_align="center"
+        ))
+        
+        if not args.no_cache:
+            cache_stats = response_cache.stats()
+            console.print(f"[dim]💾 Response cache: {cache_stats['hits']} hits, {cache_stats['misses']} misses "
+                          f"({cache_stats['entries']} entries stored)[/dim]")
+        
+    except KeyboardInterrupt:
+        console.print("\n\n[bright_yellow]👋 Thanks for using Krida! Your culinary adventures await next time![/bright_yellow]")
+    except Exception as e:
+        console.print(f"\n[bold red]❌ Unexpected error:[/bold red] {e}")
+        console.print("[dim]Please try again or report this issue.[/dim]")
+    finally:
+        if prefetcher:
+            prefetcher.shutdown()
+        export_metrics(args.metrics_out, args.metrics_prom)
+
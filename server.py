@@ -0,0 +1,243 @@
+"""
+A long-running local HTTP service for `python main.py --serve`.
+
+One warm WeatherService, JulepService and TourStore serve every request, and identical
+requests in flight at the same time (same normalized city, and budget tier where it
+matters) share a single pipeline run.
+
+    GET /tour?city=Paris&budget=luxury   a full tour, as written by --batch
+        &narrative=template              ...with the narrative written locally, without a model call
+        &narrative=preview               ...the same, while the model's narrative is written for later requests
+    GET /dishes?city=Paris&budget=mid    the city's iconic dishes
+    GET /weather?city=Paris              the current weather and the dining suggestion
+    GET /health                          service, coalescing and cache statistics
+    GET /metrics                         the collected measurements in Prometheus text format
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import threading
+import contextlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Optional, Tuple
+from urllib.parse import parse_qs, urlparse
+from services.cache import ResponseCache
+from services.hedging import HedgePolicy
+from services.metrics import METRICS, export_metrics
+from services.narrative import NARRATIVE_MODES
+from services.normalize import budget_tier, canonical_name, city_key
+from services.single_flight import SingleFlight
+from services.tour_engine import EngineSettings, narrate, plan_tour, summarize_weather
+from services.tour_store import TourStore
+from services.weather import WeatherService
+from services.julep_service import JulepService
+
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_PORT = 8765
+ENDPOINTS = ('/tour', '/dishes', '/weather', '/health', '/metrics')
+
+
+class BadRequest(ValueError):
+    """The request is missing a parameter or has an invalid one."""
+
+
+class TourService:
+    """The warm services behind the HTTP endpoints, with concurrent identical requests coalesced."""
+
+    def __init__(self, weather_service, julep_service, settings: Optional[EngineSettings] = None,
+                 store: Optional[TourStore] = None, cache: Optional[ResponseCache] = None):
+        """
+        Args:
+            weather_service: The WeatherService shared by all requests.
+            julep_service: The JulepService shared by all requests.
+            settings: Limits; settings.max_concurrency caps the tour pipelines running at once.
+            store: Optional TourStore that tours are built on and saved to.
+            cache: The services' ResponseCache, reported by /health.
+        """
+        self.weather_service = weather_service
+        self.julep_service = julep_service
+        self.settings = settings or EngineSettings.from_env()
+        self.store = store
+        self.cache = cache
+        self.started = time.time()
+        self._tour_slots = threading.BoundedSemaphore(self.settings.max_concurrency)
+        # Named apart from the services' own single-flight groups, which coalesce the upstream calls
+        self._flights = {name: SingleFlight(f"http_{name}") for name in ('tour', 'dishes', 'weather', 'narrative')}
+
+    def _resolve(self, city: str) -> str:
+        if hasattr(self.weather_service, 'resolve_city'):
+            return self.weather_service.resolve_city(city)
+        return city
+
+    def tour(self, city: str, budget: str, narrative_mode: Optional[str] = None) -> Tuple[Dict, bool]:
+        """
+        Runs the tour pipeline; returns the tour and whether it was shared with a concurrent identical request.
+
+        In 'preview' mode the tour is answered with the template narrative, and the model's
+        narrative is written in the background and stored, so later requests get it.
+        """
+        narrative_mode = narrative_mode or self.settings.narrative_mode
+        if narrative_mode not in NARRATIVE_MODES:
+            raise BadRequest(f"'narrative' must be one of {', '.join(NARRATIVE_MODES)}")
+
+        def run() -> Dict:
+            # The deadline includes the wait for a pipeline slot, so it bounds the whole response
+            deadline = self.settings.deadline()
+            with self._tour_slots:
+                # plan_tour resolves the city itself, within the deadline
+                tour = plan_tour(city, budget, self.weather_service, self.julep_service, store=self.store,
+                                 deadline=deadline, narrative_mode='template' if narrative_mode == 'preview' else narrative_mode)
+            if narrative_mode == 'preview' and tour['status'] == 'ok' and tour['narrative_source'] == 'template':
+                tour['narrative_pending'] = True
+                threading.Thread(target=self._narrate, args=(tour,), name=f"krida-narrate-{city}", daemon=True).start()
+            return tour
+        return self._flights['tour'].do((city_key(city), budget_tier(budget), narrative_mode), run)
+
+    def _narrate(self, tour: Dict) -> None:
+        try:
+            self._flights['narrative'].do((tour['city_id'], budget_tier(tour['budget'])), narrate,
+                                          tour, self.julep_service, self.store)
+        except Exception as e:
+            print(f"ERROR: Narrative for {tour['city']} failed: {e}")
+
+    def dishes(self, city: str, budget: str) -> Tuple[Dict, bool]:
+        def run() -> Dict:
+            place = self._resolve(city)
+            return {'city': str(place), 'budget': budget, 'dishes': self.julep_service.get_iconic_dishes(place, budget)}
+        return self._flights['dishes'].do((city_key(city), budget_tier(budget)), run)
+
+    def weather(self, city: str) -> Tuple[Dict, bool]:
+        def run() -> Dict:
+            place = self._resolve(city)
+            weather = self.weather_service.get_weather(place)
+            weather_summary, dining_suggestion = summarize_weather(weather)
+            return {'city': str(place), 'weather': weather, 'weather_summary': weather_summary,
+                    'dining_suggestion': dining_suggestion}
+        return self._flights['weather'].do((city_key(city),), run)
+
+    def health(self) -> Dict:
+        return {
+            'status': 'ok',
+            'uptime_s': round(time.time() - self.started, 1),
+            'coalescing': {name: flight.stats() for name, flight in self._flights.items()},
+            'upstream_coalescing': {
+                name: service.dedup_stats() for name, service in
+                (('openweather', self.weather_service), ('julep', self.julep_service)) if hasattr(service, 'dedup_stats')
+            },
+            'cache': self.cache.stats() if self.cache is not None and not self.cache.bypass else None,
+            'store': self.store.stats() if self.store is not None and not self.store.bypass else None,
+        }
+
+
+class TourRequestHandler(BaseHTTPRequestHandler):
+    """Maps GET requests onto a TourService set as the class attribute `service`."""
+
+    protocol_version = "HTTP/1.1"
+    service: TourService = None
+
+    def log_message(self, format, *args):
+        # Requests are counted in the http_request_seconds metric instead of an access log
+        pass
+
+    def _send(self, status: int, body: bytes, content_type: str, headers: Optional[Dict[str, str]] = None) -> None:
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_json(self, status: int, payload, headers: Optional[Dict[str, str]] = None) -> None:
+        body = json.dumps(payload, ensure_ascii=False, default=str).encode('utf-8')
+        self._send(status, body, 'application/json; charset=utf-8', headers)
+
+    @staticmethod
+    def _city(query: Dict[str, list]) -> str:
+        city = canonical_name((query.get('city') or [''])[0])
+        if not city:
+            raise BadRequest("the 'city' parameter is required")
+        return city
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        query = parse_qs(url.query)
+        budget = (query.get('budget') or ['mid'])[0]
+        started = time.perf_counter()
+        status = 200
+        try:
+            if url.path == '/health':
+                return self._send_json(200, self.service.health())
+            if url.path == '/metrics':
+                return self._send(200, METRICS.prometheus_text().encode('utf-8'), 'text/plain; version=0.0.4')
+            if url.path == '/tour':
+                payload, shared = self.service.tour(self._city(query), budget, (query.get('narrative') or [None])[0])
+                # A tour that could not be completed is an upstream failure
+                status = 200 if payload['status'] == 'ok' else 502
+            elif url.path == '/dishes':
+                payload, shared = self.service.dishes(self._city(query), budget)
+                status = 200 if payload['dishes'] else 502
+            elif url.path == '/weather':
+                payload, shared = self.service.weather(self._city(query))
+                status = 200 if payload['weather'] else 502
+            else:
+                status = 404
+                return self._send_json(404, {'error': f"unknown endpoint {url.path}"})
+            self._send_json(status, payload, {'X-Krida-Coalesced': 'true' if shared else 'false'})
+        except BadRequest as e:
+            status = 400
+            self._send_json(400, {'error': str(e)})
+        except Exception as e:
+            status = 500
+            print(f"ERROR: {url.path} failed: {e}", file=sys.stderr)
+            self._send_json(500, {'error': str(e)})
+        finally:
+            path = url.path if url.path in ENDPOINTS else 'other'
+            METRICS.observe('http_request_seconds', time.perf_counter() - started, path=path, status=status)
+
+
+def serve(service: TourService, host: str = DEFAULT_HOST, port: int = DEFAULT_PORT) -> ThreadingHTTPServer:
+    """Creates the HTTP server for a TourService; call serve_forever() on the result to start answering"""
+    handler = type('BoundTourRequestHandler', (TourRequestHandler,), {'service': service})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    server.request_queue_size = 1024
+    return server
+
+
+def main(args: argparse.Namespace, settings: EngineSettings, hedging: Optional[HedgePolicy] = None) -> int:
+    """Entry point for `python main.py --serve`; returns the process exit code"""
+    openweather_api_key = os.getenv('OPENWEATHER_API_KEY')
+    julep_api_key = os.getenv('JULEP_API_KEY')
+    if not openweather_api_key or not julep_api_key:
+        print("ERROR: OPENWEATHER_API_KEY and JULEP_API_KEY must be set.", file=sys.stderr)
+        return 2
+
+    # Responses are the only thing on the wire, so the services' diagnostics are sent to stderr
+    with contextlib.redirect_stdout(sys.stderr):
+        response_cache = ResponseCache(bypass=args.no_cache, refresh=args.refresh_cache)
+        weather_service = WeatherService(api_key=openweather_api_key, id_store=response_cache)
+        julep_service = JulepService(api_key=julep_api_key, cache=response_cache, fused_discovery=args.fused, hedging=hedging)
+        store = TourStore(bypass=args.no_cache, refresh=args.refresh_cache)
+        service = TourService(weather_service, julep_service, settings, store=store, cache=response_cache)
+        try:
+            server = serve(service, args.host, args.port)
+        except OSError as e:
+            print(f"ERROR: Cannot listen on {args.host}:{args.port}: {e}")
+            return 1
+        try:
+            julep_service.ready()
+            host, port = server.server_address[:2]
+            print(f"INFO: Krida tour service listening on http://{host}:{port}")
+            server.serve_forever()
+        except KeyboardInterrupt:
+            print("INFO: Shutting down")
+        except Exception as e:
+            print(f"ERROR: Failed to initialize services: {e}")
+            return 1
+        finally:
+            server.server_close()
+            export_metrics(args.metrics_out, args.metrics_prom)
+    return 0
@@ -0,0 +1,51 @@
+import os
+import json
+import hashlib
+import threading
+from typing import Dict, Optional
+from services.cache import DEFAULT_CACHE_DIR
+
+
+def agent_fingerprint(name: str, model: str, about: str) -> str:
+    """Hashes everything that defines an agent, so any change to it yields a new fingerprint"""
+    return hashlib.sha256(f"{name}\n{model}\n{about}".encode('utf-8')).hexdigest()
+
+
+class AgentRegistry:
+    """Remembers the Julep agents this machine created, by registry key, in a small JSON file."""
+
+    def __init__(self, path: Optional[str] = None):
+        """
+        Initializes the registry.
+
+        Args:
+            path: The JSON file to use. Defaults to agents.json in DEFAULT_CACHE_DIR.
+        """
+        self.path = path or os.path.join(DEFAULT_CACHE_DIR, 'agents.json')
+        self._lock = threading.Lock()
+
+    def _load(self) -> Dict[str, Dict[str, str]]:
+        try:
+            with open(self.path, encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def get(self, key: str) -> Optional[Dict[str, str]]:
+        """Returns the stored {'id', 'fingerprint'} record for a key, if any"""
+        with self._lock:
+            return self._load().get(key)
+
+    def set(self, key: str, agent_id: str, fingerprint: str) -> None:
+        """Records the agent currently used for a key"""
+        with self._lock:
+            records = self._load()
+            records[key] = {'id': agent_id, 'fingerprint': fingerprint}
+            try:
+                os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+                tmp_path = f"{self.path}.tmp"
+                with open(tmp_path, 'w', encoding='utf-8') as f:
+                    json.dump(records, f, indent=2)
+                os.replace(tmp_path, self.path)
+            except OSError as e:
+                print(f"WARNING: Could not save agent registry to {self.path}: {e}")
@@ -0,0 +1,152 @@
+import os
+import json
+import time
+import sqlite3
+import threading
+from typing import Any, Dict, Optional, Tuple
+
+DEFAULT_CACHE_DIR = os.getenv('KRIDA_CACHE_DIR', os.path.join(os.path.expanduser('~'), '.cache', 'krida'))
+
+# Seconds an entry stays fresh, per namespace. Iconic dishes hardly ever change,
+# restaurant picks are refreshed daily.
+DEFAULT_TTLS = {
+    'dishes': 7 * 24 * 3600,
+    'restaurant': 24 * 3600,
+}
+
+
+class ResponseCache:
+    """A persistent SQLite key/value store with per-namespace TTLs and size-bounded LRU eviction."""
+
+    def __init__(self, path: Optional[str] = None, ttls: Optional[Dict[str, float]] = None,
+                 max_entries: int = 5000, bypass: bool = False, refresh: bool = False):
+        """
+        Opens (or creates) the cache database.
+
+        Args:
+            path: The SQLite file to use. Defaults to responses.sqlite3 in DEFAULT_CACHE_DIR.
+            ttls: Per-namespace time-to-live in seconds, merged over DEFAULT_TTLS.
+            max_entries: The entry count above which the least recently used entries are evicted.
+            bypass: Neither read nor write the cache.
+            refresh: Ignore stored entries but store fresh results, refreshing the cache.
+        """
+        self.path = path or os.path.join(DEFAULT_CACHE_DIR, 'responses.sqlite3')
+        self.ttls = {**DEFAULT_TTLS, **(ttls or {})}
+        self.max_entries = max_entries
+        self.bypass = bypass
+        self.refresh = refresh
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+        if self.path != ':memory:':
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        self._db = sqlite3.connect(self.path, check_same_thread=False)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS entries ("
+            " namespace TEXT NOT NULL, key TEXT NOT NULL, value TEXT NOT NULL,"
+            " created_at REAL NOT NULL, accessed_at REAL NOT NULL,"
+            " PRIMARY KEY (namespace, key))"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS entries_accessed_at ON entries (accessed_at)")
+        self._db.commit()
+
+    @staticmethod
+    def make_key(*parts: Any) -> str:
+        """Builds a cache key from parts, ignoring case and repeated whitespace"""
+        return "|".join(" ".join(str(part).lower().split()) for part in parts)
+
+    def get(self, namespace: str, key: str) -> Optional[Any]:
+        """
+        Looks up a fresh entry.
+
+        Args:
+            namespace: The kind of entry, which selects its TTL.
+            key: A key built with make_key.
+
+        Returns:
+            The stored value, or None on a miss, an expired entry, or when bypassing/refreshing.
+        """
+        if self.bypass:
+            return None
+        with self._lock:
+            if self.refresh:
+                self.misses += 1
+                return None
+            row = self._db.execute(
+                "SELECT value, created_at FROM entries WHERE namespace = ? AND key = ?", (namespace, key)
+            ).fetchone()
+            now = time.time()
+            ttl = self.ttls.get(namespace)
+            if row and ttl is not None and row[1] + ttl < now:
+                self._db.execute("DELETE FROM entries WHERE namespace = ? AND key = ?", (namespace, key))
+                self._db.commit()
+                row = None
+            if not row:
+                self.misses += 1
+                return None
+            self._db.execute(
+                "UPDATE entries SET accessed_at = ? WHERE namespace = ? AND key = ?", (now, namespace, key)
+            )
+            self._db.commit()
+            self.hits += 1
+            return json.loads(row[0])
+
+    def peek(self, namespace: str, key: str) -> Optional[Tuple[Any, Optional[float]]]:
+        """
+        Looks up an entry without counting a hit or miss or refreshing its LRU position, even
+        when refreshing, e.g. to find the entries that are about to expire.
+
+        Returns:
+            The value and the seconds it has left to live (None without a TTL), or None if
+            there is no fresh entry.
+        """
+        if self.bypass:
+            return None
+        with self._lock:
+            row = self._db.execute(
+                "SELECT value, created_at FROM entries WHERE namespace = ? AND key = ?", (namespace, key)
+            ).fetchone()
+        if not row:
+            return None
+        ttl = self.ttls.get(namespace)
+        left = None if ttl is None else row[1] + ttl - time.time()
+        if left is not None and left <= 0:
+            return None
+        return json.loads(row[0]), left
+
+    def set(self, namespace: str, key: str, value: Any) -> None:
+        """Stores a JSON-serializable value, evicting the least recently used entries when full"""
+        if self.bypass:
+            return
+        now = time.time()
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO entries (namespace, key, value, created_at, accessed_at) VALUES (?, ?, ?, ?, ?)",
+                (namespace, key, json.dumps(value), now, now)
+            )
+            overflow = self._db.execute("SELECT COUNT(*) FROM entries").fetchone()[0] - self.max_entries
+            if overflow > 0:
+                self._db.execute(
+                    "DELETE FROM entries WHERE rowid IN (SELECT rowid FROM entries ORDER BY accessed_at LIMIT ?)",
+                    (overflow,)
+                )
+            self._db.commit()
+
+    def clear(self) -> None:
+        """Removes every entry"""
+        with self._lock:
+            self._db.execute("DELETE FROM entries")
+            self._db.commit()
+
+    def stats(self) -> Dict[str, Any]:
+        """Returns hit/miss counters, the hit ratio and the current entry count"""
+        with self._lock:
+            entries = self._db.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_ratio': self.hits / lookups if lookups else 0.0,
+            'entries': entries,
+        }
@@ -0,0 +1,176 @@
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional, Sequence
+from services.metrics import METRICS
+from services.normalize import BUDGET_TIERS, cache_id, persistent_id
+from services.tour_engine import MEALS
+
+
+class CacheWarmer:
+    """
+    Precomputes the cached dishes and restaurants of popular cities at every budget tier,
+    most popular first, so tours of those cities are answered from the response cache.
+
+    Entries that are missing, or fresh but within `refresh_ahead` of expiring, are asked
+    for again; the julep_service given should therefore use a ResponseCache opened with
+    refresh=True, so its answers replace the cached ones instead of being read from them.
+    """
+
+    def __init__(self, julep_service, weather_service=None, tiers: Sequence[str] = BUDGET_TIERS,
+                 rate: float = 2.0, max_calls: Optional[int] = 1000, max_tokens: Optional[int] = None,
+                 refresh_ahead: float = 0.1, concurrency: int = 4):
+        """
+        Args:
+            julep_service: A JulepService whose answers are written to the response cache.
+            weather_service: Optional WeatherService resolving the cities to the places tours are cached under.
+            tiers: The budget tiers to warm, see BUDGET_TIERS.
+            rate: The most Julep lookups started per second, leaving capacity for live traffic.
+            max_calls: The most Julep lookups per pass, or None for no limit.
+            max_tokens: The most Julep tokens per pass, from the julep_tokens metric, or None for no limit.
+                Checked before each lookup, so lookups already in flight may go a little over.
+            refresh_ahead: The fraction of an entry's TTL before expiry at which it is refreshed.
+            concurrency: The most cities warmed at once.
+        """
+        self.julep_service = julep_service
+        self.weather_service = weather_service
+        self.tiers = list(tiers)
+        self.rate = rate
+        self.max_calls = max_calls
+        self.max_tokens = max_tokens
+        self.refresh_ahead = refresh_ahead
+        self.concurrency = max(1, concurrency)
+        self._lock = threading.Lock()
+        self._calls = 0
+        self._tokens_at_start = 0.0
+        self._next_call = 0.0
+        self._results: Dict[str, Dict[str, int]] = {}
+
+    def _count(self, namespace: str, result: str) -> None:
+        with self._lock:
+            counts = self._results.setdefault(namespace, {})
+            counts[result] = counts.get(result, 0) + 1
+        METRICS.increment('cache_warmer', namespace=namespace, result=result)
+
+    def _spend(self) -> bool:
+        """Takes one lookup from the budget, waiting for its turn under the rate; False once the budget is spent"""
+        with self._lock:
+            if self.max_calls is not None and self._calls >= self.max_calls:
+                return False
+            if self.max_tokens is not None and METRICS.total('julep_tokens') - self._tokens_at_start >= self.max_tokens:
+                return False
+            self._calls += 1
+            now = time.monotonic()
+            start = max(now, self._next_call)
+            self._next_call = start + (1.0 / self.rate if self.rate > 0 else 0.0)
+        time.sleep(start - now)
+        return True
+
+    def _needs_refresh(self, namespace: str, left: Optional[float]) -> bool:
+        ttl = self.julep_service.cache.ttls.get(namespace)
+        return left is not None and ttl is not None and left < ttl * self.refresh_ahead
+
+    def _ensure(self, namespace: str, place, tier: str, key_parts: tuple, fetch: Callable[[], object]) -> object:
+        """The entry's value, asked for again first when it is missing or about to expire"""
+        entry = self.julep_service.cache_entry(namespace, place, tier, *key_parts)
+        if entry is not None and not self._needs_refresh(namespace, entry[1]):
+            self._count(namespace, 'fresh')
+            return entry[0]
+        cached = entry[0] if entry is not None else None
+        if not self._spend():
+            self._count(namespace, 'skipped')
+            return cached
+        try:
+            value = fetch()
+        except Exception as e:
+            print(f"ERROR: Warming {namespace} for {place} ({tier}) failed: {e}")
+            value = None
+        if not value:
+            self._count(namespace, 'failed')
+            return cached
+        self._count(namespace, 'refreshed' if entry is not None else 'warmed')
+        return value
+
+    def _warm(self, place, tier: str) -> None:
+        dishes = self._ensure('dishes', place, tier, (), lambda: self.julep_service.get_iconic_dishes(place, tier))
+        for dish in (dishes or [])[:len(MEALS)]:
+            self._ensure('restaurant', place, tier, (dish,),
+                         lambda dish=dish: self.julep_service.find_restaurants_for_dish(place, dish, tier))
+
+    def _resolve(self, cities: List[str]) -> List:
+        """The places of the cities in rank order, including those geocoding could not resolve"""
+        if self.weather_service is None or not hasattr(self.weather_service, 'resolve_city'):
+            return list(cities)
+        with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+            places = {}
+            for place in executor.map(self.weather_service.resolve_city, cities):
+                # Names that resolve to one place are warmed once, at their best rank
+                places.setdefault(cache_id(place), place)
+        return list(places.values())
+
+    def run(self, cities: List[str]) -> Dict:
+        """
+        Makes one warming pass over the cities, in rank order, within the rate and budget.
+
+        Args:
+            cities: The cities to warm, most popular first.
+
+        Returns:
+            The pass report: lookups made, tokens used, per-namespace results, the cities that could
+            not be resolved and the coverage afterwards, in which those count as not covered.
+        """
+        started = time.perf_counter()
+        with self._lock:
+            self._calls = 0
+            self._tokens_at_start = METRICS.total('julep_tokens')
+            self._results = {}
+        places = self._resolve(cities)
+        # Nothing looked up for an unresolved place would be cached, so it is left for the next pass
+        skipped = [str(place) for place in places if persistent_id(place) is None]
+        for city in skipped:
+            print(f"WARNING: Could not resolve {city}, skipping it this pass")
+        warmable = [place for place in places if persistent_id(place) is not None]
+        with ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix='krida-warm') as executor:
+            # Submitted in rank order, so the most popular cities are warmed before the budget runs out
+            for future in [executor.submit(self._warm, place, tier) for place in warmable for tier in self.tiers]:
+                future.result()
+        return {
+            'cities': len(places),
+            'skipped': skipped,
+            'tiers': self.tiers,
+            'calls': self._calls,
+            'tokens': int(METRICS.total('julep_tokens') - self._tokens_at_start),
+            'elapsed_s': round(time.perf_counter() - started, 2),
+            'results': self._results,
+            'coverage': self.coverage(places),
+        }
+
+    def _complete(self, place, tier: str) -> bool:
+        """Whether a tour of the place at this tier needs no dish or restaurant lookup; never for an unresolved place"""
+        if persistent_id(place) is None:
+            return False
+        entry = self.julep_service.cache_entry('dishes', place, tier)
+        if entry is None or len(entry[0]) < len(MEALS):
+            return False
+        return all(self.julep_service.cache_entry('restaurant', place, tier, dish) is not None
+                   for dish in entry[0][:len(MEALS)])
+
+    def coverage(self, places: List) -> Dict:
+        """
+        The share of (city, tier) pairs whose dishes and restaurants are all cached and fresh,
+        overall, per tier, and for the top 10 and top 100 cities. Places are given in rank order,
+        and unresolved ones keep their rank as uncovered cities.
+        """
+        complete = {tier: [self._complete(place, tier) for place in places] for tier in self.tiers}
+
+        def ratio(count: Optional[int] = None) -> float:
+            flags = [flag for tier in self.tiers for flag in complete[tier][:count]]
+            return round(sum(flags) / len(flags), 4) if flags else 0.0
+
+        report = {'overall': ratio(), 'by_tier': {
+            tier: round(sum(flags) / len(flags), 4) if flags else 0.0 for tier, flags in complete.items()
+        }}
+        for top in (10, 100):
+            if len(places) > top:
+                report[f'top_{top}'] = ratio(top)
+        return report
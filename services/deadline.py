@@ -0,0 +1,172 @@
+"""
+An overall time budget for one tour, split into per-stage budgets.
+
+Each stage gets its share of whatever time is left, with the shares of the stages after it
+set aside, so time a fast stage does not use flows on to the later ones. A call that
+overruns its stage is abandoned (sync) or cancelled (async) and the pipeline degrades
+instead of waiting for it.
+
+The shares only apply to stages with a fallback to degrade to. A stage without one would
+fail the tour by overrunning, so it may use all the time left but a small reserve, which
+lets the narrative still fall back to its template.
+"""
+import time
+import queue
+import asyncio
+import threading
+import concurrent.futures
+from typing import AsyncIterator, Awaitable, Callable, Dict, Iterator, Optional, Tuple, TypeVar, Union
+
+T = TypeVar('T')
+
+# Stages in pipeline order, with their relative shares of a tour's deadline. Geocoding the
+# city is budgeted on its own, so it and the weather reading together take the weather step's 10%
+DEFAULT_STAGE_SHARES = {'geocode': 0.05, 'weather': 0.05, 'dishes': 0.3, 'restaurants': 0.3, 'narrative': 0.3}
+
+# The fraction of the deadline a stage without a fallback leaves for the template narrative
+NARRATIVE_RESERVE = 0.05
+
+Stages = Union[str, Tuple[str, ...]]
+
+
+class Deadline:
+    """The time left for one tour and how much of it each stage may use."""
+
+    def __init__(self, seconds: float, shares: Optional[Dict[str, float]] = None, reserve: float = NARRATIVE_RESERVE):
+        """
+        Starts the clock.
+
+        Args:
+            seconds: The whole tour's time budget, from now.
+            shares: Relative share of each stage, in pipeline order; defaults to DEFAULT_STAGE_SHARES.
+            reserve: The fraction of seconds kept back from stages without a fallback.
+        """
+        self.seconds = seconds
+        self.shares = dict(shares or DEFAULT_STAGE_SHARES)
+        self.reserve = seconds * reserve
+        self.expires = time.monotonic() + seconds
+
+    def remaining(self) -> float:
+        return max(0.0, self.expires - time.monotonic())
+
+    def stage_budget(self, stages: Stages, fallback: bool = True) -> float:
+        """
+        Seconds a stage, or a run of consecutive stages such as ('dishes', 'restaurants'), may take:
+        its share of the time left, measured against the shares of every stage still to come.
+        Without a fallback, the time left less the reserve.
+        """
+        if not fallback:
+            return max(0.0, self.remaining() - self.reserve)
+        stages = (stages,) if isinstance(stages, str) else stages
+        order = list(self.shares)
+        to_come = sum(self.shares[stage] for stage in order[order.index(stages[0]):])
+        share = sum(self.shares[stage] for stage in stages)
+        return self.remaining() * share / to_come if to_come > 0 else self.remaining()
+
+    def _budget(self, stages: Stages, fallback: bool) -> float:
+        budget = self.stage_budget(stages, fallback)
+        if budget <= 0:
+            raise TimeoutError(f"no time left for {stages}")
+        return budget
+
+    @staticmethod
+    def submit(fn: Callable[..., T], *args, **kwargs) -> concurrent.futures.Future:
+        """
+        Starts fn on a daemon thread and returns its Future.
+
+        A call that overruns cannot be stopped, so it is left to finish on its own thread,
+        which never holds up the interpreter's exit the way an executor's workers would.
+        """
+        future: concurrent.futures.Future = concurrent.futures.Future()
+
+        def run():
+            if not future.set_running_or_notify_cancel():
+                return
+            try:
+                future.set_result(fn(*args, **kwargs))
+            except BaseException as e:
+                future.set_exception(e)
+
+        threading.Thread(target=run, name='krida-deadline-call', daemon=True).start()
+        return future
+
+    def call(self, stages: Stages, fn: Callable[..., T], *args, fallback: bool = True, **kwargs) -> T:
+        """
+        Runs fn within the stage's budget; see stage_budget for `fallback`.
+
+        Raises:
+            TimeoutError: The budget ran out before fn returned.
+        """
+        budget = self._budget(stages, fallback)
+        try:
+            return self.submit(fn, *args, **kwargs).result(timeout=budget)
+        except concurrent.futures.TimeoutError:
+            raise TimeoutError(f"{stages} overran its {budget:.1f}s budget") from None
+
+    def stream(self, stages: Stages, fn: Callable[..., Iterator[T]], *args, fallback: bool = True, **kwargs) -> Iterator[T]:
+        """
+        Yields what the generator fn(*args, **kwargs) yields until the stage's budget runs out.
+
+        The generator runs on a daemon thread and is closed at its next item once the
+        caller stops reading, so an overrun stream does not keep going at the provider.
+
+        Raises:
+            TimeoutError: The budget ran out before the generator was exhausted.
+        """
+        ends = time.monotonic() + self._budget(stages, fallback)
+        items: queue.Queue = queue.Queue()
+        stopped = threading.Event()
+        finished = object()
+
+        def pump():
+            generator = fn(*args, **kwargs)
+            try:
+                for item in generator:
+                    if stopped.is_set():
+                        break
+                    items.put(item)
+                items.put(finished)
+            except BaseException as e:
+                items.put(e)
+            finally:
+                generator.close()
+
+        self.submit(pump)
+        try:
+            while True:
+                try:
+                    item = items.get(timeout=max(0.0, ends - time.monotonic()))
+                except queue.Empty:
+                    raise TimeoutError(f"{stages} overran its budget") from None
+                if item is finished:
+                    return
+                if isinstance(item, BaseException):
+                    raise item
+                yield item
+        finally:
+            stopped.set()
+
+    async def call_async(self, stages: Stages, fn: Callable[..., Awaitable[T]], *args, fallback: bool = True, **kwargs) -> T:
+        """Async version of call; the coroutine is cancelled when it overruns"""
+        budget = self._budget(stages, fallback)
+        try:
+            return await asyncio.wait_for(fn(*args, **kwargs), budget)
+        except asyncio.TimeoutError:
+            raise TimeoutError(f"{stages} overran its {budget:.1f}s budget") from None
+
+    async def stream_async(self, stages: Stages, fn: Callable[..., AsyncIterator[T]], *args, fallback: bool = True,
+                           **kwargs) -> AsyncIterator[T]:
+        """Async version of stream; the async generator is cancelled and closed when it overruns"""
+        ends = time.monotonic() + self._budget(stages, fallback)
+        generator = fn(*args, **kwargs)
+        try:
+            while True:
+                try:
+                    item = await asyncio.wait_for(generator.__anext__(), max(0.0, ends - time.monotonic()))
+                except StopAsyncIteration:
+                    return
+                except asyncio.TimeoutError:
+                    raise TimeoutError(f"{stages} overran its budget") from None
+                yield item
+        finally:
+            await generator.aclose()
@@ -0,0 +1,61 @@
+import threading
+from collections import deque
+from typing import Deque, Dict
+
+
+class HedgePolicy:
+    """
+    Decides when a slow structured Julep call gets a duplicate request.
+
+    The deadline is a percentile of recent latencies for the same kind of call, and
+    hedges are paid for with credit earned per call, so at most `max_hedge_rate` of
+    calls are duplicated over time.
+    """
+
+    def __init__(self, percentile: float = 95.0, max_hedge_rate: float = 0.1, initial_delay: float = 5.0,
+                 min_samples: int = 20, window: int = 200, max_credit: float = 5.0):
+        """
+        Args:
+            percentile: The latency percentile after which a call is hedged.
+            max_hedge_rate: The long-run fraction of calls that may be hedged.
+            initial_delay: The deadline in seconds until min_samples latencies are known.
+            min_samples: Latencies needed before the percentile is trusted.
+            window: Recent latencies kept per kind of call.
+            max_credit: The most hedges that can be saved up for a burst of slow calls.
+        """
+        self.percentile = percentile
+        self.max_hedge_rate = max_hedge_rate
+        self.initial_delay = initial_delay
+        self.min_samples = min_samples
+        self.window = window
+        self.max_credit = max_credit
+        self._latencies: Dict[str, Deque[float]] = {}
+        self._credit = 0.0
+        self._lock = threading.Lock()
+
+    def delay(self, purpose: str) -> float:
+        """Seconds to wait for the first answer before hedging a call of this purpose"""
+        with self._lock:
+            samples = sorted(self._latencies.get(purpose, ()))
+        if len(samples) < self.min_samples:
+            return self.initial_delay
+        rank = max(1, min(len(samples), int(round(self.percentile / 100.0 * len(samples) + 0.5))))
+        return samples[rank - 1]
+
+    def call_started(self) -> None:
+        """Earns the hedge credit of one call"""
+        with self._lock:
+            self._credit = min(self.max_credit, self._credit + self.max_hedge_rate)
+
+    def try_hedge(self) -> bool:
+        """Spends one hedge of credit; False when the hedge budget is used up"""
+        with self._lock:
+            if self._credit < 1:
+                return False
+            self._credit -= 1
+            return True
+
+    def record(self, purpose: str, seconds: float) -> None:
+        """Adds how long a call took to return its first valid answer"""
+        with self._lock:
+            self._latencies.setdefault(purpose, deque(maxlen=self.window)).append(seconds)
@@ -1,146 +1,149 @@
 import json
-import re
-from typing import Optional, List, Dict
-from julep import Julep
+import time
+import asyncio
+import hashlib
+import threading
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from contextlib import contextmanager
+from typing import Optional, List, Dict, Iterator, AsyncIterator, Tuple, Callable, TypeVar, Awaitable
+from services.agent_registry import AgentRegistry, agent_fingerprint
+from services.cache import ResponseCache
+from services.hedging import HedgePolicy
+from services.metrics import METRICS
+from services.normalize import budget_context, cache_id, persistent_id
+from services.rate_control import RATE_CONTROL, ProviderLimiter, Retryable, check_retryable
+from services.session_pool import SessionPool
+from services.single_flight import SingleFlight, coalesced
+from services.structured import (
+    StructuredOutputError, parse_structured, repair_prompt, validate_dishes, validate_fused, validate_restaurant
+)
 
-class JulepService:
-    def __init__(self, api_key: str):
-        self.client = Julep(api_key=api_key)
-        self.agent_id = self._create_culinary_agent()
+T = TypeVar('T')
 
-    def _create_culinary_agent(self) -> str:
-        agent_name = "Krida Culinary Expert"
-        system_prompt = (
-            "You are a world-class culinary expert, food historian, and engaging travel guide. "
-            "Your goal is to provide accurate, structured data in JSON format when asked, "
-            "and to write captivating, blog-style narratives when prompted for a tour."
-        )
-        try:
-            agent = self.client.agents.create(name=agent_name, about=system_prompt, model='gpt-4o')
-            print(f"INFO: Created Julep agent '{agent_name}' with ID: {self.client.api_key[:5]}...{agent.id[-5:]}")
-            return agent.id
-        except Exception as e:
-            print(f"ERROR: Failed to create Julep agent: {e}")
-            raise
+# The julep SDK and its pydantic models take a second or two to import, so they are
+# imported where a client is built and errors are handled rather than at module load
+
+# Seconds before one Julep HTTP request is abandoned, so a hung chat cannot stall a tour indefinitely
+REQUEST_TIMEOUT = 60.0
+
+AGENT_NAME = "Krida Culinary Expert"
+AGENT_MODEL = 'gpt-4o'
+AGENT_SYSTEM_PROMPT = (
+    "You are a world-class culinary expert, food historian, and engaging travel guide. "
+    "Your goal is to provide accurate, structured data in JSON format when asked, "
+    "and to write captivating, blog-style narratives when prompted for a tour."
+)
+
+
+def _discovery_key(service, city: str, budget: str = "mid") -> Tuple[str, str]:
+    return cache_id(city), budget_context(budget)
 
-    def _extract_json_from_response(self, content: str) -> Optional[str]:
-        match = re.search(r'``````', content, re.DOTALL)
-        if match:
-            return match.group(1)
-        match = re.search(r'(\{.*\}|\[.*\])', content, re.DOTALL)
-        if match:
-            return match.group(0)
-        return None
+
+def _restaurant_key(service, city: str, dish_name: str, budget: str = "mid") -> Tuple[str, str, str]:
+    return cache_id(city), budget_context(budget), " ".join(dish_name.lower().split())
+
+
+@contextmanager
+def _retryable_errors() -> Iterator[None]:
+    """Turns Julep rate limits, server errors and connection failures into rate_control exceptions"""
+    from julep import APIConnectionError, APIStatusError
+    try:
+        yield
+    except APIStatusError as e:
+        check_retryable(e.status_code, e.response.headers, str(e))
+        raise
+    except APIConnectionError as e:
+        raise Retryable(str(e)) from e
+
+
+class _JulepServiceBase:
+    """Prompts, response parsing and caching shared by JulepService and AsyncJulepService."""
+
+    meals = ['breakfast', 'lunch', 'dinner']
+
+    def __init__(self, cache: Optional[ResponseCache], agent_registry: Optional[AgentRegistry], fused_discovery: bool,
+                 rate_limiter: Optional[ProviderLimiter], hedging: Optional[HedgePolicy]):
+        self.cache = cache
+        # When set, slow structured calls get a duplicate request on a second session
+        self.hedging = hedging
+        self.rate_limiter = rate_limiter or RATE_CONTROL.limiter('julep')
+        # When set, tours use discover_tour (one request) instead of four separate structured calls
+        self.fused_discovery = fused_discovery
+        self.agent_registry = agent_registry or AgentRegistry()
+        # Concurrent identical lookups, e.g. tours of one city at budgets of the same tier, share one request
+        self.flights = {name: SingleFlight(name) for name in ('dishes', 'restaurant', 'fused')}
+
+    def dedup_stats(self) -> Dict[str, Dict]:
+        """Single-flight statistics per kind of lookup, see SingleFlight.stats"""
+        return {name: flight.stats() for name, flight in self.flights.items()}
+
+    def _registry_key(self) -> str:
+        # Agents belong to an account, so keep a separate record per API key
+        return f"{AGENT_NAME}@{hashlib.sha256(self.client.api_key.encode('utf-8')).hexdigest()[:12]}"
 
     def _get_budget_context(self, budget: str) -> str:
-        """Convert budget input to descriptive context for AI prompts with enhanced support"""
-        budget_lower = budget.lower().strip()
-        
-        # Handle numeric budgets (assuming USD per meal)
-        if budget_lower.replace('$', '').replace(',', '').isdigit():
-            amount = int(budget_lower.replace('$', '').replace(',', ''))
-            if amount < 15:
-                return "budget-friendly (under $15 per meal)"
-            elif amount < 35:
-                return "mid-range ($15-35 per meal)"
-            elif amount < 75:
-                return "upscale ($35-75 per meal)"
-            else:
-                return "luxury ($75+ per meal)"
-        
-        # Enhanced keyword mapping for natural language
-        budget_mapping = {
-            # Budget-friendly variations
-            'budget': 'budget-friendly (under $15 per meal)',
-            'cheap': 'budget-friendly (under $15 per meal)',
-            'low': 'budget-friendly (under $15 per meal)',
-            'affordable': 'budget-friendly (under $15 per meal)',
-            'inexpensive': 'budget-friendly (under $15 per meal)',
-            'economical': 'budget-friendly (under $15 per meal)',
-            'frugal': 'budget-friendly (under $15 per meal)',
-            'tight': 'budget-friendly (under $15 per meal)',
-            
-            # Mid-range variations  
-            'mid': 'mid-range ($15-35 per meal)',
-            'middle': 'mid-range ($15-35 per meal)',
-            'medium': 'mid-range ($15-35 per meal)',
-            'moderate': 'mid-range ($15-35 per meal)',
-            'average': 'mid-range ($15-35 per meal)',
-            'standard': 'mid-range ($15-35 per meal)',
-            'normal': 'mid-range ($15-35 per meal)',
-            'regular': 'mid-range ($15-35 per meal)',
-            'reasonable': 'mid-range ($15-35 per meal)',
-            
-            # Upscale variations
-            'high': 'upscale ($35-75 per meal)',
-            'expensive': 'upscale ($35-75 per meal)',
-            'upscale': 'upscale ($35-75 per meal)',
-            'fancy': 'upscale ($35-75 per meal)',
-            'nice': 'upscale ($35-75 per meal)',
-            'good': 'upscale ($35-75 per meal)',
-            'quality': 'upscale ($35-75 per meal)',
-            'fine': 'upscale ($35-75 per meal)',
-            'elevated': 'upscale ($35-75 per meal)',
-            
-            # Luxury variations
-            'luxury': 'luxury ($75+ per meal)',
-            'premium': 'luxury ($75+ per meal)',
-            'deluxe': 'luxury ($75+ per meal)',
-            'exclusive': 'luxury ($75+ per meal)',
-            'elite': 'luxury ($75+ per meal)',
-            'top': 'luxury ($75+ per meal)',
-            'best': 'luxury ($75+ per meal)',
-            'finest': 'luxury ($75+ per meal)',
-            'gourmet': 'luxury ($75+ per meal)',
-            'michelin': 'luxury ($75+ per meal)',
-            'splurge': 'luxury ($75+ per meal)',
-            'extravagant': 'luxury ($75+ per meal)'
-        }
-        
-        return budget_mapping.get(budget_lower, 'mid-range ($15-35 per meal)')
+        """Convert budget input to the descriptive context of its tier for AI prompts"""
+        return budget_context(budget)
 
-    def get_iconic_dishes(self, city: str, budget: str = "mid") -> Optional[List[str]]:
-        budget_context = self._get_budget_context(budget)
-        user_prompt = (
+    def _cache_get(self, namespace: str, city: str, *key_parts) -> Optional[object]:
+        # Keyed on the resolved place, so "NYC" and "New York City" share entries
+        if self.cache is None or self.cache.bypass:
+            return None
+        value = self.cache.get(namespace, ResponseCache.make_key(cache_id(city), *key_parts))
+        METRICS.increment('cache_lookups', namespace=namespace, result='miss' if value is None else 'hit')
+        return value
+
+    def cache_entry(self, namespace: str, city: str, budget: str, *key_parts) -> Optional[Tuple[object, Optional[float]]]:
+        """
+        The cached answer for a lookup and its seconds left to live, or None, without counting
+        a cache lookup; e.g. cache_entry('restaurant', city, budget, dish). See ResponseCache.peek.
+        """
+        if self.cache is None:
+            return None
+        return self.cache.peek(namespace, ResponseCache.make_key(cache_id(city), self._get_budget_context(budget), *key_parts))
+
+    def _cache_set(self, namespace: str, value, city: str, *key_parts) -> None:
+        key = persistent_id(city)
+        if self.cache is not None and value and key is not None:
+            self.cache.set(namespace, ResponseCache.make_key(key, *key_parts), value)
+
+    @staticmethod
+    def _record_call(usage, purpose: str) -> None:
+        """Adds the token usage reported for one Julep chat to METRICS"""
+        if not usage:
+            return
+        for kind in ('prompt', 'completion'):
+            tokens = usage.get(f'{kind}_tokens') if isinstance(usage, dict) else getattr(usage, f'{kind}_tokens', None)
+            if tokens:
+                METRICS.increment('julep_tokens', tokens, kind=kind, purpose=purpose)
+
+    def _dishes_prompt(self, city: str, budget_context: str) -> str:
+        return (
             f"List exactly 3 iconic, must-try local dishes from {city} that are suitable for a {budget_context} budget. "
             "Focus on authentic, local specialties that represent the city's culinary culture. "
             "Provide your answer as a valid JSON array of strings, like [\"Dish A\", \"Dish B\", \"Dish C\"]. "
             "Do not include any text outside of the JSON array."
         )
-        try:
-            session = self.client.sessions.create(agent=self.agent_id)
-            chat_response = self.client.sessions.chat(session_id=session.id, messages=[{'role': 'user', 'content': user_prompt}], stream=False)
-            content = chat_response.choices[0].message.content
-            json_str = self._extract_json_from_response(content)
-            if not json_str:
-                return None
-            dishes = json.loads(json_str)
-            return dishes
-        except Exception as e:
-            print(f"ERROR: During dish discovery for {city}: {e}\nDEBUG: Raw response was: {content}")
-            return None
 
-    def find_restaurants_for_dish(self, city: str, dish_name: str, budget: str = "mid") -> Optional[Dict]:
-        budget_context = self._get_budget_context(budget)
-        user_prompt = (
+    def _restaurant_prompt(self, city: str, dish_name: str, budget_context: str) -> str:
+        return (
             f'Find the single best, most highly-rated, and authentic restaurant in {city} that is famous for serving "{dish_name}" '
             f'and fits a {budget_context} budget. '
             'Provide your answer as a valid JSON object with four keys: "name" (string), "rating" (string), "reason" (a short string), and "price_range" (string). '
             'Do not include any text outside of the JSON object.'
         )
-        try:
-            session = self.client.sessions.create(agent=self.agent_id)
-            chat_response = self.client.sessions.chat(session_id=session.id, messages=[{'role': 'user', 'content': user_prompt}], stream=False)
-            content = chat_response.choices[0].message.content
-            json_str = self._extract_json_from_response(content)
-            if not json_str:
-                return None
-            return json.loads(json_str)
-        except Exception as e:
-            print(f"ERROR: During restaurant search for {dish_name}: {e}\nDEBUG: Raw response was: {content}")
-            return None
-            
-    def generate_tour_narrative(self, city: str, weather: str, dining_suggestion: str, tour_data: Dict, budget: str = "mid") -> Optional[str]:
+
+    def _fused_prompt(self, city: str, budget_context: str) -> str:
+        return (
+            f"Plan a one-day food tour of {city} for a {budget_context} budget. "
+            "Pick exactly 3 iconic, must-try local dishes that represent the city's culinary culture, one each for breakfast, lunch and dinner, "
+            "and for each dish the single best, most highly-rated, and authentic restaurant in the city that is famous for serving it and fits the budget. "
+            'Provide your answer as a valid JSON array of 3 objects in breakfast, lunch, dinner order, each with two keys: "dish" (string) and '
+            '"restaurant" (an object with four keys: "name" (string), "rating" (string), "reason" (a short string), and "price_range" (string)). '
+            "Do not include any text outside of the JSON array."
+        )
+
+    def _narrative_prompt(self, city: str, weather: str, dining_suggestion: str, tour_data: Dict, budget: str) -> str:
         budget_context = self._get_budget_context(budget)
         # Format the tour_data into a string for the prompt
         prompt_context = f"City: {city}\n"
@@ -153,7 +156,7 @@ class JulepService:
             price_info = f" (Price range: {restaurant.get('price_range', 'N/A')})" if 'price_range' in restaurant else ""
             prompt_context += f"- {meal.capitalize()}: We'll be having {details['dish']} at {restaurant['name']}{price_info}.\n"
 
-        user_prompt = (
+        return (
             "You are writing a fun, engaging blog post for a one-day foodie tour. "
             "Use the context provided below to create a narrative. The tone should be enthusiastic and descriptive. "
             "Structure the post with headings for Breakfast, Lunch, and Dinner. "
@@ -162,14 +165,578 @@ class JulepService:
             f"--- CONTEXT ---\n{prompt_context}"
         )
 
+    def _validate_fused(self, value: object) -> Dict[str, Dict]:
+        return validate_fused(value, self.meals)
+
+    @staticmethod
+    def _repair_messages(messages: List[Dict], content: Optional[str], error: StructuredOutputError) -> List[Dict]:
+        """The conversation for a repair re-ask: the original prompt, the unusable reply and what was wrong with it"""
+        return messages + [
+            {'role': 'assistant', 'content': content or ""},
+            {'role': 'user', 'content': repair_prompt(error)},
+        ]
+
+    def _hedge_finished(self, purpose: str, started: float, attempts: list, winner) -> None:
+        self.hedging.record(purpose, time.perf_counter() - started)
+        if len(attempts) > 1:
+            METRICS.increment('hedges', purpose=purpose, result='hedge_won' if winner is attempts[-1] else 'primary_won')
+
+    @staticmethod
+    def _parse_repaired(content: Optional[str], validate: Callable[[object], T], purpose: str) -> T:
+        try:
+            value = parse_structured(content, validate)
+        except StructuredOutputError:
+            METRICS.increment('structured_repairs', purpose=purpose, result='failed')
+            raise
+        METRICS.increment('structured_repairs', purpose=purpose, result='repaired')
+        return value
+
+    def _cached_fused(self, city: str, budget_context: str) -> Optional[Dict]:
+        """Rebuilds a fused discovery answer when every piece of it is still cached"""
+        dishes = self._cache_get('dishes', city, budget_context)
+        if dishes is None or len(dishes) < len(self.meals):
+            return None
+        restaurants = [self._cache_get('restaurant', city, budget_context, dish) for dish in dishes[:len(self.meals)]]
+        if not all(restaurants):
+            return None
+        return {
+            "dishes": dishes,
+            "tour_data": {meal: {"dish": dishes[i], "restaurant": restaurants[i]} for i, meal in enumerate(self.meals)},
+        }
+
+    def _store_fused(self, city: str, budget_context: str, tour_data: Dict) -> Dict:
+        dishes = [tour_data[meal]['dish'] for meal in self.meals]
+        self._cache_set('dishes', dishes, city, budget_context)
+        for details in tour_data.values():
+            self._cache_set('restaurant', details['restaurant'], city, budget_context, details['dish'])
+        return {"dishes": dishes, "tour_data": tour_data}
+
+    @staticmethod
+    def _parse_chunk(line: str) -> Tuple[str, Optional[Dict]]:
+        """Pulls the text delta, and the token usage when reported, out of one server-sent event line of a streamed chat"""
+        line = line.strip()
+        if line.startswith('data:'):
+            line = line[len('data:'):].strip()
+        if not line or line == '[DONE]':
+            return "", None
+        chunk = json.loads(line)
+        text = ""
+        for choice in chunk.get('choices') or []:
+            content = (choice.get('delta') or choice.get('message') or {}).get('content')
+            if isinstance(content, str):
+                text += content
+            elif isinstance(content, list):
+                text += "".join(part if isinstance(part, str) else part.get('text', '') for part in content)
+        return text, chunk.get('usage')
+
+
+class JulepService(_JulepServiceBase):
+    def __init__(self, api_key: str, cache: Optional[ResponseCache] = None, session_max_uses: int = 25,
+                 agent_registry: Optional[AgentRegistry] = None, fused_discovery: bool = False,
+                 rate_limiter: Optional[ProviderLimiter] = None, hedging: Optional[HedgePolicy] = None,
+                 timeout: float = REQUEST_TIMEOUT):
+        super().__init__(cache, agent_registry, fused_discovery, rate_limiter, hedging)
+        # Hedged calls run every attempt here: room for a primary and a hedge per call the Julep
+        # limiter lets through at once, so the limiter rather than this pool caps concurrency
+        self._hedge_executor = ThreadPoolExecutor(
+            max_workers=2 * self.rate_limiter.settings.max_concurrency, thread_name_prefix='krida-hedge'
+        ) if hedging else None
+        self.session_pool = SessionPool(self._create_session, max_uses=session_max_uses)
+        # The SDK import, the client and the agent lookup happen on a background thread,
+        # so callers can get on with other work until the first Julep call needs them
+        self._client = None
+        self._agent_id = None
+        self._connection: Future = Future()
+        threading.Thread(target=self._connect, args=(api_key, timeout), name='krida-julep-connect', daemon=True).start()
+
+    def _connect(self, api_key: str, timeout: float) -> None:
+        try:
+            from julep import Julep
+            # Retries are left to the rate limiter, which has to see every 429 to back off
+            self._client = Julep(api_key=api_key, max_retries=0, timeout=timeout)
+            self._agent_id = self._create_culinary_agent()
+        except BaseException as e:
+            self._connection.set_exception(e)
+        else:
+            self._connection.set_result(None)
+
+    def ready(self) -> None:
+        """
+        Blocks until the client is built and the agent is found or created.
+
+        Raises:
+            Exception: Whatever setting up the client or the agent raised.
+        """
+        self._connection.result()
+
+    @property
+    def client(self):
+        # _create_culinary_agent runs on the connecting thread once the client exists
+        if self._client is None:
+            self.ready()
+        return self._client
+
+    @property
+    def agent_id(self) -> str:
+        self.ready()
+        return self._agent_id
+
+    def _limited(self, fn: Callable[..., T], *args, **kwargs) -> T:
+        """Calls the Julep SDK through the rate limiter, retrying rate limits and transient failures"""
+        def attempt():
+            with _retryable_errors():
+                return fn(*args, **kwargs)
+        return self.rate_limiter.call(attempt)
+
+    def _create_culinary_agent(self) -> str:
+        """Reuses the agent recorded in the local registry when its definition is unchanged, otherwise creates one"""
+        from julep import NotFoundError
+        fingerprint = agent_fingerprint(AGENT_NAME, AGENT_MODEL, AGENT_SYSTEM_PROMPT)
+        registry_key = self._registry_key()
+        record = self.agent_registry.get(registry_key)
+
+        if record and record.get('fingerprint') == fingerprint:
+            try:
+                agent = self._limited(self.client.agents.get, record['id'])
+                return agent.id
+            except NotFoundError:
+                print(f"INFO: Stored Julep agent '{AGENT_NAME}' no longer exists, creating a new one")
+            except Exception as e:
+                # Only a missing agent is replaced; a network or server error says nothing about
+                # the stored one, and creating another would orphan it
+                print(f"WARNING: Could not verify stored Julep agent '{AGENT_NAME}', using it anyway: {e}")
+                return record['id']
+
+        try:
+            agent = self._limited(self.client.agents.create, name=AGENT_NAME, about=AGENT_SYSTEM_PROMPT, model=AGENT_MODEL)
+            print(f"INFO: Created Julep agent '{AGENT_NAME}' with ID: {self.client.api_key[:5]}...{agent.id[-5:]}")
+        except Exception as e:
+            print(f"ERROR: Failed to create Julep agent: {e}")
+            raise
+        self.agent_registry.set(registry_key, agent.id, fingerprint)
+
+        if record and record.get('fingerprint') != fingerprint:
+            # The definition changed, so the previous agent would otherwise be orphaned
+            try:
+                self._limited(self.client.agents.delete, record['id'])
+            except Exception as e:
+                print(f"WARNING: Could not delete outdated Julep agent {record['id']}: {e}")
+        return agent.id
+
+    def _create_session(self) -> str:
+        with METRICS.timer('julep_call_seconds', call='sessions.create'):
+            return self._limited(self.client.sessions.create, agent=self.agent_id).id
+
+    def _send(self, session_id: str, messages: List[Dict], purpose: str):
+        # Pooled sessions are shared between unrelated prompts, so nothing is saved
+        # to their history: every chat sees only the messages passed in here
+        with METRICS.timer('julep_call_seconds', call='sessions.chat', purpose=purpose):
+            chat_response = self._limited(
+                self.client.sessions.chat, session_id=session_id, messages=messages, stream=False, save=False
+            )
+        self._record_call(chat_response.usage, purpose)
+        return chat_response
+
+    def _chat(self, messages: List[Dict], purpose: str):
+        with self.session_pool.session() as session_id:
+            return self._send(session_id, messages, purpose)
+
+    def _structured_chat(self, user_prompt: str, validate: Callable[[object], T], purpose: str) -> T:
+        """
+        Asks for structured data and returns the first JSON value in the reply that passes validate.
+
+        An unusable reply gets one repair re-ask on the same session, quoting the reply and the problem.
+        With hedging, a call still unanswered at the policy's deadline is sent again on another
+        session and the first valid answer wins.
+
+        Raises:
+            StructuredOutputError: When the repaired reply is unusable as well.
+        """
+        if self.hedging is None:
+            return self._structured_attempt(user_prompt, validate, purpose)
+
+        self.hedging.call_started()
+        superseded = threading.Event()
+        began = threading.Event()
+
+        def run_attempt() -> T:
+            began.set()
+            return self._structured_attempt(user_prompt, validate, purpose, superseded)
+
+        attempts = [self._hedge_executor.submit(run_attempt)]
+        # The hedge delay and the recorded latency count from when the primary starts, not
+        # while it waits for a worker, so a busy pool does not set off hedges of its own
+        began.wait()
+        started = time.perf_counter()
+        pending = set(attempts)
+        done, pending = wait(pending, timeout=self.hedging.delay(purpose))
+        if not done:
+            if self.hedging.try_hedge():
+                attempts.append(self._hedge_executor.submit(run_attempt))
+                pending.add(attempts[-1])
+            METRICS.increment('hedges', purpose=purpose, result='sent' if len(attempts) > 1 else 'over_budget')
+        error = None
+        while True:
+            for attempt in done:
+                try:
+                    value = attempt.result()
+                except Exception as e:
+                    error = error or e
+                    continue
+                # The slower request cannot be interrupted mid-flight, but it skips its repair re-ask
+                superseded.set()
+                self._hedge_finished(purpose, started, attempts, attempt)
+                return value
+            if not pending:
+                raise error
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+
+    def _structured_attempt(self, user_prompt: str, validate: Callable[[object], T], purpose: str,
+                            superseded: Optional[threading.Event] = None) -> T:
+        messages = [{'role': 'user', 'content': user_prompt}]
+        with self.session_pool.session() as session_id:
+            content = self._send(session_id, messages, purpose).choices[0].message.content
+            try:
+                return parse_structured(content, validate)
+            except StructuredOutputError as e:
+                if superseded is not None and superseded.is_set():
+                    raise
+                messages = self._repair_messages(messages, content, e)
+            content = self._send(session_id, messages, purpose).choices[0].message.content
+        return self._parse_repaired(content, validate, purpose)
+
+    @coalesced('dishes', key=_discovery_key)
+    def get_iconic_dishes(self, city: str, budget: str = "mid") -> Optional[List[str]]:
+        budget_context = self._get_budget_context(budget)
+        cached = self._cache_get('dishes', city, budget_context)
+        if cached is not None:
+            return cached
+        user_prompt = self._dishes_prompt(city, budget_context)
+        try:
+            dishes = self._structured_chat(user_prompt, validate_dishes, 'dishes')
+            self._cache_set('dishes', dishes, city, budget_context)
+            return dishes
+        except Exception as e:
+            print(f"ERROR: During dish discovery for {city}: {e}\nDEBUG: Raw response was: {getattr(e, 'content', None)}")
+            return None
+
+    @coalesced('restaurant', key=_restaurant_key)
+    def find_restaurants_for_dish(self, city: str, dish_name: str, budget: str = "mid") -> Optional[Dict]:
+        budget_context = self._get_budget_context(budget)
+        cached = self._cache_get('restaurant', city, budget_context, dish_name)
+        if cached is not None:
+            return cached
+        user_prompt = self._restaurant_prompt(city, dish_name, budget_context)
+        try:
+            restaurant = self._structured_chat(user_prompt, validate_restaurant, 'restaurant')
+            self._cache_set('restaurant', restaurant, city, budget_context, dish_name)
+            return restaurant
+        except Exception as e:
+            print(f"ERROR: During restaurant search for {dish_name}: {e}\nDEBUG: Raw response was: {getattr(e, 'content', None)}")
+            return None
+
+    @coalesced('fused', key=_discovery_key)
+    def discover_tour(self, city: str, budget: str = "mid") -> Optional[Dict]:
+        """
+        Fused discovery: asks for three iconic dishes and a restaurant for each in a single structured request.
+
+        Returns:
+            {"dishes": [...], "tour_data": {meal: {"dish", "restaurant"}}} in the same shape
+            run_tour_for_city builds from get_iconic_dishes and find_restaurants_for_dish,
+            or None when the reply cannot be parsed so the caller can fall back to those calls.
+        """
+        budget_context = self._get_budget_context(budget)
+        cached = self._cached_fused(city, budget_context)
+        if cached is not None:
+            return cached
+        user_prompt = self._fused_prompt(city, budget_context)
+        try:
+            tour_data = self._structured_chat(user_prompt, self._validate_fused, 'fused')
+        except Exception as e:
+            print(f"ERROR: During fused discovery for {city}: {e}\nDEBUG: Raw response was: {getattr(e, 'content', None)}")
+            return None
+        return self._store_fused(city, budget_context, tour_data)
+
+    def generate_tour_narrative(self, city: str, weather: str, dining_suggestion: str, tour_data: Dict, budget: str = "mid") -> Optional[str]:
+        user_prompt = self._narrative_prompt(city, weather, dining_suggestion, tour_data, budget)
+        try:
+            chat_response = self._chat([{'role': 'user', 'content': user_prompt}], 'narrative')
+            return chat_response.choices[0].message.content
+        except Exception as e:
+            print(f"ERROR: During narrative generation for {city}: {e}")
+            return None
+
+    def stream_tour_narrative(self, city: str, weather: str, dining_suggestion: str, tour_data: Dict, budget: str = "mid") -> Iterator[str]:
+        """
+        Streaming variant of generate_tour_narrative that yields the narrative in chunks as they arrive.
+
+        If streaming fails before anything was received, the full narrative is requested
+        without streaming and yielded as a single chunk instead.
+        """
+        user_prompt = self._narrative_prompt(city, weather, dining_suggestion, tour_data, budget)
+        received = False
+        try:
+            usage = None
+            # A stream cannot be retried once it has started, so it only holds a rate limiter slot
+            with self.session_pool.session() as session_id, self.rate_limiter.slot(), \
+                    METRICS.timer('julep_call_seconds', call='sessions.chat_stream', purpose='narrative'), \
+                    _retryable_errors():
+                with self.client.sessions.with_streaming_response.chat(
+                    session_id=session_id,
+                    messages=[{'role': 'user', 'content': user_prompt}],
+                    stream=True,
+                    save=False
+                ) as response:
+                    for line in response.iter_lines():
+                        text, chunk_usage = self._parse_chunk(line)
+                        usage = chunk_usage or usage
+                        if text:
+                            received = True
+                            yield text
+            self._record_call(usage, 'narrative')
+        except Exception as e:
+            if received:
+                print(f"ERROR: Narrative stream for {city} was interrupted: {e}")
+                return
+            print(f"WARNING: Streaming narrative for {city} failed, retrying without streaming: {e}")
+            narrative = self.generate_tour_narrative(city, weather, dining_suggestion, tour_data, budget)
+            if narrative:
+                yield narrative
+
+
+class AsyncJulepService(_JulepServiceBase):
+    """asyncio counterpart of JulepService built on the AsyncJulep client, with the same methods as coroutines."""
+
+    def __init__(self, api_key: str, cache: Optional[ResponseCache] = None, session_max_uses: int = 25,
+                 agent_registry: Optional[AgentRegistry] = None, fused_discovery: bool = False,
+                 rate_limiter: Optional[ProviderLimiter] = None, hedging: Optional[HedgePolicy] = None,
+                 timeout: float = REQUEST_TIMEOUT):
+        from julep import AsyncJulep
+        self.client = AsyncJulep(api_key=api_key, max_retries=0, timeout=timeout)
+        super().__init__(cache, agent_registry, fused_discovery, rate_limiter, hedging)
+        # The agent is resolved on first use, since that needs a running event loop
+        self.agent_id = None
+        self._agent_lock = None
+        # One event loop keeps many chats in flight, so keep enough idle sessions to match
+        self.session_pool = SessionPool(None, max_uses=session_max_uses, max_idle=256)
+
+    async def _ensure_agent(self) -> str:
+        if self.agent_id is not None:
+            return self.agent_id
+        if self._agent_lock is None:
+            self._agent_lock = asyncio.Lock()
+        async with self._agent_lock:
+            if self.agent_id is None:
+                self.agent_id = await self._create_culinary_agent()
+        return self.agent_id
+
+    async def _limited(self, fn: Callable[..., Awaitable[T]], *args, **kwargs) -> T:
+        """Async version of JulepService._limited"""
+        async def attempt():
+            with _retryable_errors():
+                return await fn(*args, **kwargs)
+        return await self.rate_limiter.call_async(attempt)
+
+    async def _create_culinary_agent(self) -> str:
+        """Reuses the agent recorded in the local registry when its definition is unchanged, otherwise creates one"""
+        from julep import NotFoundError
+        fingerprint = agent_fingerprint(AGENT_NAME, AGENT_MODEL, AGENT_SYSTEM_PROMPT)
+        registry_key = self._registry_key()
+        record = self.agent_registry.get(registry_key)
+
+        if record and record.get('fingerprint') == fingerprint:
+            try:
+                agent = await self._limited(self.client.agents.get, record['id'])
+                return agent.id
+            except NotFoundError:
+                print(f"INFO: Stored Julep agent '{AGENT_NAME}' no longer exists, creating a new one")
+            except Exception as e:
+                # Only a missing agent is replaced; a network or server error says nothing about
+                # the stored one, and creating another would orphan it
+                print(f"WARNING: Could not verify stored Julep agent '{AGENT_NAME}', using it anyway: {e}")
+                return record['id']
+
         try:
-            session = self.client.sessions.create(agent=self.agent_id)
-            chat_response = self.client.sessions.chat(
-                session_id=session.id,
-                messages=[{'role': 'user', 'content': user_prompt}],
-                stream=False
+            agent = await self._limited(self.client.agents.create, name=AGENT_NAME, about=AGENT_SYSTEM_PROMPT, model=AGENT_MODEL)
+            print(f"INFO: Created Julep agent '{AGENT_NAME}' with ID: {self.client.api_key[:5]}...{agent.id[-5:]}")
+        except Exception as e:
+            print(f"ERROR: Failed to create Julep agent: {e}")
+            raise
+        self.agent_registry.set(registry_key, agent.id, fingerprint)
+
+        if record and record.get('fingerprint') != fingerprint:
+            try:
+                await self._limited(self.client.agents.delete, record['id'])
+            except Exception as e:
+                print(f"WARNING: Could not delete outdated Julep agent {record['id']}: {e}")
+        return agent.id
+
+    async def _checkout_session(self) -> str:
+        session_id = self.session_pool.checkout()
+        if session_id is None:
+            agent_id = await self._ensure_agent()
+            with METRICS.timer('julep_call_seconds', call='sessions.create'):
+                session = await self._limited(self.client.sessions.create, agent=agent_id)
+            session_id = self.session_pool.register(session.id)
+        return session_id
+
+    async def _send(self, session_id: str, messages: List[Dict], purpose: str):
+        with METRICS.timer('julep_call_seconds', call='sessions.chat', purpose=purpose):
+            chat_response = await self._limited(
+                self.client.sessions.chat, session_id=session_id, messages=messages, stream=False, save=False
             )
+        self._record_call(chat_response.usage, purpose)
+        return chat_response
+
+    async def _chat(self, messages: List[Dict], purpose: str):
+        session_id = await self._checkout_session()
+        ok = False
+        try:
+            chat_response = await self._send(session_id, messages, purpose)
+            ok = True
+        finally:
+            self.session_pool.checkin(session_id, discard=not ok)
+        return chat_response
+
+    async def _structured_chat(self, user_prompt: str, validate: Callable[[object], T], purpose: str) -> T:
+        """Async version of JulepService._structured_chat; the losing request of a hedged call is cancelled"""
+        if self.hedging is None:
+            return await self._structured_attempt(user_prompt, validate, purpose)
+
+        self.hedging.call_started()
+        started = time.perf_counter()
+        attempts = [asyncio.ensure_future(self._structured_attempt(user_prompt, validate, purpose))]
+        pending = set(attempts)
+        try:
+            done, pending = await asyncio.wait(pending, timeout=self.hedging.delay(purpose))
+            if not done:
+                if self.hedging.try_hedge():
+                    attempts.append(asyncio.ensure_future(self._structured_attempt(user_prompt, validate, purpose)))
+                    pending.add(attempts[-1])
+                METRICS.increment('hedges', purpose=purpose, result='sent' if len(attempts) > 1 else 'over_budget')
+            error = None
+            while True:
+                for attempt in done:
+                    if attempt.exception() is not None:
+                        error = error or attempt.exception()
+                        continue
+                    self._hedge_finished(purpose, started, attempts, attempt)
+                    return attempt.result()
+                if not pending:
+                    raise error
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            for attempt in pending:
+                attempt.cancel()
+
+    async def _structured_attempt(self, user_prompt: str, validate: Callable[[object], T], purpose: str) -> T:
+        messages = [{'role': 'user', 'content': user_prompt}]
+        session_id = await self._checkout_session()
+        ok = False
+        try:
+            content = (await self._send(session_id, messages, purpose)).choices[0].message.content
+            try:
+                value = parse_structured(content, validate)
+                ok = True
+                return value
+            except StructuredOutputError as e:
+                messages = self._repair_messages(messages, content, e)
+            content = (await self._send(session_id, messages, purpose)).choices[0].message.content
+            ok = True
+        finally:
+            self.session_pool.checkin(session_id, discard=not ok)
+        return self._parse_repaired(content, validate, purpose)
+
+    @coalesced('dishes', key=_discovery_key)
+    async def get_iconic_dishes(self, city: str, budget: str = "mid") -> Optional[List[str]]:
+        budget_context = self._get_budget_context(budget)
+        cached = self._cache_get('dishes', city, budget_context)
+        if cached is not None:
+            return cached
+        try:
+            dishes = await self._structured_chat(self._dishes_prompt(city, budget_context), validate_dishes, 'dishes')
+            self._cache_set('dishes', dishes, city, budget_context)
+            return dishes
+        except Exception as e:
+            print(f"ERROR: During dish discovery for {city}: {e}\nDEBUG: Raw response was: {getattr(e, 'content', None)}")
+            return None
+
+    @coalesced('restaurant', key=_restaurant_key)
+    async def find_restaurants_for_dish(self, city: str, dish_name: str, budget: str = "mid") -> Optional[Dict]:
+        budget_context = self._get_budget_context(budget)
+        cached = self._cache_get('restaurant', city, budget_context, dish_name)
+        if cached is not None:
+            return cached
+        try:
+            restaurant = await self._structured_chat(
+                self._restaurant_prompt(city, dish_name, budget_context), validate_restaurant, 'restaurant'
+            )
+            self._cache_set('restaurant', restaurant, city, budget_context, dish_name)
+            return restaurant
+        except Exception as e:
+            print(f"ERROR: During restaurant search for {dish_name}: {e}\nDEBUG: Raw response was: {getattr(e, 'content', None)}")
+            return None
+
+    @coalesced('fused', key=_discovery_key)
+    async def discover_tour(self, city: str, budget: str = "mid") -> Optional[Dict]:
+        """Async version of JulepService.discover_tour"""
+        budget_context = self._get_budget_context(budget)
+        cached = self._cached_fused(city, budget_context)
+        if cached is not None:
+            return cached
+        try:
+            tour_data = await self._structured_chat(self._fused_prompt(city, budget_context), self._validate_fused, 'fused')
+        except Exception as e:
+            print(f"ERROR: During fused discovery for {city}: {e}\nDEBUG: Raw response was: {getattr(e, 'content', None)}")
+            return None
+        return self._store_fused(city, budget_context, tour_data)
+
+    async def generate_tour_narrative(self, city: str, weather: str, dining_suggestion: str, tour_data: Dict, budget: str = "mid") -> Optional[str]:
+        user_prompt = self._narrative_prompt(city, weather, dining_suggestion, tour_data, budget)
+        try:
+            chat_response = await self._chat([{'role': 'user', 'content': user_prompt}], 'narrative')
             return chat_response.choices[0].message.content
         except Exception as e:
             print(f"ERROR: During narrative generation for {city}: {e}")
             return None
+
+    async def stream_tour_narrative(self, city: str, weather: str, dining_suggestion: str, tour_data: Dict, budget: str = "mid") -> AsyncIterator[str]:
+        """Async version of JulepService.stream_tour_narrative"""
+        user_prompt = self._narrative_prompt(city, weather, dining_suggestion, tour_data, budget)
+        received = False
+        try:
+            session_id = await self._checkout_session()
+            usage = None
+            ok = False
+            try:
+                async with self.rate_limiter.slot_async():
+                    with METRICS.timer('julep_call_seconds', call='sessions.chat_stream', purpose='narrative'), \
+                            _retryable_errors():
+                        async with self.client.sessions.with_streaming_response.chat(
+                            session_id=session_id,
+                            messages=[{'role': 'user', 'content': user_prompt}],
+                            stream=True,
+                            save=False
+                        ) as response:
+                            async for line in response.iter_lines():
+                                text, chunk_usage = self._parse_chunk(line)
+                                usage = chunk_usage or usage
+                                if text:
+                                    received = True
+                                    yield text
+                ok = True
+            finally:
+                self.session_pool.checkin(session_id, discard=not ok)
+            self._record_call(usage, 'narrative')
+        except Exception as e:
+            if received:
+                print(f"ERROR: Narrative stream for {city} was interrupted: {e}")
+                return
+            print(f"WARNING: Streaming narrative for {city} failed, retrying without streaming: {e}")
+            narrative = await self.generate_tour_narrative(city, weather, dining_suggestion, tour_data, budget)
+            if narrative:
+                yield narrative
+
+    async def aclose(self) -> None:
+        """Closes the pooled connections"""
+        await self.client.close()
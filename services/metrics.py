@@ -0,0 +1,173 @@
+import json
+import time
+import threading
+from collections import deque
+from contextlib import contextmanager
+from typing import IO, Dict, Iterator, List, Optional, Tuple
+
+# Histogram bucket upper bounds in seconds, from a cache hit to a slow LLM reply
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# What each metric recorded by Krida measures, used for the Prometheus HELP lines
+METRIC_HELP = {
+    'stage_seconds': "Wall time of each tour pipeline stage (weather, dishes, restaurants, narrative, total).",
+    'tours': "Tours finished, by status.",
+    'julep_call_seconds': "Wall time of Julep API calls (sessions.create, sessions.chat, sessions.chat_stream), including rate limiter waits and retries.",
+    'julep_tokens': "Tokens reported in Julep chat usage, by kind and purpose.",
+    'weather_request_seconds': "Wall time of OpenWeather requests, by endpoint and outcome.",
+    'cache_lookups': "Cache lookups, by namespace and result.",
+    'prefetch': "Speculative lookups made while cities were entered, by whether a tour used them.",
+    'provider_retries': "Calls retried by the rate limiter, by provider and reason (rate_limited or error).",
+    'rate_wait_seconds': "Time calls waited for a rate limiter token, concurrency slot or Retry-After, by provider.",
+    'hedges': "Structured Julep calls that passed their hedging deadline, by purpose and result (sent, over_budget, hedge_won, primary_won).",
+    'structured_repairs': "Repair re-asks after an unusable structured reply, by purpose and whether the retry parsed.",
+    'http_request_seconds': "Wall time of requests to the --serve HTTP service, by endpoint and status.",
+    'single_flight': "Calls to a single-flight group, by whether they ran the call (leader) or shared one in flight (shared).",
+    'tour_pieces': "Tour pieces (weather, dishes, restaurant, narrative), by whether they were generated or reused from the tour store.",
+    'stage_degraded': "Tour stages that overran their share of the tour deadline, by stage and the fallback used instead.",
+    'cache_warmer': "Cache entries the warmer checked, by namespace and result (fresh, warmed, refreshed, failed, skipped).",
+}
+
+_LabelKey = Tuple[Tuple[str, str], ...]
+
+
+def _label_key(labels: Dict[str, object]) -> _LabelKey:
+    return tuple(sorted((name, str(value)) for name, value in labels.items()))
+
+
+def _prometheus_labels(labels: _LabelKey, extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = list(labels) + ([extra] if extra else [])
+    if not pairs:
+        return ""
+    escaped = (
+        f'{name}="' + value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') + '"'
+        for name, value in pairs
+    )
+    return "{" + ",".join(escaped) + "}"
+
+
+class Metrics:
+    """Thread-safe counters and latency histograms, exportable as JSON lines or Prometheus text."""
+
+    def __init__(self, prefix: str = 'krida', buckets: Tuple[float, ...] = DEFAULT_BUCKETS, max_events: int = 100_000):
+        """
+        Initializes an empty registry.
+
+        Args:
+            prefix: Prepended to every metric name in the Prometheus export.
+            buckets: Histogram bucket upper bounds in seconds.
+            max_events: The most raw observations kept for the JSON lines export; older ones are dropped.
+        """
+        self.prefix = prefix
+        self.buckets = tuple(sorted(buckets))
+        self._counters: Dict[str, Dict[_LabelKey, float]] = {}
+        self._histograms: Dict[str, Dict[_LabelKey, List[float]]] = {}
+        self._events = deque(maxlen=max_events)
+        self._lock = threading.Lock()
+
+    def increment(self, name: str, amount: float = 1, **labels) -> None:
+        """Adds to a counter, e.g. increment('cache_lookups', namespace='dishes', result='hit')"""
+        key = _label_key(labels)
+        with self._lock:
+            series = self._counters.setdefault(name, {})
+            series[key] = series.get(key, 0) + amount
+            self._events.append({'ts': time.time(), 'type': 'counter', 'name': name, 'value': amount, 'labels': dict(key)})
+
+    def observe(self, name: str, seconds: float, **labels) -> None:
+        """Records one duration in a histogram"""
+        key = _label_key(labels)
+        with self._lock:
+            series = self._histograms.setdefault(name, {})
+            # Per series: one count per bucket, then the sum and the total count
+            state = series.get(key)
+            if state is None:
+                state = series[key] = [0] * len(self.buckets) + [0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if seconds <= bound:
+                    state[i] += 1
+            state[-2] += seconds
+            state[-1] += 1
+            self._events.append({'ts': time.time(), 'type': 'histogram', 'name': name, 'value': seconds, 'labels': dict(key)})
+
+    @contextmanager
+    def timer(self, name: str, **labels) -> Iterator[Dict[str, object]]:
+        """
+        Times the enclosed block into a histogram with an `outcome` label of 'ok' or 'error'.
+
+        Yields the labels dictionary, so the block can add labels it only learns while running.
+        """
+        labels = dict(labels)
+        started = time.perf_counter()
+        outcome = 'error'
+        try:
+            yield labels
+            outcome = 'ok'
+        finally:
+            labels.setdefault('outcome', outcome)
+            self.observe(name, time.perf_counter() - started, **labels)
+
+    def total(self, name: str) -> float:
+        """The sum of a counter over all of its label sets"""
+        with self._lock:
+            return sum(self._counters.get(name, {}).values())
+
+    def events(self) -> List[Dict]:
+        """Returns the raw observations, oldest first"""
+        with self._lock:
+            return list(self._events)
+
+    def write_jsonl(self, out: IO[str]) -> int:
+        """Writes every raw observation as one JSON line; returns how many were written"""
+        events = self.events()
+        for event in events:
+            out.write(json.dumps(event) + "\n")
+        return len(events)
+
+    def prometheus_text(self) -> str:
+        """Renders counters and histograms in the Prometheus text exposition format"""
+        lines = []
+        with self._lock:
+            for name, series in sorted(self._counters.items()):
+                metric = f"{self.prefix}_{name}_total"
+                if name in METRIC_HELP:
+                    lines.append(f"# HELP {metric} {METRIC_HELP[name]}")
+                lines.append(f"# TYPE {metric} counter")
+                for key, value in sorted(series.items()):
+                    lines.append(f"{metric}{_prometheus_labels(key)} {value:g}")
+            for name, series in sorted(self._histograms.items()):
+                metric = f"{self.prefix}_{name}"
+                if name in METRIC_HELP:
+                    lines.append(f"# HELP {metric} {METRIC_HELP[name]}")
+                lines.append(f"# TYPE {metric} histogram")
+                for key, state in sorted(series.items()):
+                    for i, bound in enumerate(self.buckets):
+                        lines.append(f"{metric}_bucket{_prometheus_labels(key, ('le', f'{bound:g}'))} {state[i]}")
+                    lines.append(f"{metric}_bucket{_prometheus_labels(key, ('le', '+Inf'))} {state[-1]}")
+                    lines.append(f"{metric}_sum{_prometheus_labels(key)} {state[-2]:.6f}")
+                    lines.append(f"{metric}_count{_prometheus_labels(key)} {state[-1]}")
+        return "\n".join(lines) + "\n"
+
+    def reset(self) -> None:
+        """Drops everything recorded so far"""
+        with self._lock:
+            self._counters.clear()
+            self._histograms.clear()
+            self._events.clear()
+
+
+# The process-wide registry every service and the tour pipeline record into
+METRICS = Metrics()
+
+
+def export_metrics(jsonl_path: Optional[str] = None, prometheus_path: Optional[str] = None,
+                   metrics: Metrics = METRICS) -> None:
+    """Writes the registry to a JSON lines file and/or a Prometheus text file, when paths are given"""
+    try:
+        if jsonl_path:
+            with open(jsonl_path, 'w', encoding='utf-8') as f:
+                metrics.write_jsonl(f)
+        if prometheus_path:
+            with open(prometheus_path, 'w', encoding='utf-8') as f:
+                f.write(metrics.prometheus_text())
+    except OSError as e:
+        print(f"WARNING: Could not write metrics: {e}")
@@ -0,0 +1,95 @@
+"""
+Tour narratives written locally from templates, without a model call.
+
+The template narrative has the same Breakfast, Lunch and Dinner Markdown headings as the
+generated one, so it renders wherever that would. It is the whole narrative in 'template'
+mode, the stand-in shown until the generated one arrives in 'preview' mode, and the
+fallback when the generated one overruns a tour's deadline.
+"""
+import zlib
+from typing import Dict, Optional, Sequence
+from services.normalize import budget_context, budget_tier
+
+# llm: the model writes the narrative. template: written locally in milliseconds.
+# preview: the template narrative right away, replaced by the model's once it is written.
+NARRATIVE_MODES = ('llm', 'template', 'preview')
+DEFAULT_NARRATIVE_MODE = 'llm'
+
+MEAL_HEADINGS = {'breakfast': "Breakfast", 'lunch': "Lunch", 'dinner': "Dinner"}
+
+_TITLES = {
+    'budget': "A Thrifty Day of Eating in {city}",
+    'mid': "A Day of Eating in {city}",
+    'upscale': "An Indulgent Day of Eating in {city}",
+    'luxury': "A Grand Day of Eating in {city}",
+}
+
+# Alternative openings per meal; one is picked per city so a tour always reads the same
+_OPENINGS = {
+    'breakfast': (
+        "Start the morning at **{name}**{rating}, where the {dish} is worth getting up early for.",
+        "Ease into the day with {dish} at **{name}**{rating}.",
+        "Breakfast is {dish}, and **{name}**{rating} is the place to have it.",
+    ),
+    'lunch': (
+        "By midday, make your way to **{name}**{rating} for {dish}.",
+        "Lunch brings {dish} at **{name}**{rating}.",
+        "When hunger strikes again, **{name}**{rating} is serving {dish}.",
+    ),
+    'dinner': (
+        "End the day at **{name}**{rating} with {dish}.",
+        "For dinner, settle in at **{name}**{rating} and order the {dish}.",
+        "The evening belongs to {dish} at **{name}**{rating}.",
+    ),
+}
+_OTHER_MEAL = ("Next stop: **{name}**{rating}, for {dish}.",)
+
+
+def _pick(options: Sequence[str], *seed: str) -> str:
+    # crc32 rather than hash(), which changes between runs
+    return options[zlib.crc32("|".join(seed).encode('utf-8')) % len(options)]
+
+
+def _sentence(text: Optional[str]) -> str:
+    text = (text or "").strip()
+    return text if not text or text[-1] in ".!?" else text + "."
+
+
+def _weather_line(city: str, weather_summary: str, dining_suggestion: str) -> str:
+    if weather_summary == "Variable conditions":
+        return f"The weather in {city} is hard to call today, so the plan leaves room for {dining_suggestion}."
+    return f"It's {weather_summary} in {city} right now, which makes today one for {dining_suggestion}."
+
+
+def template_narrative(city: str, weather_summary: str, dining_suggestion: str, tour_data: Dict, budget: str = "mid") -> str:
+    """
+    Writes the tour narrative from the itinerary, weather and budget without calling the model.
+
+    Args:
+        city: The city of the tour.
+        weather_summary: The weather summary from summarize_weather.
+        dining_suggestion: The dining suggestion from summarize_weather.
+        tour_data: The tour's meals, as {'dish': ..., 'restaurant': {...}} in meal order.
+        budget: The budget keyword or per-meal amount.
+
+    Returns:
+        The narrative as Markdown, with a heading per meal.
+    """
+    lines = [
+        f"# {_TITLES[budget_tier(budget)].format(city=city)}",
+        "",
+        f"{_weather_line(city, weather_summary, dining_suggestion)} "
+        f"Every stop below is {budget_context(budget)}.",
+    ]
+    for meal, details in tour_data.items():
+        restaurant = details['restaurant']
+        rating = f" (rated {restaurant['rating']})" if restaurant.get('rating') else ""
+        opening = _pick(_OPENINGS.get(meal, _OTHER_MEAL), str(city), meal)
+        paragraph = [opening.format(name=restaurant['name'], rating=rating, dish=details['dish'])]
+        if restaurant.get('reason'):
+            paragraph.append(_sentence(restaurant['reason']))
+        if restaurant.get('price_range'):
+            paragraph.append(f"Expect to pay around {restaurant['price_range']}.")
+        lines += ["", f"## {MEAL_HEADINGS.get(meal, meal.capitalize())}: {details['dish']}", "", " ".join(paragraph)]
+    lines += ["", "Enjoy every bite!"]
+    return "\n".join(lines) + "\n"
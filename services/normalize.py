@@ -0,0 +1,173 @@
+"""
+Canonical forms for user input, so that equivalent requests share cache keys and prompts:
+budget text maps to one of four tiers, and city names map to one canonical place.
+"""
+import re
+from typing import Dict, Optional
+
+# The budget tiers every budget input is reduced to, cheapest first
+BUDGET_TIERS = ('budget', 'mid', 'upscale', 'luxury')
+DEFAULT_BUDGET_TIER = 'mid'
+
+# How each tier is described to the model
+BUDGET_CONTEXTS = {
+    'budget': "budget-friendly (under $15 per meal)",
+    'mid': "mid-range ($15-35 per meal)",
+    'upscale': "upscale ($35-75 per meal)",
+    'luxury': "luxury ($75+ per meal)",
+}
+
+# Exclusive upper bounds in USD per meal; larger amounts are luxury
+_TIER_LIMITS = ((15, 'budget'), (35, 'mid'), (75, 'upscale'))
+
+BUDGET_KEYWORDS = {
+    'budget': ('budget', 'cheap', 'low', 'affordable', 'inexpensive', 'economical', 'budget friendly',
+               'budget-friendly', 'frugal', 'tight'),
+    'mid': ('mid', 'middle', 'medium', 'moderate', 'average', 'standard', 'normal', 'regular',
+            'mid range', 'mid-range', 'reasonable'),
+    'upscale': ('high', 'expensive', 'upscale', 'fancy', 'nice', 'good', 'quality', 'fine', 'elevated',
+                'high end', 'high-end'),
+    'luxury': ('luxury', 'premium', 'deluxe', 'exclusive', 'elite', 'top', 'best', 'finest', 'gourmet',
+               'michelin', 'splurge', 'extravagant'),
+}
+_KEYWORD_TIERS = {keyword: tier for tier, keywords in BUDGET_KEYWORDS.items() for keyword in keywords}
+# Longest keywords first, so "high end" wins over "high" and "budget friendly" over "budget"
+_BUDGET_PATTERN = re.compile(
+    r'\b(' + '|'.join(re.escape(keyword) for keyword in sorted(_KEYWORD_TIERS, key=len, reverse=True)) + r')\b'
+)
+_AMOUNT_PATTERN = re.compile(r'\d+')
+
+# Common alternative names, nicknames and former names, keyed by lowercase input
+CITY_ALIASES: Dict[str, str] = {
+    'nyc': "New York",
+    'ny': "New York",
+    'new york city': "New York",
+    'la': "Los Angeles",
+    'sf': "San Francisco",
+    'san fran': "San Francisco",
+    'dc': "Washington",
+    'washington dc': "Washington",
+    'washington d.c.': "Washington",
+    'philly': "Philadelphia",
+    'nola': "New Orleans",
+    'vegas': "Las Vegas",
+    'bombay': "Mumbai",
+    'calcutta': "Kolkata",
+    'madras': "Chennai",
+    'peking': "Beijing",
+    'saigon': "Ho Chi Minh City",
+    'hcmc': "Ho Chi Minh City",
+    'cdmx': "Mexico City",
+    'rio': "Rio de Janeiro",
+    'kiev': "Kyiv",
+    'constantinople': "Istanbul",
+}
+
+
+def parse_budget(text: Optional[str]) -> Optional[str]:
+    """
+    Reads a budget from free text.
+
+    Returns:
+        The per-meal amount as a digit string when the text contains a number, otherwise
+        the tier named by the first budget keyword, or None when nothing is recognized.
+    """
+    if not text:
+        return None
+    cleaned = text.lower().replace('$', '').replace(',', '')
+    amount = _AMOUNT_PATTERN.search(cleaned)
+    if amount:
+        return amount.group()
+    keyword = _BUDGET_PATTERN.search(cleaned)
+    return _KEYWORD_TIERS[keyword.group(1)] if keyword else None
+
+
+def budget_tier(budget: Optional[str]) -> str:
+    """Maps a budget keyword, phrase or per-meal amount to one of BUDGET_TIERS, defaulting to mid-range"""
+    parsed = parse_budget(budget)
+    if parsed is None:
+        return DEFAULT_BUDGET_TIER
+    if parsed.isdigit():
+        amount = int(parsed)
+        return next((tier for limit, tier in _TIER_LIMITS if amount < limit), 'luxury')
+    return parsed
+
+
+def budget_context(budget: Optional[str]) -> str:
+    """The prompt description of a budget's tier"""
+    return BUDGET_CONTEXTS[budget_tier(budget)]
+
+
+def canonical_name(text: str) -> str:
+    """Cleans up a typed city name: collapses whitespace, resolves known aliases and capitalizes each word"""
+    words = str(text).split()
+    alias = CITY_ALIASES.get(" ".join(words).lower())
+    if alias:
+        return alias
+    return " ".join(word.capitalize() for word in words)
+
+
+class City(str):
+    """
+    A city resolved to a canonical place.
+
+    It is the canonical name as a string, so it can be passed anywhere a city name is
+    expected, and also carries the coordinates and the text it was resolved from.
+    """
+
+    def __new__(cls, name: str, lat: Optional[float] = None, lon: Optional[float] = None,
+                country: Optional[str] = None, query: Optional[str] = None):
+        city = super().__new__(cls, name)
+        city.lat = lat
+        city.lon = lon
+        city.country = country
+        city.query = query if query is not None else name
+        return city
+
+    @property
+    def resolved(self) -> bool:
+        """Whether geocoding found the place; without it the City is only its alias-resolved name"""
+        return self.lat is not None and self.lon is not None
+
+    @property
+    def id(self) -> str:
+        """The stable cache key of this place: its lowercase canonical name, plus coordinates when known"""
+        name = " ".join(str(self).lower().split())
+        if not self.resolved:
+            return name
+        return f"{name}@{self.lat:.2f},{self.lon:.2f}"
+
+    def to_record(self) -> Dict:
+        return {'name': str(self), 'lat': self.lat, 'lon': self.lon, 'country': self.country}
+
+    @classmethod
+    def from_record(cls, record: Dict, query: Optional[str] = None) -> 'City':
+        return cls(record['name'], record.get('lat'), record.get('lon'), record.get('country'), query)
+
+
+def city_key(city: str) -> str:
+    """
+    The in-memory key of a city as it was entered: alias-resolved and ignoring case and spacing.
+
+    A resolved City keys on the text it was resolved from, so lookups made before and
+    after resolution agree.
+    """
+    text = city.query if isinstance(city, City) else city
+    return canonical_name(text).lower()
+
+
+def cache_id(city: str) -> str:
+    """The key services store results under: the place ID of a resolved City, otherwise its city_key"""
+    return city.id if isinstance(city, City) else city_key(city)
+
+
+def persistent_id(city: str) -> Optional[str]:
+    """
+    The key results may be persisted under, or None for a City whose geocoding failed.
+
+    Such a City keys on its bare name, which lookups of the place once geocoding works
+    again never hit, so its results are kept in memory only.
+    """
+    if isinstance(city, City) and not city.resolved:
+        return None
+    return cache_id(city)
@@ -0,0 +1,149 @@
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional, Tuple
+from services.metrics import METRICS
+from services.normalize import city_key
+
+# The service methods a Prefetcher runs ahead of time, all called as method(city, *args)
+PREFETCHED_METHODS = ('get_weather', 'get_iconic_dishes', 'discover_tour')
+
+
+class Prefetcher:
+    """Builds the services in the background and speculatively looks up weather and dishes for cities as they are entered."""
+
+    def __init__(self, build_services: Callable[[], Tuple[object, object]], budget: str = "mid",
+                 max_workers: int = 4, fused_discovery: bool = False):
+        """
+        Starts building the services right away.
+
+        Args:
+            build_services: Creates and returns (weather_service, julep_service); runs on a background thread.
+            budget: The budget dish lookups assume until set_budget is called.
+            max_workers: The most speculative lookups in flight at once.
+            fused_discovery: Prefetch discover_tour instead of get_iconic_dishes, matching a --fused run.
+        """
+        self.budget = budget
+        self.discovery_method = 'discover_tour' if fused_discovery else 'get_iconic_dishes'
+        # One extra worker so building the services never waits behind a lookup
+        self._executor = ThreadPoolExecutor(max_workers=max_workers + 1, thread_name_prefix='krida-prefetch')
+        self._services = self._executor.submit(build_services)
+        self._cities: List[str] = []
+        self._futures: Dict[Tuple[str, str, tuple], Future] = {}
+        self._lock = threading.Lock()
+
+    def services(self) -> Tuple[object, object]:
+        """
+        Waits for the background construction to finish.
+
+        Returns:
+            (weather_service, julep_service), wrapped so that tours use the prefetched
+            results. Re-raises whatever construction raised.
+        """
+        weather_service, julep_service = self._services.result()
+        return _Prefetched(weather_service, self), _Prefetched(julep_service, self)
+
+    def add_city(self, city: str) -> None:
+        """Starts the weather and dish lookups for a newly entered city"""
+        with self._lock:
+            if any(city_key(known) == city_key(city) for known in self._cities):
+                return
+            self._cities.append(city)
+            self._submit('get_weather', city)
+            self._submit(self.discovery_method, city, self.budget)
+
+    def remove_city(self, city: str) -> None:
+        """Cancels everything still pending for a city the user removed"""
+        key = city_key(city)
+        with self._lock:
+            self._cities = [known for known in self._cities if city_key(known) != key]
+            self._discard(lambda future_key: future_key[1] == key)
+
+    def set_cities(self, cities: List[str]) -> None:
+        """Makes the prefetched cities match a final selection, cancelling the rest"""
+        keep = {city_key(city) for city in cities}
+        for city in list(self._cities):
+            if city_key(city) not in keep:
+                self.remove_city(city)
+        for city in cities:
+            self.add_city(city)
+
+    def set_budget(self, budget: str) -> None:
+        """Cancels dish lookups made for another budget and restarts them for this one"""
+        with self._lock:
+            if budget == self.budget:
+                return
+            self.budget = budget
+            self._discard(lambda future_key: future_key[0] != 'get_weather' and future_key[2] != (budget,))
+            for city in self._cities:
+                self._submit(self.discovery_method, city, budget)
+
+    def take(self, method: str, city: str, *args) -> Optional[object]:
+        """
+        Hands over the result of a speculative call, waiting for it if it is still running.
+
+        Returns:
+            The result, or None when nothing was prefetched for these arguments or the lookup failed.
+        """
+        with self._lock:
+            future = self._futures.pop((method, city_key(city), args), None)
+        if future is None or future.cancelled():
+            return None
+        try:
+            result = future.result()
+        except Exception:
+            result = None
+        METRICS.increment('prefetch', call=method, result='used' if result is not None else 'failed')
+        return result
+
+    def shutdown(self) -> None:
+        """Cancels pending lookups and stops the worker threads; lookups already running are left to finish"""
+        with self._lock:
+            self._discard(lambda future_key: True, result='unused')
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def _submit(self, method: str, city: str, *args) -> None:
+        # Callers hold self._lock
+        key = (method, city_key(city), args)
+        if key not in self._futures:
+            self._futures[key] = self._executor.submit(self._run, method, city, args)
+
+    def _discard(self, matches: Callable[[Tuple[str, str, tuple]], bool], result: str = 'cancelled') -> None:
+        # Callers hold self._lock. Lookups that already started cannot be interrupted; their results are dropped.
+        for key in [key for key in self._futures if matches(key)]:
+            self._futures.pop(key).cancel()
+            METRICS.increment('prefetch', call=key[0], result=result)
+
+    def _run(self, method: str, city: str, args: tuple):
+        weather_service, julep_service = self._services.result()
+        if hasattr(weather_service, 'resolve_city'):
+            # Resolved like a tour would, so the lookups fill the same cache entries
+            city = weather_service.resolve_city(city)
+        service = weather_service if method == 'get_weather' else julep_service
+        return getattr(service, method)(city, *args)
+
+
+class _Prefetched:
+    """Proxies a service so that calls the Prefetcher already made return their result instead of being repeated."""
+
+    def __init__(self, service, prefetcher: Prefetcher):
+        self._service = service
+        self._prefetcher = prefetcher
+
+    def __getattr__(self, name):
+        attr = getattr(self._service, name)
+        if name == 'get_weather_many':
+            def get_weather_many(cities: List[str], **kwargs):
+                results = {city: self._prefetcher.take('get_weather', city) for city in cities}
+                missing = [city for city, weather_data in results.items() if weather_data is None]
+                if missing:
+                    results.update(attr(missing, **kwargs))
+                return results
+            return get_weather_many
+
+        if name not in PREFETCHED_METHODS:
+            return attr
+
+        def call(city: str, *args):
+            result = self._prefetcher.take(name, city, *args)
+            return result if result is not None else attr(city, *args)
+        return call
@@ -0,0 +1,313 @@
+"""
+Client-side rate control for the external APIs: a token bucket caps the request rate of each
+provider, and an additive-increase/multiplicative-decrease (AIMD) limit on concurrent calls
+backs off on 429s, server errors and slow replies and creeps back up while calls succeed.
+"""
+import os
+import time
+import random
+import asyncio
+import threading
+import email.utils
+from contextlib import asynccontextmanager, contextmanager
+from dataclasses import dataclass, replace
+from typing import AsyncIterator, Awaitable, Callable, Dict, Iterator, Mapping, Optional, TypeVar
+from services.metrics import METRICS
+
+T = TypeVar('T')
+
+# How often async waiters re-check for a free concurrency slot
+_ASYNC_POLL_SECONDS = 0.02
+
+
+class Retryable(Exception):
+    """A call failed in a way worth retrying later: a server error, a timeout or a dropped connection."""
+
+    def __init__(self, message: str, retry_after: Optional[float] = None):
+        super().__init__(message)
+        # Seconds the provider asked us to wait, when it said
+        self.retry_after = retry_after
+
+
+class RateLimited(Retryable):
+    """The provider answered 429 Too Many Requests."""
+
+
+def parse_retry_after(headers: Optional[Mapping[str, str]]) -> Optional[float]:
+    """Reads the wait a response asks for from its retry-after-ms or Retry-After (seconds or HTTP date) header"""
+    if not headers:
+        return None
+    milliseconds = headers.get('retry-after-ms')
+    if milliseconds:
+        try:
+            return max(0.0, float(milliseconds) / 1000)
+        except ValueError:
+            pass
+    value = headers.get('retry-after')
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, email.utils.parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def check_retryable(status_code: int, headers: Optional[Mapping[str, str]], description: str) -> None:
+    """Raises RateLimited for a 429 response and Retryable for 408 and 5xx responses; does nothing otherwise"""
+    if status_code == 429:
+        raise RateLimited(description, parse_retry_after(headers))
+    if status_code == 408 or status_code >= 500:
+        raise Retryable(description, parse_retry_after(headers))
+
+
+@dataclass
+class RateSettings:
+    """Limits for one provider."""
+
+    # Sustained requests per second, and how many may be sent back to back
+    rate: float = 10.0
+    burst: int = 20
+    # The AIMD concurrency limit starts here and stays within these bounds
+    initial_concurrency: int = 4
+    min_concurrency: int = 1
+    max_concurrency: int = 32
+    # Successful calls slower than this count as congestion
+    latency_target: float = 5.0
+    # The limit is multiplied by this on congestion, at most once per decrease_interval seconds
+    decrease_factor: float = 0.5
+    decrease_interval: float = 1.0
+    # Tries per call, and the first backoff when the provider gives no Retry-After
+    max_attempts: int = 4
+    backoff: float = 0.5
+
+    @classmethod
+    def from_env(cls, provider: str, defaults: Optional["RateSettings"] = None) -> "RateSettings":
+        """Applies KRIDA_<PROVIDER>_RATE, _BURST and _MAX_CONCURRENCY environment overrides to defaults"""
+        defaults = defaults or cls()
+        prefix = f"KRIDA_{provider.upper()}_"
+        overrides = {}
+        for field, convert in (('rate', float), ('burst', int), ('max_concurrency', int)):
+            value = os.getenv(prefix + field.upper())
+            if value:
+                try:
+                    overrides[field] = convert(value)
+                except ValueError:
+                    print(f"WARNING: Ignoring invalid {prefix + field.upper()}={value!r}")
+        return replace(defaults, **overrides)
+
+
+# OpenWeather's free tier allows 60 calls a minute, paid tiers far more; LLM replies take seconds
+PROVIDER_DEFAULTS = {
+    'openweather': RateSettings(rate=10.0, burst=20, initial_concurrency=4, max_concurrency=32, latency_target=2.0),
+    'julep': RateSettings(rate=10.0, burst=20, initial_concurrency=6, max_concurrency=64, latency_target=30.0),
+}
+
+
+class ProviderLimiter:
+    """A token bucket and an AIMD concurrency limit for one provider, usable from threads and from asyncio."""
+
+    def __init__(self, provider: str, settings: Optional[RateSettings] = None):
+        """
+        Args:
+            provider: The provider name, used as the metrics label.
+            settings: The limits; defaults to RateSettings().
+        """
+        self.provider = provider
+        self.settings = settings or RateSettings()
+        self.limit = float(self.settings.initial_concurrency)
+        self.in_flight = 0
+        self._tokens = float(self.settings.burst)
+        self._refilled = time.monotonic()
+        self._blocked_until = 0.0
+        self._last_decrease = 0.0
+        # Like TCP slow start: grow by one slot per success until the first sign of congestion
+        self._slow_start = True
+        self._cond = threading.Condition()
+
+    def snapshot(self) -> Dict[str, float]:
+        """The current concurrency limit, calls in flight and tokens left"""
+        with self._cond:
+            return {'limit': round(self.limit, 2), 'in_flight': self.in_flight, 'tokens': round(self._tokens, 2)}
+
+    def _try_acquire(self) -> Optional[float]:
+        """
+        Takes a token and a concurrency slot when both are free. Callers hold self._cond.
+
+        Returns:
+            0 once acquired, the seconds until a token frees up or a Retry-After ends,
+            or None when every concurrency slot is taken.
+        """
+        now = time.monotonic()
+        if now < self._blocked_until:
+            return self._blocked_until - now
+        self._tokens = min(self.settings.burst, self._tokens + (now - self._refilled) * self.settings.rate)
+        self._refilled = now
+        if self.in_flight >= int(self.limit):
+            return None
+        if self._tokens < 1:
+            return (1 - self._tokens) / self.settings.rate
+        self._tokens -= 1
+        self.in_flight += 1
+        return 0
+
+    def acquire(self) -> None:
+        """Blocks until the call may start"""
+        started = time.perf_counter()
+        with self._cond:
+            wait = self._try_acquire()
+            while wait != 0:
+                self._cond.wait(wait)
+                wait = self._try_acquire()
+        self._observe_wait(started)
+
+    async def acquire_async(self) -> None:
+        """Waits on the event loop until the call may start"""
+        started = time.perf_counter()
+        while True:
+            with self._cond:
+                wait = self._try_acquire()
+            if wait == 0:
+                break
+            await asyncio.sleep(wait if wait is not None else _ASYNC_POLL_SECONDS)
+        self._observe_wait(started)
+
+    def _observe_wait(self, started: float) -> None:
+        waited = time.perf_counter() - started
+        if waited > 0.001:
+            METRICS.observe('rate_wait_seconds', waited, provider=self.provider)
+
+    def release(self, latency: Optional[float] = None, congested: bool = False, retry_after: Optional[float] = None) -> None:
+        """
+        Frees the slot and adjusts the limit.
+
+        Args:
+            latency: Seconds a successful call took; None gives no signal, e.g. for streams.
+            congested: The call hit a 429 or a server error, so the limit is decreased.
+            retry_after: Seconds no call to this provider may start, after a 429.
+        """
+        with self._cond:
+            self.in_flight -= 1
+            now = time.monotonic()
+            if congested or (latency is not None and latency > self.settings.latency_target):
+                self._slow_start = False
+                if now - self._last_decrease >= self.settings.decrease_interval:
+                    self._last_decrease = now
+                    self.limit = max(self.settings.min_concurrency, self.limit * self.settings.decrease_factor)
+            elif latency is not None:
+                # Afterwards, about one more slot per limit's worth of successful calls
+                step = 1 if self._slow_start else 1 / self.limit
+                self.limit = min(self.settings.max_concurrency, self.limit + step)
+            if retry_after:
+                self._blocked_until = max(self._blocked_until, now + retry_after)
+            self._cond.notify_all()
+
+    def _after_failure(self, error: Retryable, attempt: int) -> float:
+        """Releases a failed call's slot; returns how long its caller should back off before retrying"""
+        delay = error.retry_after
+        if delay is None:
+            delay = self.settings.backoff * 2 ** (attempt - 1) * random.uniform(0.5, 1.5)
+        rate_limited = isinstance(error, RateLimited)
+        # A 429 holds back every caller, other errors only the one that failed
+        self.release(congested=True, retry_after=delay if rate_limited else None)
+        METRICS.increment('provider_retries', provider=self.provider, reason='rate_limited' if rate_limited else 'error')
+        return 0.0 if rate_limited else delay
+
+    def call(self, fn: Callable[..., T], *args, **kwargs) -> T:
+        """
+        Runs fn under the limits, retrying it when it raises Retryable.
+
+        Raises:
+            Retryable: The last failure, once settings.max_attempts tries have failed.
+        """
+        for attempt in range(1, self.settings.max_attempts + 1):
+            self.acquire()
+            started = time.perf_counter()
+            try:
+                result = fn(*args, **kwargs)
+            except Retryable as e:
+                delay = self._after_failure(e, attempt)
+                if attempt == self.settings.max_attempts:
+                    raise
+                time.sleep(delay)
+                continue
+            except BaseException:
+                self.release()
+                raise
+            self.release(time.perf_counter() - started)
+            return result
+
+    async def call_async(self, fn: Callable[..., Awaitable[T]], *args, **kwargs) -> T:
+        """Async version of call for a coroutine function"""
+        for attempt in range(1, self.settings.max_attempts + 1):
+            await self.acquire_async()
+            started = time.perf_counter()
+            try:
+                result = await fn(*args, **kwargs)
+            except Retryable as e:
+                delay = self._after_failure(e, attempt)
+                if attempt == self.settings.max_attempts:
+                    raise
+                await asyncio.sleep(delay)
+                continue
+            except BaseException:
+                self.release()
+                raise
+            self.release(time.perf_counter() - started)
+            return result
+
+    @contextmanager
+    def slot(self) -> Iterator[None]:
+        """Holds a slot for a block that cannot be retried as a whole, such as a stream"""
+        self.acquire()
+        try:
+            yield
+        except Retryable as e:
+            self.release(congested=True, retry_after=e.retry_after if isinstance(e, RateLimited) else None)
+            raise
+        except BaseException:
+            self.release()
+            raise
+        self.release()
+
+    @asynccontextmanager
+    async def slot_async(self) -> AsyncIterator[None]:
+        """Async version of slot"""
+        await self.acquire_async()
+        try:
+            yield
+        except Retryable as e:
+            self.release(congested=True, retry_after=e.retry_after if isinstance(e, RateLimited) else None)
+            raise
+        except BaseException:
+            self.release()
+            raise
+        self.release()
+
+
+class RateControl:
+    """The limiters of every provider, created on first use from PROVIDER_DEFAULTS and the environment."""
+
+    def __init__(self, settings: Optional[Dict[str, RateSettings]] = None):
+        """
+        Args:
+            settings: Per-provider settings used instead of PROVIDER_DEFAULTS and environment overrides.
+        """
+        self._settings = dict(settings or {})
+        self._limiters: Dict[str, ProviderLimiter] = {}
+        self._lock = threading.Lock()
+
+    def limiter(self, provider: str) -> ProviderLimiter:
+        with self._lock:
+            limiter = self._limiters.get(provider)
+            if limiter is None:
+                settings = self._settings.get(provider) or RateSettings.from_env(provider, PROVIDER_DEFAULTS.get(provider))
+                limiter = self._limiters[provider] = ProviderLimiter(provider, settings)
+            return limiter
+
+
+# The process-wide limiters, shared by the synchronous and async services of each provider
+RATE_CONTROL = RateControl()
@@ -0,0 +1,75 @@
+import threading
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, Optional
+
+
+class SessionPool:
+    """Hands out reusable Julep session IDs so each chat does not pay for a sessions.create round trip."""
+
+    def __init__(self, create_session: Optional[Callable[[], str]], max_uses: int = 25, max_idle: int = 8):
+        """
+        Initializes an empty pool.
+
+        Args:
+            create_session: Creates a new session and returns its ID. Needed by session(); async
+                callers create sessions themselves and use checkout/register/checkin directly.
+            max_uses: Chats a session serves before it is retired and replaced.
+            max_idle: The most idle sessions kept around for reuse.
+        """
+        self.create_session = create_session
+        self.max_uses = max_uses
+        self.max_idle = max_idle
+        self.created = 0
+        self.reused = 0
+        self._idle: List[str] = []
+        self._uses: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def checkout(self) -> Optional[str]:
+        """Takes an idle session for exclusive use, or returns None when a new one has to be created"""
+        with self._lock:
+            if self._idle:
+                self.reused += 1
+                return self._idle.pop()
+            return None
+
+    def register(self, session_id: str) -> str:
+        """Records a session created by the caller after checkout returned None"""
+        with self._lock:
+            self.created += 1
+            self._uses[session_id] = 0
+        return session_id
+
+    def checkin(self, session_id: str, discard: bool = False) -> None:
+        """
+        Returns a session after one chat.
+
+        Args:
+            session_id: The session that was checked out or registered.
+            discard: Retire the session instead of reusing it, e.g. after an error.
+        """
+        with self._lock:
+            uses = self._uses.get(session_id, 0) + 1
+            if discard or uses >= self.max_uses or len(self._idle) >= self.max_idle:
+                self._uses.pop(session_id, None)
+                return
+            self._uses[session_id] = uses
+            self._idle.append(session_id)
+
+    @contextmanager
+    def session(self) -> Iterator[str]:
+        """Yields a session ID for one chat and returns it to the pool afterwards"""
+        session_id = self.checkout()
+        if session_id is None:
+            session_id = self.register(self.create_session())
+        ok = False
+        try:
+            yield session_id
+            ok = True
+        finally:
+            self.checkin(session_id, discard=not ok)
+
+    def stats(self) -> Dict[str, int]:
+        """Returns how many sessions were created and reused, and how many are idle"""
+        with self._lock:
+            return {'created': self.created, 'reused': self.reused, 'idle': len(self._idle)}
@@ -0,0 +1,144 @@
+import asyncio
+import inspect
+import functools
+import threading
+from concurrent.futures import Future
+from typing import Awaitable, Callable, Dict, Hashable, Tuple, TypeVar, Union
+from services.metrics import METRICS
+
+T = TypeVar('T')
+
+
+class _Flight:
+    """One call in flight: its future (or asyncio task), how many callers joined it and how many still wait."""
+
+    def __init__(self, future: Union[Future, "asyncio.Future"]):
+        self.future = future
+        self.waiters = 0
+        # Async callers still awaiting the task; when the last one is cancelled, so is the task
+        self.callers = 1
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls with the same key: the first caller runs the function and
+    everyone who asks while it is still running waits for, and shares, its result or exception.
+
+    Nothing is kept once the call returns, so this is not a cache. One group is meant to be
+    used either from threads through do() or from one event loop through do_async().
+    """
+
+    def __init__(self, name: str):
+        """
+        Args:
+            name: The group name, used as the metrics label.
+        """
+        self.name = name
+        self.calls = 0
+        self.shared = 0
+        self.most_waiters = 0
+        self._in_flight: Dict[Hashable, _Flight] = {}
+        self._lock = threading.Lock()
+
+    def _join(self, key: Hashable, start: Callable[[], Union[Future, "asyncio.Future"]]) -> Tuple[_Flight, bool]:
+        """Finds the call in flight for key, or registers a new one made by start(); returns it and whether we lead it"""
+        with self._lock:
+            self.calls += 1
+            flight = self._in_flight.get(key)
+            if flight is None:
+                flight = self._in_flight[key] = _Flight(start())
+                leader = True
+            else:
+                flight.waiters += 1
+                flight.callers += 1
+                self.shared += 1
+                self.most_waiters = max(self.most_waiters, flight.waiters)
+                leader = False
+        METRICS.increment('single_flight', group=self.name, result='leader' if leader else 'shared')
+        return flight, leader
+
+    def _land(self, key: Hashable, flight: _Flight) -> None:
+        with self._lock:
+            if self._in_flight.get(key) is flight:
+                del self._in_flight[key]
+
+    def do(self, key: Hashable, fn: Callable[..., T], *args, **kwargs) -> Tuple[T, bool]:
+        """
+        Runs fn(*args, **kwargs) unless a call with the same key is already in flight.
+
+        Returns:
+            The result and whether it was shared from another caller's call. Re-raises
+            whatever the call raised, in every caller.
+        """
+        flight, leader = self._join(key, Future)
+        if not leader:
+            return flight.future.result(), True
+        try:
+            result = fn(*args, **kwargs)
+        except BaseException as e:
+            flight.future.set_exception(e)
+            raise
+        else:
+            flight.future.set_result(result)
+            return result, False
+        finally:
+            self._land(key, flight)
+
+    async def do_async(self, key: Hashable, fn: Callable[..., Awaitable[T]], *args, **kwargs) -> Tuple[T, bool]:
+        """
+        Async version of do for a coroutine function.
+
+        The call runs as its own task, so cancelling one caller does not cancel it for the
+        others; it is cancelled only once every caller has been.
+        """
+        flight, leader = self._join(key, lambda: asyncio.ensure_future(fn(*args, **kwargs)))
+        task = flight.future
+        if leader:
+            task.add_done_callback(lambda _: self._land(key, flight))
+        try:
+            return await asyncio.shield(task), not leader
+        except asyncio.CancelledError:
+            with self._lock:
+                flight.callers -= 1
+                abandoned = flight.callers == 0
+            if abandoned:
+                task.cancel()
+            raise
+
+    def stats(self) -> Dict[str, object]:
+        """Calls made, calls that shared another's call, the dedup ratio, the most waiters on one call and the calls in flight now"""
+        with self._lock:
+            in_flight = len(self._in_flight)
+            waiting = sum(flight.waiters for flight in self._in_flight.values())
+            calls, shared, most_waiters = self.calls, self.shared, self.most_waiters
+        return {
+            'calls': calls,
+            'shared': shared,
+            'dedup_ratio': round(shared / calls, 4) if calls else 0.0,
+            'most_waiters': most_waiters,
+            'in_flight': in_flight,
+            'waiting': waiting,
+        }
+
+
+def coalesced(group: str, key: Callable[..., Hashable]):
+    """
+    Makes a service method single-flight: concurrent calls whose key(self, *args, **kwargs)
+    matches share one call. The instance keeps its SingleFlight groups in `self.flights`.
+
+    Works for plain and coroutine methods; the wrapped method returns just the result.
+    """
+    def decorate(method):
+        if inspect.iscoroutinefunction(method):
+            @functools.wraps(method)
+            async def call_async(self, *args, **kwargs):
+                result, _ = await self.flights[group].do_async(key(self, *args, **kwargs), method, self, *args, **kwargs)
+                return result
+            return call_async
+
+        @functools.wraps(method)
+        def call(self, *args, **kwargs):
+            result, _ = self.flights[group].do(key(self, *args, **kwargs), method, self, *args, **kwargs)
+            return result
+        return call
+    return decorate
@@ -0,0 +1,160 @@
+"""
+Structured output handling for LLM replies: finding JSON inside chatty text,
+validating it against the shape Krida expects, and wording a repair request.
+"""
+import json
+import re
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, TypeVar
+
+T = TypeVar('T')
+
+# Restaurant fields besides "name"; all are optional and normalized to strings
+RESTAURANT_FIELDS = ('rating', 'reason', 'price_range')
+
+_TRAILING_COMMA = re.compile(r',(\s*[}\]])')
+
+
+class StructuredOutputError(ValueError):
+    """A reply did not contain usable JSON of the expected shape."""
+
+    def __init__(self, message: str, content: Optional[str] = None):
+        super().__init__(message)
+        # The raw reply, for diagnostics
+        self.content = content
+
+
+def _balanced_end(text: str, start: int) -> Optional[int]:
+    """Returns the index just past the bracket that closes the one at `start`, ignoring brackets inside strings"""
+    closing = {'{': '}', '[': ']'}
+    stack = []
+    in_string = False
+    escaped = False
+    for i in range(start, len(text)):
+        char = text[i]
+        if in_string:
+            if escaped:
+                escaped = False
+            elif char == '\\':
+                escaped = True
+            elif char == '"':
+                in_string = False
+        elif char == '"':
+            in_string = True
+        elif char in closing:
+            stack.append(closing[char])
+        elif char in '}]':
+            if not stack or char != stack.pop():
+                return None
+            if not stack:
+                return i + 1
+    return None
+
+
+def iter_json_values(text: str) -> Iterator[object]:
+    """
+    Yields each complete JSON object or array found in text, in order.
+
+    Prose, Markdown fences and bracketed asides that are not valid JSON are skipped,
+    and a trailing comma before a closing bracket is tolerated.
+    """
+    position = 0
+    while True:
+        starts = [index for index in (text.find('{', position), text.find('[', position)) if index >= 0]
+        if not starts:
+            return
+        start = min(starts)
+        end = _balanced_end(text, start)
+        if end is None:
+            position = start + 1
+            continue
+        candidate = text[start:end]
+        for attempt in (candidate, _TRAILING_COMMA.sub(r'\1', candidate)):
+            try:
+                value = json.loads(attempt)
+                break
+            except ValueError:
+                value = None
+        else:
+            position = start + 1
+            continue
+        yield value
+        position = end
+
+
+def parse_structured(content: Optional[str], validate: Callable[[object], T]) -> T:
+    """
+    Returns the first JSON value in content that passes validate.
+
+    Raises:
+        StructuredOutputError: With the most useful explanation of why nothing matched.
+    """
+    if not content:
+        raise StructuredOutputError("the reply was empty", content)
+    first_error = None
+    for value in iter_json_values(content):
+        try:
+            return validate(value)
+        except StructuredOutputError as e:
+            first_error = first_error or e
+    if first_error is not None:
+        raise StructuredOutputError(str(first_error), content)
+    raise StructuredOutputError("the reply did not contain a JSON value", content)
+
+
+def validate_dishes(value: object, count: int = 3) -> List[str]:
+    """A JSON array of at least `count` non-empty dish names"""
+    if isinstance(value, dict) and len(value) == 1:
+        # e.g. {"dishes": [...]}
+        value = next(iter(value.values()))
+    if not isinstance(value, list):
+        raise StructuredOutputError(f"expected a JSON array of {count} dish names, got {type(value).__name__}")
+    dishes = []
+    for item in value:
+        if isinstance(item, dict):
+            item = item.get('name') or item.get('dish')
+        if isinstance(item, str) and item.strip():
+            dishes.append(item.strip())
+    if len(dishes) < count:
+        raise StructuredOutputError(f"expected {count} dish names as strings, got {len(dishes)}")
+    return dishes
+
+
+def validate_restaurant(value: object) -> Dict[str, str]:
+    """A JSON object with a non-empty "name" and optional "rating", "reason" and "price_range" strings"""
+    if isinstance(value, list) and len(value) == 1:
+        value = value[0]
+    if not isinstance(value, dict):
+        raise StructuredOutputError(f"expected a JSON object describing one restaurant, got {type(value).__name__}")
+    name = value.get('name')
+    if not isinstance(name, str) or not name.strip():
+        raise StructuredOutputError('the restaurant object needs a non-empty "name" string')
+    restaurant = dict(value, name=name.strip())
+    for field in RESTAURANT_FIELDS:
+        if restaurant.get(field) is not None and not isinstance(restaurant[field], str):
+            restaurant[field] = str(restaurant[field])
+    return restaurant
+
+
+def validate_fused(value: object, meals: Sequence[str]) -> Dict[str, Dict]:
+    """A JSON array of {"dish", "restaurant"} objects, one per meal, returned as tour data keyed by meal"""
+    if not isinstance(value, list) or len(value) < len(meals):
+        raise StructuredOutputError(f"expected a JSON array of {len(meals)} objects, one per meal")
+    tour_data = {}
+    for meal, item in zip(meals, value):
+        dish = item.get('dish') if isinstance(item, dict) else None
+        if not isinstance(dish, str) or not dish.strip():
+            raise StructuredOutputError(f'the {meal} entry needs a non-empty "dish" string')
+        try:
+            restaurant = validate_restaurant(item.get('restaurant'))
+        except StructuredOutputError as e:
+            raise StructuredOutputError(f"the {meal} entry is invalid: {e}")
+        tour_data[meal] = {"dish": dish.strip(), "restaurant": restaurant}
+    return tour_data
+
+
+def repair_prompt(error: StructuredOutputError) -> str:
+    """The follow-up message asking the model to correct an unusable reply"""
+    return (
+        f"Your previous reply could not be used: {error}. "
+        "Reply again with only the corrected JSON, exactly as requested, and no other text."
+    )
@@ -0,0 +1,1029 @@
+import os
+import time
+import asyncio
+import inspect
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed, wait
+from dataclasses import dataclass
+from typing import AsyncIterator, Dict, Iterator, List, Optional, Tuple
+from services.deadline import Deadline, Stages
+from services.metrics import METRICS
+from services.narrative import DEFAULT_NARRATIVE_MODE, NARRATIVE_MODES, template_narrative
+from services.normalize import City, cache_id, canonical_name
+from services.tour_store import TourStore, dishes_inputs, narrative_inputs, restaurant_inputs, weather_inputs
+
+MEALS = ['breakfast', 'lunch', 'dinner']
+
+# One worker per meal: breakfast, lunch and dinner lookups run side by side
+RESTAURANT_LOOKUP_WORKERS = len(MEALS)
+
+
+def summarize_weather(weather_data: Optional[Dict]) -> Tuple[str, str]:
+    """Turn an OpenWeather payload into the (summary, dining suggestion) pair used in prompts"""
+    if not weather_data:
+        return "Variable conditions", "flexible indoor/outdoor dining options"
+    temp = weather_data['main']['temp']
+    condition = weather_data['weather'][0]['main']
+    weather_summary = f"{condition}, {temp}°C"
+    dining_suggestion = "cozy indoor dining" if temp < 15 or "Rain" in condition else "delightful outdoor dining"
+    return weather_summary, dining_suggestion
+
+
+class TourProgress:
+    """Hooks called by plan_tour as each pipeline stage runs. The default implementation is silent."""
+
+    def stage_started(self, stage: str, tour: Dict) -> None:
+        pass
+
+    def stage_finished(self, stage: str, tour: Dict) -> None:
+        pass
+
+    def stage_failed(self, stage: str, tour: Dict) -> None:
+        pass
+
+    # Set to True to receive the narrative through narrative_chunk while it is generated
+    wants_narrative_stream = False
+
+    def narrative_chunk(self, chunk: str, tour: Dict) -> None:
+        pass
+
+    def narrative_preview(self, narrative: str, tour: Dict) -> None:
+        """In 'preview' mode: the template narrative, to show until the model's narrative replaces it"""
+        pass
+
+
+def _new_tour(city: str, budget: str) -> Dict:
+    return {
+        'city': city,
+        'city_id': cache_id(city),
+        'budget': budget,
+        'status': 'ok',
+        'failed_stage': None,
+        'error': None,
+        'weather': None,
+        'weather_summary': None,
+        'dining_suggestion': None,
+        'dishes': [],
+        'tour_data': {},
+        'narrative': None,
+        # 'llm' when the model wrote the narrative, 'template' when it was written locally
+        'narrative_source': None,
+        # Per piece: the fingerprint of its inputs, when it was generated and whether it came from the TourStore
+        'provenance': {},
+        # Per stage that overran its share of the deadline: the fallback used instead
+        'degraded': {},
+        'timings': {},
+    }
+
+
+def _fail(tour: Dict, stage: str, error: str, progress: TourProgress) -> Dict:
+    tour['status'] = 'failed'
+    tour['failed_stage'] = stage
+    tour['error'] = error
+    progress.stage_failed(stage, tour)
+    return tour
+
+
+def _finish(tour: Dict, started: float) -> Dict:
+    """Stamps the total time and records every stage timing in METRICS"""
+    tour['timings']['total'] = time.perf_counter() - started
+    for stage, seconds in tour['timings'].items():
+        METRICS.observe('stage_seconds', seconds, stage=stage, status=tour['status'])
+    METRICS.increment('tours', status=tour['status'])
+    return tour
+
+
+def _stored(previous: Optional[Dict], piece: str, inputs: str) -> bool:
+    """Whether the stored tour has this piece, generated from the same inputs"""
+    entry = ((previous or {}).get('provenance') or {}).get(piece)
+    return bool(entry) and entry.get('inputs') == inputs
+
+
+def _record_provenance(tour: Dict, piece: str, inputs: Optional[str], previous: Optional[Dict] = None) -> None:
+    """Notes where a piece came from: the stored tour when previous is given, otherwise generated just now"""
+    if previous is not None:
+        tour['provenance'][piece] = {**previous['provenance'][piece], 'reused': True}
+    else:
+        tour['provenance'][piece] = {'inputs': inputs, 'generated_at': time.time(), 'reused': False}
+    METRICS.increment('tour_pieces', piece=piece.split(':')[0], result='generated' if previous is None else 'reused')
+
+
+def _stored_dishes(tour: Dict, previous: Optional[Dict]) -> Optional[List[str]]:
+    """The stored tour's dishes when they were discovered for the same city"""
+    dishes = (previous or {}).get('dishes') or []
+    if len(dishes) < len(MEALS) or not _stored(previous, 'dishes', dishes_inputs(tour)):
+        return None
+    return dishes
+
+
+def _stored_restaurants(tour: Dict, previous: Optional[Dict], dishes: List[str]) -> Dict[str, Dict]:
+    """The stored tour's meals whose restaurant was found for the same city, dish and budget tier"""
+    stored = {}
+    for i, meal in enumerate(MEALS):
+        details = ((previous or {}).get('tour_data') or {}).get(meal)
+        piece = f"restaurant:{meal}"
+        if details and _stored(previous, piece, restaurant_inputs(tour, dishes[i])):
+            _record_provenance(tour, piece, None, previous)
+            stored[meal] = details
+    return stored
+
+
+def _stored_narrative(tour: Dict, previous: Optional[Dict]) -> Optional[str]:
+    """The stored tour's narrative when the weather, itinerary and budget it was written for are unchanged"""
+    if not (previous or {}).get('narrative') or not _stored(previous, 'narrative', narrative_inputs(tour)):
+        return None
+    _record_provenance(tour, 'narrative', None, previous)
+    return previous['narrative']
+
+
+def _fallback_restaurants(previous: Optional[Dict]) -> Dict[str, Dict]:
+    """The stored tour's meals by dish, whatever budget their restaurants were found for"""
+    return {details['dish']: details for details in ((previous or {}).get('tour_data') or {}).values()}
+
+
+def _degrade(tour: Dict, stage: str, fallback: str) -> None:
+    """
+    Notes that a stage overran its budget and what the tour used instead. Degraded pieces get
+    no provenance, so the next request for the tour generates them properly.
+    """
+    tour['degraded'][stage] = fallback
+    METRICS.increment('stage_degraded', stage=stage, fallback=fallback)
+    print(f"WARNING: {stage.capitalize()} for {tour['city']} ran out of time, using the {fallback.replace('_', ' ')} fallback")
+
+
+def _within(deadline: Optional[Deadline], stages: Stages, fn, *args, fallback: bool = True):
+    """
+    Calls fn, within the stages' share of the deadline when there is one; a stage with no
+    fallback to degrade to may use all the time left, see Deadline.stage_budget
+    """
+    return fn(*args) if deadline is None else deadline.call(stages, fn, *args, fallback=fallback)
+
+
+def _attempt(deadline: Optional[Deadline], stages: Stages, fn, *args, fallback: bool = True) -> Tuple[object, bool]:
+    """Calls fn within the stages' budget; returns its result, or None, and whether it overran"""
+    try:
+        return _within(deadline, stages, fn, *args, fallback=fallback), False
+    except TimeoutError:
+        return None, True
+
+
+def _stream_within(deadline: Optional[Deadline], stages: Stages, fn, *args) -> Iterator:
+    return fn(*args) if deadline is None else deadline.stream(stages, fn, *args)
+
+
+async def _within_async(deadline: Optional[Deadline], stages: Stages, fn, *args, fallback: bool = True):
+    return await fn(*args) if deadline is None else await deadline.call_async(stages, fn, *args, fallback=fallback)
+
+
+async def _attempt_async(deadline: Optional[Deadline], stages: Stages, fn, *args, fallback: bool = True) -> Tuple[object, bool]:
+    try:
+        return await _within_async(deadline, stages, fn, *args, fallback=fallback), False
+    except TimeoutError:
+        return None, True
+
+
+def _stream_within_async(deadline: Optional[Deadline], stages: Stages, fn, *args) -> AsyncIterator:
+    return fn(*args) if deadline is None else deadline.stream_async(stages, fn, *args)
+
+
+def _narrative_without_model(tour: Dict, previous: Optional[Dict], narrative_mode: str, narrative_args: tuple,
+                             progress: TourProgress) -> bool:
+    """
+    Fills in the narrative that needs no model call, the stored one or in 'template' and
+    'preview' mode the template one, and passes it on to the progress.
+
+    Returns:
+        Whether the model still has to write the narrative.
+    """
+    stored = _stored_narrative(tour, previous)
+    if stored:
+        tour['narrative'], tour['narrative_source'] = stored, 'llm'
+    elif narrative_mode != 'llm':
+        tour['narrative'], tour['narrative_source'] = template_narrative(*narrative_args), 'template'
+    if narrative_mode == 'preview' and not stored:
+        # Shown until the model's narrative arrives, and kept if it never does
+        progress.narrative_preview(tour['narrative'], tour)
+        return True
+    if tour['narrative'] and progress.wants_narrative_stream:
+        progress.narrative_chunk(tour['narrative'], tour)
+    return not tour['narrative']
+
+
+def _check_narrative_mode(narrative_mode: str) -> None:
+    if narrative_mode not in NARRATIVE_MODES:
+        raise ValueError(f"Unknown narrative mode {narrative_mode!r}, expected one of {', '.join(NARRATIVE_MODES)}")
+
+
+def _narrative_chunk(tour: Dict, parts: List[str], chunk: str, stage_start: float, progress: TourProgress) -> None:
+    if not parts:
+        tour['timings']['narrative_first_chunk'] = time.perf_counter() - stage_start
+    parts.append(chunk)
+    progress.narrative_chunk(chunk, tour)
+
+
+def _settle_narrative(tour: Dict, narrative: Optional[str], overran: bool, narrative_args: tuple,
+                      progress: TourProgress, streamed: bool) -> None:
+    """
+    Takes the model's narrative, or the template one when the model ran out of time before
+    writing any. A streamed narrative cut short is kept, as it is already on screen.
+    """
+    if overran:
+        _degrade(tour, 'narrative', 'truncated' if narrative else 'template')
+    if narrative:
+        tour['narrative'], tour['narrative_source'] = narrative, 'llm'
+        if not overran:
+            _record_provenance(tour, 'narrative', narrative_inputs(tour))
+    elif overran and tour['narrative_source'] != 'template':
+        tour['narrative'], tour['narrative_source'] = template_narrative(*narrative_args), 'template'
+        if streamed:
+            progress.narrative_chunk(tour['narrative'], tour)
+
+
+def _save(tour: Dict, store: Optional[TourStore]) -> None:
+    if store is None or tour['status'] != 'ok':
+        return
+    try:
+        store.put(tour)
+    except sqlite3.Error as e:
+        print(f"WARNING: Could not store the tour for {tour['city']}: {e}")
+
+
+def _complete(tour: Dict, started: float, stage_start: float, store: Optional[TourStore], progress: TourProgress) -> Dict:
+    """Ends the narrative stage and the tour: timings, metrics and the store"""
+    tour['timings']['narrative'] = time.perf_counter() - stage_start
+    _finish(tour, started)
+    _save(tour, store)
+    progress.stage_finished('narrative', tour)
+    return tour
+
+
+def _unresolved_place(city: str) -> City:
+    """
+    The place for a city whose geocoding overran: the alias-resolved name without coordinates,
+    which is never persisted, so the tour is not stored under a key later lookups would miss
+    """
+    return city if isinstance(city, City) else City(canonical_name(city), query=city)
+
+
+def _settle_weather(tour: Dict, weather: Optional[Dict], overran: bool, stage_start: float, progress: TourProgress) -> None:
+    """Takes the weather reading; one that overran its budget leaves "Variable conditions" in its place"""
+    if overran:
+        _degrade(tour, 'weather', 'variable_conditions')
+    tour['weather'] = weather
+    tour['weather_summary'], tour['dining_suggestion'] = summarize_weather(weather)
+    if not overran:
+        _record_provenance(tour, 'weather', weather_inputs(tour))
+    tour['timings']['weather'] = time.perf_counter() - stage_start
+    progress.stage_finished('weather', tour)
+
+
+def _wants_fused(tour: Dict, julep_service, previous: Optional[Dict]) -> bool:
+    """Whether to ask for dishes and restaurants in one call: fused mode, unless the stored dishes still apply"""
+    return getattr(julep_service, 'fused_discovery', False) and _stored_dishes(tour, previous) is None
+
+
+def _settle_fused(tour: Dict, fused: Optional[Dict], stage_start: float, progress: TourProgress) -> bool:
+    """Fills in a fused discovery answer; False when there is none and the separate calls have to run"""
+    tour['timings']['dishes'] = time.perf_counter() - stage_start
+    if not fused:
+        return False
+    _record_fused(tour, fused)
+    tour['timings']['restaurants'] = 0.0
+    progress.stage_finished('dishes', tour)
+    progress.stage_started('restaurants', tour)
+    progress.stage_finished('restaurants', tour)
+    return True
+
+
+def _dishes_fallback(previous: Optional[Dict]) -> bool:
+    """Whether a dish discovery that overruns has stored dishes to stand in, see _stored_any_dishes"""
+    return bool((previous or {}).get('dishes'))
+
+
+def _restaurants_fallback(previous: Optional[Dict], dishes: List[str], missing: List[int]) -> bool:
+    """Whether every restaurant lookup that overruns has a stored restaurant for its dish to stand in"""
+    fallback = _fallback_restaurants(previous)
+    return all(dishes[i] in fallback for i in missing)
+
+
+def _reused_dishes(tour: Dict, previous: Optional[Dict]) -> Optional[List[str]]:
+    """The stored dishes when they still apply, recorded as reused; None when they have to be discovered"""
+    dishes = _stored_dishes(tour, previous)
+    if dishes is not None:
+        _record_provenance(tour, 'dishes', None, previous)
+    return dishes
+
+
+def _settle_dishes(tour: Dict, dishes: Optional[List[str]], overran: bool, previous: Optional[Dict],
+                   stage_start: float, progress: TourProgress) -> Optional[Dict]:
+    """
+    Takes the discovered or reused dishes; a discovery that overran falls back to the stored tour's dishes.
+
+    Returns:
+        The failed tour, if there are not enough dishes for every meal.
+    """
+    if overran:
+        dishes = _stored_any_dishes(tour, previous)
+    elif dishes and 'dishes' not in tour['provenance']:
+        _record_provenance(tour, 'dishes', dishes_inputs(tour))
+    tour['timings']['dishes'] = tour['timings'].get('dishes', 0.0) + time.perf_counter() - stage_start
+    if overran and not dishes:
+        return _fail(tour, 'dishes', f"Dish discovery for {tour['city']} ran out of time", progress)
+    if not dishes or len(dishes) < len(MEALS):
+        return _fail(tour, 'dishes', f"Could not discover enough dishes for {tour['city']}", progress)
+    tour['dishes'] = dishes
+    progress.stage_finished('dishes', tour)
+    return None
+
+
+def _restaurants_to_find(tour: Dict, previous: Optional[Dict], dishes: List[str]) -> Tuple[Dict[str, Dict], List[int]]:
+    """The stored meals that still apply, and the indices of the meals whose restaurant has to be looked up"""
+    stored = _stored_restaurants(tour, previous, dishes)
+    return stored, [i for i, meal in enumerate(MEALS) if meal not in stored]
+
+
+def _discover_separately(tour: Dict, julep_service, progress: TourProgress, already_started: bool = False,
+                         previous: Optional[Dict] = None, deadline: Optional[Deadline] = None) -> Optional[Dict]:
+    """
+    Steps 2 and 3 as separate calls: dish discovery, then one restaurant lookup per meal.
+    Pieces of the previous stored tour whose inputs are unchanged are reused instead, and
+    with a deadline, calls that overrun their stage fall back to whatever the stored tour has.
+
+    Returns:
+        The failed tour, if any.
+    """
+    city, budget = tour['city'], tour['budget']
+
+    # Step 2: Dish discovery
+    if not already_started:
+        progress.stage_started('dishes', tour)
+    stage_start = time.perf_counter()
+    dishes, overran = _reused_dishes(tour, previous), False
+    if dishes is None:
+        dishes, overran = _attempt(deadline, 'dishes', julep_service.get_iconic_dishes, city, budget,
+                                   fallback=_dishes_fallback(previous))
+    failed = _settle_dishes(tour, dishes, overran, previous, stage_start, progress)
+    if failed:
+        return failed
+    dishes = tour['dishes']
+
+    # Step 3: Restaurants. Each lookup is an independent LLM round trip, so fan
+    # them out and collect the answers back in meal order once they have all returned
+    progress.stage_started('restaurants', tour)
+    stage_start = time.perf_counter()
+    stored, missing = _restaurants_to_find(tour, previous, dishes)
+    if deadline is None:
+        with ThreadPoolExecutor(max_workers=RESTAURANT_LOOKUP_WORKERS) as executor:
+            lookups = {i: executor.submit(julep_service.find_restaurants_for_dish, city, dishes[i], budget) for i in missing}
+            wait(lookups.values())
+    else:
+        # Lookups still running when the budget runs out are left behind on their own threads
+        seconds = deadline.stage_budget('restaurants', _restaurants_fallback(previous, dishes, missing))
+        lookups = {
+            i: deadline.submit(julep_service.find_restaurants_for_dish, city, dishes[i], budget) for i in missing
+        } if seconds > 0 else {}
+        wait(lookups.values(), timeout=seconds)
+    tour['timings']['restaurants'] = time.perf_counter() - stage_start
+    found = {i: lookup.exception() or lookup.result() for i, lookup in lookups.items() if lookup.done()}
+    return _collect_restaurants(tour, dishes, stored, found, previous, progress)
+
+
+def _stored_any_dishes(tour: Dict, previous: Optional[Dict]) -> Optional[List[str]]:
+    """Stands in for a dish discovery that overran: the stored tour's dishes, whatever they were found for"""
+    dishes = (previous or {}).get('dishes')
+    if dishes:
+        _degrade(tour, 'dishes', 'stored')
+    return dishes
+
+
+def _collect_restaurants(tour: Dict, dishes: List[str], stored: Dict[str, Dict], found: Dict[int, object],
+                         previous: Optional[Dict], progress: TourProgress) -> Optional[Dict]:
+    """
+    Fills in tour_data in meal order from the stored meals and the restaurant lookups.
+
+    Args:
+        found: Each finished lookup's restaurant or exception, by meal index. A meal that is
+            neither stored nor found overran the deadline: a stored restaurant for the same dish
+            stands in, otherwise the meal is left out of the tour.
+
+    Returns:
+        The failed tour, if any.
+    """
+    fallback = _fallback_restaurants(previous)
+    overran = []
+    for i, meal in enumerate(MEALS):
+        if meal in stored:
+            tour['tour_data'][meal] = stored[meal]
+            continue
+        if i not in found:
+            overran.append(meal)
+            if dishes[i] in fallback:
+                tour['tour_data'][meal] = fallback[dishes[i]]
+            continue
+        restaurant = found[i]
+        if isinstance(restaurant, BaseException):
+            if not isinstance(restaurant, Exception):
+                # e.g. TourCancelled
+                raise restaurant
+            print(f"ERROR: Restaurant search for {dishes[i]} failed: {restaurant}")
+            restaurant = None
+        if not restaurant:
+            return _fail(tour, 'restaurants', f"Could not find a suitable restaurant for {dishes[i]}", progress)
+        tour['tour_data'][meal] = {"dish": dishes[i], "restaurant": restaurant}
+        _record_provenance(tour, f"restaurant:{meal}", restaurant_inputs(tour, dishes[i]))
+    if overran:
+        if not tour['tour_data']:
+            return _fail(tour, 'restaurants', f"No restaurant for {tour['city']} was found in time", progress)
+        _degrade(tour, 'restaurants', 'stored' if all(meal in tour['tour_data'] for meal in overran) else 'partial')
+    progress.stage_finished('restaurants', tour)
+    return None
+
+
+def _record_fused(tour: Dict, fused: Dict) -> None:
+    """Fills in the dishes and restaurants of a fused discovery answer"""
+    tour['dishes'] = fused['dishes']
+    tour['tour_data'] = fused['tour_data']
+    _record_provenance(tour, 'dishes', dishes_inputs(tour))
+    for meal, details in tour['tour_data'].items():
+        _record_provenance(tour, f"restaurant:{meal}", restaurant_inputs(tour, details['dish']))
+
+
+def plan_tour(city: str, budget: str, weather_service, julep_service, progress: Optional[TourProgress] = None,
+              store: Optional[TourStore] = None, deadline: Optional[Deadline] = None,
+              narrative_mode: str = DEFAULT_NARRATIVE_MODE) -> Dict:
+    """
+    Runs the weather -> dishes -> restaurants -> narrative pipeline for one city.
+
+    Args:
+        city: The city to build a tour for.
+        budget: The budget keyword or per-meal amount.
+        weather_service: A WeatherService (or anything with the same methods).
+        julep_service: A JulepService (or anything with the same methods).
+        progress: Optional TourProgress receiving stage notifications.
+        store: Optional TourStore. Pieces of the city's stored tour whose inputs are unchanged are
+            reused, e.g. a new weather reading only rewrites the narrative, and the finished tour is stored.
+        deadline: Optional Deadline for the whole tour. A stage that overruns its share is not
+            waited for: geocoding falls back to the city's name, without storing the tour,
+            the weather to "Variable conditions", dishes and restaurants to
+            the stored tour's (meals with neither are left out) and the narrative to a template.
+            Dishes and restaurants with nothing stored to fall back on may use all the time left
+            but a small reserve for the narrative, rather than fail the tour at their share.
+        narrative_mode: One of NARRATIVE_MODES: 'llm' has the model write the narrative, 'template'
+            writes it locally without a model call, and 'preview' sends the template narrative to
+            progress.narrative_preview before the model's replaces it. A stored narrative whose
+            inputs are unchanged is reused in every mode.
+
+    Returns:
+        A tour dictionary. `status` is 'ok' when dishes and restaurants were found,
+        otherwise 'failed' with `failed_stage` and `error` describing why. `degraded`
+        names the stages that ran out of time and the fallback each used.
+    """
+    _check_narrative_mode(narrative_mode)
+    progress = progress or TourProgress()
+    started = time.perf_counter()
+    unresolved = False
+    if hasattr(weather_service, 'resolve_city'):
+        # Every later lookup is keyed on the canonical place; past the budget, go on without it
+        place, unresolved = _attempt(deadline, 'geocode', weather_service.resolve_city, city)
+        city = _unresolved_place(city) if unresolved else place
+    tour = _new_tour(city, budget)
+    if unresolved:
+        _degrade(tour, 'weather', 'unresolved_city')
+    previous = store.get(tour['city_id'], budget) if store else None
+
+    # Step 1: Weather. A missing reading only degrades the recommendations.
+    progress.stage_started('weather', tour)
+    stage_start = time.perf_counter()
+    weather, overran = _attempt(deadline, 'weather', weather_service.get_weather, city)
+    _settle_weather(tour, weather, overran, stage_start, progress)
+
+    # Steps 2 and 3 in fused mode: one request returns the dishes and their restaurants,
+    # unless the stored dishes still apply and only restaurants may be missing
+    fused = False
+    lookup_deadline = deadline
+    fused_mode = _wants_fused(tour, julep_service, previous)
+    if fused_mode:
+        progress.stage_started('dishes', tour)
+        stage_start = time.perf_counter()
+        answer, overran = _attempt(deadline, ('dishes', 'restaurants'), julep_service.discover_tour, city, budget,
+                                   fallback=_dishes_fallback(previous))
+        if overran:
+            # The fused call used the separate calls' time, so only the stored pieces can stand in;
+            # the narrative keeps its own share
+            lookup_deadline = Deadline(0)
+        fused = _settle_fused(tour, answer, stage_start, progress)
+
+    if not fused:
+        failed = _discover_separately(tour, julep_service, progress, already_started=fused_mode, previous=previous,
+                                      deadline=lookup_deadline)
+        if failed:
+            return _finish(failed, started)
+
+    # Step 4: Narrative. A missing narrative still leaves a usable itinerary.
+    progress.stage_started('narrative', tour)
+    stage_start = time.perf_counter()
+    narrative_args = (city, tour['weather_summary'], tour['dining_suggestion'], tour['tour_data'], budget)
+    if _narrative_without_model(tour, previous, narrative_mode, narrative_args, progress):
+        streamed = progress.wants_narrative_stream and hasattr(julep_service, 'stream_tour_narrative')
+        if streamed:
+            parts, overran = [], False
+            try:
+                for chunk in _stream_within(deadline, 'narrative', julep_service.stream_tour_narrative, *narrative_args):
+                    _narrative_chunk(tour, parts, chunk, stage_start, progress)
+            except TimeoutError:
+                overran = True
+            narrative = "".join(parts) or None
+        else:
+            narrative, overran = _attempt(deadline, 'narrative', julep_service.generate_tour_narrative, *narrative_args)
+        _settle_narrative(tour, narrative, overran, narrative_args, progress, streamed)
+    return _complete(tour, started, stage_start, store, progress)
+
+
+def narrate(tour: Dict, julep_service, store: Optional[TourStore] = None) -> Dict:
+    """
+    Has the model write the narrative of a finished tour, e.g. one answered with the template
+    narrative in 'preview' mode, and stores the tour with it for later requests.
+
+    Returns:
+        A copy of the tour with the model's narrative, or the tour itself if none was written.
+    """
+    narrative = julep_service.generate_tour_narrative(tour['city'], tour['weather_summary'], tour['dining_suggestion'],
+                                                      tour['tour_data'], tour['budget'])
+    if not narrative:
+        return tour
+    tour = {**tour, 'narrative': narrative, 'narrative_source': 'llm', 'provenance': dict(tour['provenance'])}
+    _record_provenance(tour, 'narrative', narrative_inputs(tour))
+    _save(tour, store)
+    return tour
+
+
+def _env_int(name: str, default: int) -> int:
+    value = os.getenv(name)
+    try:
+        return max(1, int(value)) if value else default
+    except ValueError:
+        print(f"WARNING: Ignoring invalid {name}={value!r}, using {default}")
+        return default
+
+
+def _env_seconds(name: str) -> Optional[float]:
+    value = os.getenv(name)
+    try:
+        return float(value) if value and float(value) > 0 else None
+    except ValueError:
+        print(f"WARNING: Ignoring invalid {name}={value!r}")
+        return None
+
+
+def _env_choice(name: str, choices: Tuple[str, ...], default: str) -> str:
+    value = os.getenv(name)
+    if value and value not in choices:
+        print(f"WARNING: Ignoring invalid {name}={value!r}, using {default}")
+        return default
+    return value or default
+
+
+@dataclass
+class EngineSettings:
+    """Scheduling limits for TourEngine."""
+
+    max_concurrency: int = 8
+    weather_concurrency: int = 4
+    julep_concurrency: int = 6
+    max_cities: int = 50
+    # Seconds each tour may take before its late stages degrade; None waits as long as the services do
+    tour_deadline: Optional[float] = None
+    # How narratives are written, one of NARRATIVE_MODES
+    narrative_mode: str = DEFAULT_NARRATIVE_MODE
+
+    def deadline(self) -> Optional[Deadline]:
+        """Starts the clock on a tour's deadline, if tours have one"""
+        return Deadline(self.tour_deadline) if self.tour_deadline else None
+
+    @classmethod
+    def from_env(cls) -> "EngineSettings":
+        """Builds settings from KRIDA_* environment variables, falling back to the defaults"""
+        defaults = cls()
+        return cls(
+            max_concurrency=_env_int('KRIDA_MAX_CONCURRENCY', defaults.max_concurrency),
+            weather_concurrency=_env_int('KRIDA_WEATHER_CONCURRENCY', defaults.weather_concurrency),
+            julep_concurrency=_env_int('KRIDA_JULEP_CONCURRENCY', defaults.julep_concurrency),
+            max_cities=_env_int('KRIDA_MAX_CITIES', defaults.max_cities),
+            tour_deadline=_env_seconds('KRIDA_TOUR_DEADLINE'),
+            narrative_mode=_env_choice('KRIDA_NARRATIVE_MODE', NARRATIVE_MODES, defaults.narrative_mode),
+        )
+
+
+class _Throttled:
+    """Proxies a service so that every method call holds one of a shared pool of slots."""
+
+    def __init__(self, service, slots: threading.BoundedSemaphore):
+        self._service = service
+        self._slots = slots
+
+    def __getattr__(self, name):
+        attr = getattr(self._service, name)
+        if not callable(attr):
+            return attr
+
+        if inspect.isgeneratorfunction(attr):
+            # Streaming methods hold their slot until the stream is exhausted
+            def stream(*args, **kwargs):
+                with self._slots:
+                    yield from attr(*args, **kwargs)
+            return stream
+
+        def call(*args, **kwargs):
+            with self._slots:
+                return attr(*args, **kwargs)
+        return call
+
+
+class TourCancelled(BaseException):
+    """
+    Raised inside a cancelled tour at its next service call or stream chunk.
+
+    Like KeyboardInterrupt it derives from BaseException, so the services' broad
+    `except Exception` handlers let it through instead of treating it as a failed call.
+    """
+
+
+class _Cancellable:
+    """Proxies a service so that, once `cancelled` is set, no new call starts and open streams are closed."""
+
+    def __init__(self, service, cancelled: threading.Event):
+        self._service = service
+        self._cancelled = cancelled
+
+    def _check(self) -> None:
+        if self._cancelled.is_set():
+            raise TourCancelled()
+
+    def __getattr__(self, name):
+        attr = getattr(self._service, name)
+        if not callable(attr):
+            return attr
+
+        if inspect.isgeneratorfunction(attr):
+            def stream(*args, **kwargs):
+                self._check()
+                chunks = attr(*args, **kwargs)
+                try:
+                    for chunk in chunks:
+                        self._check()
+                        yield chunk
+                finally:
+                    # Closing the service's generator closes its HTTP response, ending the stream at the provider
+                    chunks.close()
+            return stream
+
+        def call(*args, **kwargs):
+            self._check()
+            return attr(*args, **kwargs)
+        return call
+
+
+class BackgroundTour(TourProgress):
+    """
+    Runs plan_tour for one city on a background thread ahead of time.
+
+    Progress is recorded until a foreground TourProgress attaches, which then gets the
+    recorded stages replayed and the remaining ones live.
+    """
+
+    # Streaming lets a cancel cut the narrative short instead of waiting for the whole reply
+    wants_narrative_stream = True
+
+    def __init__(self, city: str, budget: str, weather_service, julep_service, store: Optional[TourStore] = None,
+                 deadline: Optional[float] = None, narrative_mode: str = DEFAULT_NARRATIVE_MODE):
+        """Starts generating the tour right away; `deadline` is the tour's time budget in seconds"""
+        self.city = city
+        self.budget = budget
+        self.store = store
+        self.deadline = deadline
+        self.narrative_mode = narrative_mode
+        self._cancelled = threading.Event()
+        self._done = threading.Event()
+        self._lock = threading.Lock()
+        self._events: List[Tuple[str, tuple]] = []
+        self._target: Optional[TourProgress] = None
+        self._tour: Optional[Dict] = None
+        self._error: Optional[BaseException] = None
+        # A daemon thread, so quitting never waits for a request that is still in flight
+        thread = threading.Thread(target=self._run, args=(weather_service, julep_service),
+                                  name=f"krida-look-ahead-{city}", daemon=True)
+        thread.start()
+
+    def _run(self, weather_service, julep_service) -> None:
+        try:
+            self._tour = plan_tour(self.city, self.budget, _Cancellable(weather_service, self._cancelled),
+                                   _Cancellable(julep_service, self._cancelled), progress=self, store=self.store,
+                                   deadline=Deadline(self.deadline) if self.deadline else None,
+                                   narrative_mode=self.narrative_mode)
+        except TourCancelled:
+            METRICS.increment('tours', status='cancelled')
+        except BaseException as e:
+            self._error = e
+        finally:
+            self._done.set()
+
+    @staticmethod
+    def _forward(target: TourProgress, hook: str, args: tuple) -> None:
+        if hook == 'narrative_chunk' and not target.wants_narrative_stream:
+            return
+        getattr(target, hook)(*args)
+
+    def _emit(self, hook: str, *args) -> None:
+        with self._lock:
+            if self._target is None:
+                self._events.append((hook, args))
+                return
+        self._forward(self._target, hook, args)
+
+    def stage_started(self, stage: str, tour: Dict) -> None:
+        self._emit('stage_started', stage, tour)
+
+    def stage_finished(self, stage: str, tour: Dict) -> None:
+        self._emit('stage_finished', stage, tour)
+
+    def stage_failed(self, stage: str, tour: Dict) -> None:
+        self._emit('stage_failed', stage, tour)
+
+    def narrative_chunk(self, chunk: str, tour: Dict) -> None:
+        self._emit('narrative_chunk', chunk, tour)
+
+    def narrative_preview(self, narrative: str, tour: Dict) -> None:
+        self._emit('narrative_preview', narrative, tour)
+
+    def attach(self, progress: TourProgress) -> Dict:
+        """
+        Hands the tour over to a foreground progress and waits for it to finish.
+
+        Returns:
+            The tour dictionary from plan_tour. Re-raises whatever plan_tour raised,
+            or TourCancelled if the tour was cancelled.
+        """
+        with self._lock:
+            for hook, args in self._events:
+                self._forward(progress, hook, args)
+            self._events.clear()
+            self._target = progress
+        self._done.wait()
+        if self._error is not None:
+            raise self._error
+        if self._tour is None:
+            raise TourCancelled()
+        return self._tour
+
+    def cancel(self) -> None:
+        """Stops the tour at its next service call or narrative chunk; returns without waiting"""
+        self._cancelled.set()
+
+
+class TourEngine:
+    """Runs the tour pipeline for many cities at once within global and per-provider limits."""
+
+    def __init__(self, weather_service, julep_service, settings: Optional[EngineSettings] = None,
+                 store: Optional[TourStore] = None):
+        """
+        Initializes the engine around already constructed services.
+
+        Args:
+            weather_service: The WeatherService shared by all tours.
+            julep_service: The JulepService shared by all tours.
+            settings: Scheduling limits; defaults to EngineSettings.from_env().
+            store: Optional TourStore that tours are built on and saved to.
+        """
+        self.settings = settings or EngineSettings.from_env()
+        self.store = store
+        self._weather_service = weather_service
+        self.weather_service = _Throttled(weather_service, threading.BoundedSemaphore(self.settings.weather_concurrency))
+        self.julep_service = _Throttled(julep_service, threading.BoundedSemaphore(self.settings.julep_concurrency))
+
+    def _plan(self, city: str, budget: str) -> Dict:
+        # The deadline starts when the tour does, not while it waits for a worker
+        return plan_tour(city, budget, self.weather_service, self.julep_service, store=self.store,
+                         deadline=self.settings.deadline(), narrative_mode=self.settings.narrative_mode)
+
+    def _warm_weather(self, cities: List[str]) -> None:
+        """Resolves the cities and fetches their weather in as few requests as possible, for the tours still queued"""
+        service = self._weather_service
+        workers = self.settings.weather_concurrency
+        try:
+            if hasattr(service, 'resolve_city'):
+                with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='krida-warm-up') as executor:
+                    cities = list(executor.map(service.resolve_city, cities))
+            if hasattr(service, 'get_weather_many'):
+                service.get_weather_many(cities, max_workers=workers)
+        except Exception as e:
+            print(f"WARNING: Weather warm-up failed, tours fetch their own: {e}")
+
+    def run(self, cities: List[str], budget: str) -> Iterator[Dict]:
+        """
+        Generates tours for all cities concurrently.
+
+        Args:
+            cities: The cities to tour; anything beyond settings.max_cities is dropped.
+            budget: The budget shared by every tour.
+
+        Yields:
+            Tour dictionaries from plan_tour, in the order the cities complete.
+        """
+        cities = cities[:self.settings.max_cities]
+        return self.run_requests([(city, budget) for city in cities])
+
+    def run_requests(self, tour_requests: List[Tuple[str, str]]) -> Iterator[Dict]:
+        """
+        Generates tours for (city, budget) pairs concurrently, without the max_cities limit.
+
+        Yields:
+            Tour dictionaries from plan_tour, in the order the tours complete.
+        """
+        # Warm the weather cache in the background rather than before the first tour starts:
+        # tours resolve their own city, share any lookup of the warm-up still in flight and
+        # find the weather of cities fetched through the group endpoint already cached
+        cities = list(dict.fromkeys(city for city, _ in tour_requests))
+        threading.Thread(target=self._warm_weather, args=(cities,), name='krida-weather-warm-up', daemon=True).start()
+        with ThreadPoolExecutor(max_workers=self.settings.max_concurrency) as executor:
+            futures = {
+                executor.submit(self._plan, city, budget): (city, budget)
+                for city, budget in tour_requests
+            }
+            try:
+                for future in as_completed(futures):
+                    city, budget = futures[future]
+                    try:
+                        yield future.result()
+                    except Exception as e:
+                        tour = _new_tour(city, budget)
+                        tour.update(status='failed', error=str(e))
+                        yield tour
+            finally:
+                # If the caller stops early, drop the tours that have not started yet
+                for future in futures:
+                    future.cancel()
+
+
+async def _discover_separately_async(tour: Dict, julep_service, progress: TourProgress, already_started: bool = False,
+                                     previous: Optional[Dict] = None, deadline: Optional[Deadline] = None) -> Optional[Dict]:
+    """Async version of _discover_separately; restaurant lookups that overrun are cancelled"""
+    city, budget = tour['city'], tour['budget']
+
+    # Step 2: Dish discovery
+    if not already_started:
+        progress.stage_started('dishes', tour)
+    stage_start = time.perf_counter()
+    dishes, overran = _reused_dishes(tour, previous), False
+    if dishes is None:
+        dishes, overran = await _attempt_async(deadline, 'dishes', julep_service.get_iconic_dishes, city, budget,
+                                               fallback=_dishes_fallback(previous))
+    failed = _settle_dishes(tour, dishes, overran, previous, stage_start, progress)
+    if failed:
+        return failed
+    dishes = tour['dishes']
+
+    # Step 3: Restaurants, all the lookups still needed in flight at once
+    progress.stage_started('restaurants', tour)
+    stage_start = time.perf_counter()
+    stored, missing = _restaurants_to_find(tour, previous, dishes)
+    if deadline is None:
+        found = dict(zip(missing, await asyncio.gather(
+            *(julep_service.find_restaurants_for_dish(city, dishes[i], budget) for i in missing),
+            return_exceptions=True
+        )))
+    else:
+        seconds = deadline.stage_budget('restaurants', _restaurants_fallback(previous, dishes, missing))
+        lookups = {
+            i: asyncio.ensure_future(julep_service.find_restaurants_for_dish(city, dishes[i], budget)) for i in missing
+        } if seconds > 0 else {}
+        if lookups:
+            await asyncio.wait(lookups.values(), timeout=seconds)
+        found = {}
+        for i, lookup in lookups.items():
+            if lookup.done():
+                found[i] = lookup.exception() or lookup.result()
+            else:
+                lookup.cancel()
+    tour['timings']['restaurants'] = time.perf_counter() - stage_start
+    return _collect_restaurants(tour, dishes, stored, found, previous, progress)
+
+
+async def plan_tour_async(city: str, budget: str, weather_service, julep_service, progress: Optional[TourProgress] = None,
+                          store: Optional[TourStore] = None, deadline: Optional[Deadline] = None,
+                          narrative_mode: str = DEFAULT_NARRATIVE_MODE) -> Dict:
+    """
+    asyncio version of plan_tour for AsyncWeatherService and AsyncJulepService.
+
+    The three restaurant lookups run concurrently on the event loop, and the
+    returned tour dictionary has the same shape as plan_tour's. Calls that
+    overrun their share of the deadline are cancelled.
+    """
+    _check_narrative_mode(narrative_mode)
+    progress = progress or TourProgress()
+    started = time.perf_counter()
+    unresolved = False
+    if hasattr(weather_service, 'resolve_city'):
+        place, unresolved = await _attempt_async(deadline, 'geocode', weather_service.resolve_city, city)
+        city = _unresolved_place(city) if unresolved else place
+    tour = _new_tour(city, budget)
+    if unresolved:
+        _degrade(tour, 'weather', 'unresolved_city')
+    previous = store.get(tour['city_id'], budget) if store else None
+
+    # Step 1: Weather
+    progress.stage_started('weather', tour)
+    stage_start = time.perf_counter()
+    weather, overran = await _attempt_async(deadline, 'weather', weather_service.get_weather, city)
+    _settle_weather(tour, weather, overran, stage_start, progress)
+
+    # Steps 2 and 3 in fused mode
+    fused = False
+    lookup_deadline = deadline
+    fused_mode = _wants_fused(tour, julep_service, previous)
+    if fused_mode:
+        progress.stage_started('dishes', tour)
+        stage_start = time.perf_counter()
+        answer, overran = await _attempt_async(deadline, ('dishes', 'restaurants'), julep_service.discover_tour, city, budget,
+                                               fallback=_dishes_fallback(previous))
+        if overran:
+            lookup_deadline = Deadline(0)
+        fused = _settle_fused(tour, answer, stage_start, progress)
+
+    if not fused:
+        failed = await _discover_separately_async(tour, julep_service, progress, already_started=fused_mode,
+                                                  previous=previous, deadline=lookup_deadline)
+        if failed:
+            return _finish(failed, started)
+
+    # Step 4: Narrative
+    progress.stage_started('narrative', tour)
+    stage_start = time.perf_counter()
+    narrative_args = (city, tour['weather_summary'], tour['dining_suggestion'], tour['tour_data'], budget)
+    if _narrative_without_model(tour, previous, narrative_mode, narrative_args, progress):
+        streamed = progress.wants_narrative_stream and hasattr(julep_service, 'stream_tour_narrative')
+        if streamed:
+            parts, overran = [], False
+            try:
+                async for chunk in _stream_within_async(deadline, 'narrative', julep_service.stream_tour_narrative, *narrative_args):
+                    _narrative_chunk(tour, parts, chunk, stage_start, progress)
+            except TimeoutError:
+                overran = True
+            narrative = "".join(parts) or None
+        else:
+            narrative, overran = await _attempt_async(deadline, 'narrative', julep_service.generate_tour_narrative, *narrative_args)
+        _settle_narrative(tour, narrative, overran, narrative_args, progress, streamed)
+    return _complete(tour, started, stage_start, store, progress)
+
+
+async def run_tours_async(cities: List[str], budget: str, weather_service, julep_service,
+                          max_concurrency: int = 100, store: Optional[TourStore] = None,
+                          deadline: Optional[float] = None, narrative_mode: str = DEFAULT_NARRATIVE_MODE) -> AsyncIterator[Dict]:
+    """
+    Runs plan_tour_async for many cities on one event loop.
+
+    Args:
+        cities: The cities to tour.
+        budget: The budget shared by every tour.
+        weather_service: An AsyncWeatherService.
+        julep_service: An AsyncJulepService.
+        max_concurrency: The most tours in flight at once.
+        store: Optional TourStore that tours are built on and saved to.
+        deadline: Optional time budget in seconds for each tour, from when it starts.
+        narrative_mode: How the narratives are written, see plan_tour.
+
+    Yields:
+        Tour dictionaries, in the order the cities complete.
+    """
+    slots = asyncio.Semaphore(max_concurrency)
+
+    async def warm_weather() -> None:
+        places = cities
+        try:
+            if hasattr(weather_service, 'resolve_city'):
+                places = list(await asyncio.gather(*(weather_service.resolve_city(city) for city in cities)))
+            if hasattr(weather_service, 'get_weather_many'):
+                await weather_service.get_weather_many(places)
+        except Exception as e:
+            print(f"WARNING: Weather warm-up failed, tours fetch their own: {e}")
+
+    async def run_one(city: str) -> Dict:
+        async with slots:
+            try:
+                return await plan_tour_async(city, budget, weather_service, julep_service, store=store,
+                                             deadline=Deadline(deadline) if deadline else None,
+                                             narrative_mode=narrative_mode)
+            except Exception as e:
+                tour = _new_tour(city, budget)
+                tour.update(status='failed', error=str(e))
+                return tour
+
+    # Warm the weather cache alongside the tours, which resolve their own city and share its lookups
+    warm_up = asyncio.ensure_future(warm_weather())
+    tasks = [asyncio.ensure_future(run_one(city)) for city in cities]
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            yield await next_done
+    finally:
+        for task in tasks + [warm_up]:
+            task.cancel()
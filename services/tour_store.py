@@ -0,0 +1,126 @@
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+from typing import Any, Dict, Optional
+from services.cache import DEFAULT_CACHE_DIR
+from services.normalize import budget_context, budget_tier, persistent_id
+
+# Bump when the prompts or the tour shape change, so stored pieces are regenerated
+PIPELINE_VERSION = 1
+
+# The tour fields kept in the store; the raw weather payload and timings are left out
+STORED_FIELDS = ('city', 'city_id', 'budget', 'weather_summary', 'dining_suggestion', 'dishes', 'tour_data',
+                 'narrative', 'provenance')
+
+
+def fingerprint(*parts: Any) -> str:
+    """Hashes the inputs of a tour piece, so any change to them yields a new fingerprint"""
+    payload = json.dumps([PIPELINE_VERSION, *parts], sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()[:16]
+
+
+def weather_inputs(tour: Dict) -> str:
+    return fingerprint('weather', tour['city_id'])
+
+
+def dishes_inputs(tour: Dict) -> str:
+    # A city's iconic dishes do not depend on the budget, so another budget's tour can reuse them
+    return fingerprint('dishes', tour['city_id'])
+
+
+def restaurant_inputs(tour: Dict, dish: str) -> str:
+    return fingerprint('restaurant', tour['city_id'], dish, budget_context(tour['budget']))
+
+
+def narrative_inputs(tour: Dict) -> str:
+    return fingerprint('narrative', str(tour['city']), tour['weather_summary'], tour['dining_suggestion'],
+                       tour['tour_data'], budget_context(tour['budget']))
+
+
+class TourStore:
+    """
+    Keeps the latest finished tour per city and budget tier in SQLite, with the provenance of each piece.
+
+    A piece's provenance records a fingerprint of the inputs it was generated from, so a
+    re-requested tour only regenerates the pieces whose inputs changed.
+    """
+
+    def __init__(self, path: Optional[str] = None, max_entries: int = 2000, bypass: bool = False, refresh: bool = False):
+        """
+        Opens (or creates) the store.
+
+        Args:
+            path: The SQLite file to use. Defaults to tours.sqlite3 in DEFAULT_CACHE_DIR.
+            max_entries: The tour count above which the least recently updated tours are dropped.
+            bypass: Neither read nor write stored tours.
+            refresh: Ignore stored tours but store the fresh ones.
+        """
+        self.path = path or os.path.join(DEFAULT_CACHE_DIR, 'tours.sqlite3')
+        self.max_entries = max_entries
+        self.bypass = bypass
+        self.refresh = refresh
+        self._lock = threading.Lock()
+
+        if self.path != ':memory:':
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        self._db = sqlite3.connect(self.path, check_same_thread=False)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS tours ("
+            " city_id TEXT NOT NULL, budget TEXT NOT NULL, record TEXT NOT NULL, updated_at REAL NOT NULL,"
+            " PRIMARY KEY (city_id, budget))"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS tours_updated_at ON tours (updated_at)")
+        self._db.commit()
+
+    def get(self, city_id: str, budget: str) -> Optional[Dict]:
+        """
+        Looks up the stored tour to build on.
+
+        Returns:
+            The tour stored for this city and budget tier, otherwise the city's most recent tour at
+            any budget (whose dishes still apply), or None.
+        """
+        if self.bypass or self.refresh:
+            return None
+        with self._lock:
+            row = self._db.execute(
+                "SELECT record FROM tours WHERE city_id = ? ORDER BY budget = ? DESC, updated_at DESC LIMIT 1",
+                (city_id, budget_tier(budget))
+            ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def put(self, tour: Dict) -> None:
+        """
+        Stores a finished tour, replacing the previous one for its city and budget tier.
+        Tours of a city whose geocoding failed are not stored, see persistent_id.
+        """
+        if self.bypass or persistent_id(tour['city']) is None:
+            return
+        record = {field: tour.get(field) for field in STORED_FIELDS}
+        record['city'] = str(record['city'])
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO tours (city_id, budget, record, updated_at) VALUES (?, ?, ?, ?)",
+                (tour['city_id'], budget_tier(tour['budget']), json.dumps(record, ensure_ascii=False), time.time())
+            )
+            overflow = self._db.execute("SELECT COUNT(*) FROM tours").fetchone()[0] - self.max_entries
+            if overflow > 0:
+                self._db.execute(
+                    "DELETE FROM tours WHERE rowid IN (SELECT rowid FROM tours ORDER BY updated_at LIMIT ?)", (overflow,)
+                )
+            self._db.commit()
+
+    def clear(self) -> None:
+        """Removes every stored tour"""
+        with self._lock:
+            self._db.execute("DELETE FROM tours")
+            self._db.commit()
+
+    def stats(self) -> Dict[str, Any]:
+        """Returns the number of stored tours and of distinct cities"""
+        with self._lock:
+            tours, cities = self._db.execute("SELECT COUNT(*), COUNT(DISTINCT city_id) FROM tours").fetchone()
+        return {'tours': tours, 'cities': cities}
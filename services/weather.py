@@ -1,23 +1,216 @@
 import os
+import time
+import asyncio
+import threading
+import httpx
 import requests
-from typing import Optional, Dict
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
+from typing import Optional, Dict, List, Tuple
+from services.cache import ResponseCache
+from services.metrics import METRICS
+from services.normalize import City, cache_id, canonical_name, city_key, persistent_id
+from services.rate_control import RATE_CONTROL, ProviderLimiter, Retryable, check_retryable
+from services.single_flight import SingleFlight, coalesced
 
-class WeatherService:
+# The group endpoint accepts at most 20 city IDs per request
+GROUP_BATCH_SIZE = 20
+
+class _WeatherServiceBase:
+    """The per-city TTL cache, city ID map and place resolution shared by WeatherService and AsyncWeatherService."""
+
+    def __init__(self, api_key: str, cache_ttl: float, id_store: Optional[ResponseCache],
+                 rate_limiter: Optional[ProviderLimiter]):
+        self.api_key = api_key
+        self.rate_limiter = rate_limiter or RATE_CONTROL.limiter('openweather')
+        self.base_url = 'https://api.openweathermap.org/data/2.5/weather'
+        self.group_url = 'https://api.openweathermap.org/data/2.5/group'
+        self.geocode_url = 'https://api.openweathermap.org/geo/1.0/direct'
+        self.cache_ttl = cache_ttl
+        self.id_store = id_store
+        self._cache = {}
+        self._city_ids = {}
+        self._places = {}
+        self._lock = threading.Lock()
+        # Concurrent lookups of the same city share one request
+        self.flights = {name: SingleFlight(name) for name in ('weather', 'geocode')}
+
+    def dedup_stats(self) -> Dict[str, Dict]:
+        """Single-flight statistics per kind of request, see SingleFlight.stats"""
+        return {name: flight.stats() for name, flight in self.flights.items()}
+
+    def _known_place(self, city: str) -> Optional[City]:
+        """Returns the place a city name was resolved to before, in this run or a previous one"""
+        key = city_key(city)
+        with self._lock:
+            record = self._places.get(key)
+        if record is None and self.id_store is not None:
+            record = self.id_store.get('place', key)
+            if record is not None:
+                with self._lock:
+                    self._places[key] = record
+        METRICS.increment('cache_lookups', namespace='place', result='miss' if record is None else 'hit')
+        return City.from_record(record, query=city) if record is not None else None
+
+    def _geocode_params(self, city: str) -> Dict:
+        return {'q': canonical_name(city), 'limit': 1, 'appid': self.api_key}
+
+    def _remember_place(self, city: str, payload) -> City:
+        """Records the first geocoding match; without one the alias-resolved name is used, and not stored"""
+        match = payload[0] if isinstance(payload, list) and payload else None
+        if not isinstance(match, dict) or 'lat' not in match or 'lon' not in match:
+            return City(canonical_name(city), query=city)
+        record = {
+            'name': match.get('name') or canonical_name(city),
+            'lat': match['lat'],
+            'lon': match['lon'],
+            'country': match.get('country'),
+        }
+        key = city_key(city)
+        with self._lock:
+            self._places[key] = record
+        if self.id_store is not None:
+            self.id_store.set('place', key, record)
+        return City.from_record(record, query=city)
+
+    def _weather_params(self, city: str) -> Dict:
+        if isinstance(city, City) and city.lat is not None and city.lon is not None:
+            location = {'lat': city.lat, 'lon': city.lon}
+        else:
+            location = {'q': canonical_name(city)}
+        return {
+            **location,
+            'appid': self.api_key,
+            'units': 'metric'  # Change to 'imperial' for Fahrenheit
+        }
+
+    def _cached(self, city: str) -> Optional[Dict]:
+        with self._lock:
+            entry = self._cache.get(cache_id(city))
+        if entry and entry[0] > time.monotonic():
+            return entry[1]
+        return None
+
+    def _remember(self, city: str, weather_data: Dict) -> None:
+        key = cache_id(city)
+        with self._lock:
+            self._cache[key] = (time.monotonic() + self.cache_ttl, weather_data)
+            known_id = self._city_ids.get(key)
+            if 'id' in weather_data:
+                self._city_ids[key] = weather_data['id']
+        # The ID of a place geocoding could not find is only kept for this run
+        if self.id_store is not None and 'id' in weather_data and known_id != weather_data['id'] \
+                and persistent_id(city) is not None:
+            self.id_store.set('city_id', key, weather_data['id'])
+
+    def _city_id(self, city: str) -> Optional[int]:
+        key = cache_id(city)
+        with self._lock:
+            city_id = self._city_ids.get(key)
+        if city_id is None and self.id_store is not None:
+            city_id = self.id_store.get('city_id', key)
+            if city_id is not None:
+                with self._lock:
+                    self._city_ids[key] = city_id
+        return city_id
+
+    def _plan_many(self, cities: List[str]) -> Tuple[Dict[str, Optional[Dict]], Dict[int, List[str]], List[List[int]]]:
+        """Splits cities into cached results and batches of known city IDs for the group endpoint"""
+        results = {}
+        by_id = {}
+        for city in cities:
+            cached = self._cached(city)
+            if cached is not None:
+                results[city] = cached
+                continue
+            city_id = self._city_id(city)
+            if city_id is not None:
+                by_id.setdefault(city_id, []).append(city)
+        ids = list(by_id)
+        batches = [ids[start:start + GROUP_BATCH_SIZE] for start in range(0, len(ids), GROUP_BATCH_SIZE)]
+        return results, by_id, batches
+
+    def _collect_group(self, payload: Dict, by_id: Dict[int, List[str]], results: Dict[str, Optional[Dict]]) -> None:
+        for weather_data in payload.get('list', []):
+            for city in by_id.get(weather_data.get('id'), []):
+                self._remember(city, weather_data)
+                results[city] = weather_data
+
+
+class WeatherService(_WeatherServiceBase):
     """A service to interact with the OpenWeather API to get weather data."""
     
-    def __init__(self, api_key: str):
+    def __init__(self, api_key: str, cache_ttl: float = 600, pool_size: int = 10,
+                 id_store: Optional[ResponseCache] = None, rate_limiter: Optional[ProviderLimiter] = None):
         """
         Initializes the WeatherService with an API key.
 
         Args:
             api_key: The API key for the OpenWeather API.
+            cache_ttl: Seconds a city's current weather is reused before it is fetched again.
+            pool_size: The number of keep-alive connections kept open to OpenWeather.
+            id_store: Optional persistent store remembering each city's OpenWeather ID across runs.
+            rate_limiter: The OpenWeather limiter to send requests through; defaults to the process-wide one.
         """
-        self.api_key = api_key
-        self.base_url = 'https://api.openweathermap.org/data/2.5/weather'
+        super().__init__(api_key, cache_ttl, id_store, rate_limiter)
+        self.pool_size = pool_size
+
+        # One shared session so every call reuses pooled TCP/TLS connections
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+    def _get(self, url: str, params: Dict, endpoint: str) -> requests.Response:
+        """A GET through the rate limiter, retried on 429s, server errors and connection failures"""
+        return self.rate_limiter.call(self._get_once, url, params, endpoint)
+
+    def _get_once(self, url: str, params: Dict, endpoint: str) -> requests.Response:
+        try:
+            # Set a timeout to prevent the request from hanging indefinitely
+            with METRICS.timer('weather_request_seconds', endpoint=endpoint):
+                response = self.session.get(url, params=params, timeout=10)
+                check_retryable(response.status_code, response.headers, f"{response.status_code} from OpenWeather {endpoint}")
+                # This will raise an HTTPError for other bad responses (4xx)
+                response.raise_for_status()
+        except (requests.ConnectionError, requests.Timeout) as e:
+            raise Retryable(str(e)) from e
+        return response
+
+    def resolve_city(self, city: str) -> City:
+        """
+        Resolves a city name to its canonical place through OpenWeather geocoding.
+
+        Aliases such as "NYC" are resolved first, and every result is remembered in
+        id_store, so each distinct name is geocoded once.
+
+        Args:
+            city: The name of the city, or an already resolved City.
+
+        Returns:
+            The City, without coordinates if geocoding failed or found nothing.
+        """
+        if isinstance(city, City):
+            return city
+        known = self._known_place(city)
+        if known is not None:
+            return known
+        # Prefetches and tours often resolve the same new city at once; geocode it only once
+        place, _ = self.flights['geocode'].do(city_key(city), lambda: self._known_place(city) or self._geocode(city))
+        return place
+
+    def _geocode(self, city: str) -> City:
+        try:
+            response = self._get(self.geocode_url, self._geocode_params(city), 'geocode')
+            return self._remember_place(city, response.json())
+        except (requests.RequestException, Retryable) as e:
+            print(f"Error geocoding {city}: {e}")
+            return City(canonical_name(city), query=city)
 
+    @coalesced('weather', key=lambda self, city: cache_id(city))
     def get_weather(self, city: str) -> Optional[Dict]:
         """
-        Fetches the current weather for a specified city.
+        Fetches the current weather for a specified city. Concurrent calls for the same place share one request.
 
         Args:
             city: The name of the city.
@@ -25,21 +218,156 @@ class WeatherService:
         Returns:
             A dictionary containing the weather data, or None if an error occurs.
         """
-        params = {
-            'q': city,
-            'appid': self.api_key,
-            'units': 'metric'  # Change to 'imperial' for Fahrenheit
-        }
+        cached = self._cached(city)
+        METRICS.increment('cache_lookups', namespace='weather', result='miss' if cached is None else 'hit')
+        if cached is not None:
+            return cached
+
+        params = self._weather_params(city)
         try:
-            # Set a timeout to prevent the request from hanging indefinitely
-            response = requests.get(self.base_url, params=params, timeout=10)
-            # This will raise an HTTPError for bad responses (4xx or 5xx)
-            response.raise_for_status()
-            return response.json()
-        except requests.RequestException as e:
+            weather_data = self._get(self.base_url, params, 'weather').json()
+            self._remember(city, weather_data)
+            return weather_data
+        except (requests.RequestException, Retryable) as e:
+            print(f"Error fetching weather data for {city}: {e}")
+            return None
+
+    def get_weather_many(self, cities: List[str], max_workers: Optional[int] = None) -> Dict[str, Optional[Dict]]:
+        """
+        Fetches the current weather for several cities with as few requests as possible.
+
+        Cities whose OpenWeather ID is already known are fetched together through the
+        group endpoint; the rest are fetched individually, which also records their IDs
+        for next time. Group and single lookups run concurrently.
+
+        Args:
+            cities: The names of the cities.
+            max_workers: The most requests in flight at once; defaults to pool_size.
+
+        Returns:
+            A dictionary mapping each city to its weather data, or None if it could not be fetched.
+        """
+        results, by_id, batches = self._plan_many(cities)
+
+        def fetch_group(batch: List[int]) -> None:
+            params = {
+                'id': ",".join(str(city_id) for city_id in batch),
+                'appid': self.api_key,
+                'units': 'metric'
+            }
+            try:
+                self._collect_group(self._get(self.group_url, params, 'group').json(), by_id, results)
+            except (requests.RequestException, Retryable) as e:
+                print(f"Error fetching grouped weather data: {e}")
+
+        with ThreadPoolExecutor(max_workers=max_workers or self.pool_size, thread_name_prefix='krida-weather') as executor:
+            list(executor.map(fetch_group, batches))
+            # Unknown IDs and anything the group request missed fall back to single lookups
+            missing = [city for city in cities if city not in results]
+            for city, weather_data in zip(missing, executor.map(self.get_weather, missing)):
+                results[city] = weather_data
+        return results
+
+class AsyncWeatherService(_WeatherServiceBase):
+    """asyncio counterpart of WeatherService built on a pooled httpx.AsyncClient."""
+
+    def __init__(self, api_key: str, cache_ttl: float = 600, pool_size: int = 100,
+                 id_store: Optional[ResponseCache] = None, rate_limiter: Optional[ProviderLimiter] = None):
+        """
+        Initializes the AsyncWeatherService with an API key.
+
+        Args:
+            api_key: The API key for the OpenWeather API.
+            cache_ttl: Seconds a city's current weather is reused before it is fetched again.
+            pool_size: The most connections kept open to OpenWeather.
+            id_store: Optional persistent store remembering each city's OpenWeather ID across runs.
+            rate_limiter: The OpenWeather limiter to send requests through; defaults to the process-wide one.
+        """
+        super().__init__(api_key, cache_ttl, id_store, rate_limiter)
+        self.client = httpx.AsyncClient(
+            timeout=10,
+            limits=httpx.Limits(max_connections=pool_size, max_keepalive_connections=pool_size)
+        )
+
+    async def _get(self, url: str, params: Dict, endpoint: str) -> httpx.Response:
+        """Async version of WeatherService._get"""
+        return await self.rate_limiter.call_async(self._get_once, url, params, endpoint)
+
+    async def _get_once(self, url: str, params: Dict, endpoint: str) -> httpx.Response:
+        try:
+            with METRICS.timer('weather_request_seconds', endpoint=endpoint):
+                response = await self.client.get(url, params=params)
+                check_retryable(response.status_code, response.headers, f"{response.status_code} from OpenWeather {endpoint}")
+                response.raise_for_status()
+        except httpx.TransportError as e:
+            raise Retryable(str(e)) from e
+        return response
+
+    async def resolve_city(self, city: str) -> City:
+        """Async version of WeatherService.resolve_city"""
+        if isinstance(city, City):
+            return city
+        known = self._known_place(city)
+        if known is not None:
+            return known
+        place, _ = await self.flights['geocode'].do_async(city_key(city), self._geocode, city)
+        return place
+
+    async def _geocode(self, city: str) -> City:
+        known = self._known_place(city)
+        if known is not None:
+            return known
+        try:
+            response = await self._get(self.geocode_url, self._geocode_params(city), 'geocode')
+            return self._remember_place(city, response.json())
+        except (httpx.HTTPError, Retryable) as e:
+            print(f"Error geocoding {city}: {e}")
+            return City(canonical_name(city), query=city)
+
+    @coalesced('weather', key=lambda self, city: cache_id(city))
+    async def get_weather(self, city: str) -> Optional[Dict]:
+        """Async version of WeatherService.get_weather"""
+        cached = self._cached(city)
+        METRICS.increment('cache_lookups', namespace='weather', result='miss' if cached is None else 'hit')
+        if cached is not None:
+            return cached
+
+        params = self._weather_params(city)
+        try:
+            weather_data = (await self._get(self.base_url, params, 'weather')).json()
+            self._remember(city, weather_data)
+            return weather_data
+        except (httpx.HTTPError, Retryable) as e:
             print(f"Error fetching weather data for {city}: {e}")
             return None
 
+    async def get_weather_many(self, cities: List[str]) -> Dict[str, Optional[Dict]]:
+        """Async version of WeatherService.get_weather_many; group and single lookups run concurrently"""
+        results, by_id, batches = self._plan_many(cities)
+
+        async def fetch_group(batch: List[int]) -> None:
+            params = {
+                'id': ",".join(str(city_id) for city_id in batch),
+                'appid': self.api_key,
+                'units': 'metric'
+            }
+            try:
+                self._collect_group((await self._get(self.group_url, params, 'group')).json(), by_id, results)
+            except (httpx.HTTPError, Retryable) as e:
+                print(f"Error fetching grouped weather data: {e}")
+
+        await asyncio.gather(*(fetch_group(batch) for batch in batches))
+
+        # Unknown IDs and anything the group request missed fall back to single lookups
+        missing = [city for city in cities if city not in results]
+        for city, weather_data in zip(missing, await asyncio.gather(*(self.get_weather(city) for city in missing))):
+            results[city] = weather_data
+        return results
+
+    async def aclose(self) -> None:
+        """Closes the pooled connections"""
+        await self.client.aclose()
+
 if __name__ == '__main__':
     api_key = os.getenv('OPENWEATHER_API_KEY')
     
@@ -0,0 +1,139 @@
+"""
+Tour deadlines with stand-in services: what each pipeline falls back to when a stage overruns.
+
+Every case runs through both plan_tour and plan_tour_async.
+"""
+import time
+import asyncio
+import pytest
+from services.deadline import Deadline
+from services.normalize import City, canonical_name
+from services.tour_engine import plan_tour, plan_tour_async
+from services.tour_store import TourStore
+
+WEATHER = {'main': {'temp': 20}, 'weather': [{'main': 'Clear'}]}
+DISHES = ['Croissant', 'Steak Frites', 'Coq au Vin']
+NARRATIVE = "A narrative written by the model"
+
+
+def _restaurant(dish):
+    return {'name': f"{dish} House", 'rating': '4.5', 'reason': 'Locals love it.', 'price_range': '$$'}
+
+
+def _place(city):
+    return City(canonical_name(city), 48.86, 2.35, 'FR', city)
+
+
+class FakeWeather:
+    def __init__(self, geocode_delay=0.0):
+        self.geocode_delay = geocode_delay
+
+    def resolve_city(self, city):
+        time.sleep(self.geocode_delay)
+        return _place(city)
+
+    def get_weather(self, city):
+        return WEATHER
+
+
+class FakeJulep:
+    def __init__(self, fused_discovery=False, discovery_delay=0.0, dishes_delay=0.0):
+        self.fused_discovery = fused_discovery
+        self.discovery_delay = discovery_delay
+        self.dishes_delay = dishes_delay
+
+    def discover_tour(self, city, budget):
+        time.sleep(self.discovery_delay)
+        return None
+
+    def get_iconic_dishes(self, city, budget):
+        time.sleep(self.dishes_delay)
+        return list(DISHES)
+
+    def find_restaurants_for_dish(self, city, dish, budget):
+        return _restaurant(dish)
+
+    def generate_tour_narrative(self, *args):
+        return NARRATIVE
+
+
+class AsyncFakeWeather(FakeWeather):
+    async def resolve_city(self, city):
+        await asyncio.sleep(self.geocode_delay)
+        return _place(city)
+
+    async def get_weather(self, city):
+        return WEATHER
+
+
+class AsyncFakeJulep(FakeJulep):
+    async def discover_tour(self, city, budget):
+        await asyncio.sleep(self.discovery_delay)
+        return None
+
+    async def get_iconic_dishes(self, city, budget):
+        await asyncio.sleep(self.dishes_delay)
+        return list(DISHES)
+
+    async def find_restaurants_for_dish(self, city, dish, budget):
+        return _restaurant(dish)
+
+    async def generate_tour_narrative(self, *args):
+        return NARRATIVE
+
+
+@pytest.fixture(params=['sync', 'async'])
+def pipeline(request):
+    """Plans a tour with stand-in services, through plan_tour or plan_tour_async"""
+    def plan(city, weather_delays=None, julep_options=None, **kwargs):
+        if request.param == 'sync':
+            weather, julep = FakeWeather(**(weather_delays or {})), FakeJulep(**(julep_options or {}))
+            return plan_tour(city, 'mid', weather, julep, **kwargs)
+        weather, julep = AsyncFakeWeather(**(weather_delays or {})), AsyncFakeJulep(**(julep_options or {}))
+        return asyncio.run(plan_tour_async(city, 'mid', weather, julep, **kwargs))
+    return plan
+
+
+def _store_with_stale_tour():
+    """A store holding a finished Paris tour whose dishes and narrative must be generated again"""
+    store = TourStore(':memory:')
+    tour = plan_tour('Paris', 'mid', FakeWeather(), FakeJulep(), store=store)
+    record = store.get(tour['city_id'], 'mid')
+    del record['provenance']['dishes']
+    del record['provenance']['narrative']
+    store.put(record)
+    return store
+
+
+def test_fused_overrun_falls_back_to_stored_tour_and_keeps_narrative(pipeline):
+    store = _store_with_stale_tour()
+    tour = pipeline('Paris', julep_options={'fused_discovery': True, 'discovery_delay': 2.0},
+                    store=store, deadline=Deadline(1.0))
+
+    assert tour['status'] == 'ok'
+    assert [details['dish'] for details in tour['tour_data'].values()] == DISHES
+    assert 'dishes' in tour['degraded']
+    # The overrun only rules out separate discovery calls; the narrative keeps its share
+    assert 'narrative' not in tour['degraded']
+    assert tour['narrative'] == NARRATIVE
+
+
+def test_geocode_overrun_degrades_and_is_not_stored(pipeline):
+    store = TourStore(':memory:')
+    tour = pipeline('paris', weather_delays={'geocode_delay': 2.0}, store=store, deadline=Deadline(1.0))
+
+    assert tour['status'] == 'ok'
+    assert tour['degraded'] == {'weather': 'unresolved_city'}
+    assert isinstance(tour['city'], City) and not tour['city'].resolved
+    assert str(tour['city']) == 'Paris'
+    assert store.stats()['tours'] == 0
+
+
+def test_stage_without_fallback_may_use_time_beyond_its_share(pipeline):
+    # Dish discovery's share of a 1s deadline is about 0.3s; with nothing stored it may use all
+    # but the narrative's reserve rather than fail the tour
+    tour = pipeline('Paris', julep_options={'dishes_delay': 0.5}, deadline=Deadline(1.0))
+
+    assert tour['status'] == 'ok'
+    assert tour['degraded'] == {}
+    assert tour['narrative'] == NARRATIVE
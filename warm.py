@@ -0,0 +1,80 @@
+"""
+The cache warming job for `python main.py --warm FILE`.
+
+Reads a ranked list of cities, one per line and most popular first, and precomputes their
+dishes and restaurants at every budget tier into the response cache, refreshing entries
+shortly before they expire. Prints one JSON report per pass, with the coverage reached,
+to stdout.
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import contextlib
+from typing import Iterable, List, Optional
+from services.cache import ResponseCache
+from services.cache_warmer import CacheWarmer
+from services.hedging import HedgePolicy
+from services.metrics import export_metrics
+from services.normalize import canonical_name
+from services.weather import WeatherService
+from services.julep_service import JulepService
+from services.tour_engine import EngineSettings
+
+
+def read_city_list(lines: Iterable[str]) -> List[str]:
+    """Parses a ranked city list: one city per line, blank lines and '#' comments ignored, repeats dropped"""
+    cities = (canonical_name(line) for line in lines if line.strip() and not line.lstrip().startswith('#'))
+    return list(dict.fromkeys(city for city in cities if city))
+
+
+def main(args: argparse.Namespace, settings: EngineSettings, hedging: Optional[HedgePolicy] = None) -> int:
+    """Entry point for `python main.py --warm FILE`; returns the process exit code"""
+    openweather_api_key = os.getenv('OPENWEATHER_API_KEY')
+    julep_api_key = os.getenv('JULEP_API_KEY')
+    if not openweather_api_key or not julep_api_key:
+        print("ERROR: OPENWEATHER_API_KEY and JULEP_API_KEY must be set.", file=sys.stderr)
+        return 2
+    if args.no_cache:
+        print("ERROR: --warm writes to the response cache, so it cannot be combined with --no-cache.", file=sys.stderr)
+        return 2
+
+    # Reports go to stdout as JSON, so the services' diagnostics are sent to stderr
+    out = sys.stdout
+    with contextlib.redirect_stdout(sys.stderr):
+        if args.warm == '-':
+            cities = read_city_list(sys.stdin)
+        else:
+            with open(args.warm, encoding='utf-8') as f:
+                cities = read_city_list(f)
+        # City IDs are read from the cache as usual, while every dish and restaurant the
+        # warmer asks for replaces the cached answer instead of being served from it
+        id_store = ResponseCache()
+        weather_service = WeatherService(api_key=openweather_api_key, id_store=id_store)
+        julep_service = JulepService(api_key=julep_api_key, cache=ResponseCache(refresh=True), hedging=hedging)
+        warmer = CacheWarmer(julep_service, weather_service, rate=args.warm_rate,
+                             max_calls=args.warm_max_calls or None, max_tokens=args.warm_max_tokens or None,
+                             concurrency=settings.julep_concurrency)
+        try:
+            julep_service.ready()
+        except Exception as e:
+            print(f"ERROR: Failed to initialize services: {e}")
+            export_metrics(args.metrics_out, args.metrics_prom)
+            return 1
+        try:
+            while True:
+                report = warmer.run(cities)
+                out.write(json.dumps(report) + "\n")
+                out.flush()
+                print(f"INFO: Warmed {report['calls']} entries for {report['cities']} cities in {report['elapsed_s']:.1f}s, "
+                      f"coverage {report['coverage']['overall']:.0%}"
+                      + (f", {len(report['skipped'])} unresolved" if report['skipped'] else ""))
+                if not args.warm_interval:
+                    break
+                time.sleep(args.warm_interval)
+        except KeyboardInterrupt:
+            print("INFO: Stopped warming")
+        finally:
+            export_metrics(args.metrics_out, args.metrics_prom)
+    return 0